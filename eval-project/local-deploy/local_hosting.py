@@ -1,28 +1,242 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import cProfile
+import threading
+from collections import Counter, deque
+from typing import List, Optional
+
 import transformers
 import torch
+from transformers.generation.streamers import BaseStreamer
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-# Cache directory
-cache_dir = "../.cache"
+# Model directory or hub id (a small model such as sshleifer/tiny-gpt2 is enough to test on CPU)
+cache_dir = os.getenv("LOCAL_HOSTING_MODEL_DIR", "../.cache")
+device = os.getenv("LOCAL_HOSTING_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+
+# Requests are collected into one padded batch until there are max_batch of them
+# or the oldest has waited max_wait_ms
+max_batch = int(os.getenv("LOCAL_HOSTING_MAX_BATCH", "8"))
+max_wait_ms = float(os.getenv("LOCAL_HOSTING_MAX_WAIT_MS", "10"))
 
-# Load the model from the local directory
-model = transformers.AutoModelForCausalLM.from_pretrained(cache_dir, torch_dtype=torch.bfloat16)
+# Set to a directory to write one cProfile dump per generated batch (e.g. LOCAL_HOSTING_PROFILE_DIR=profiles)
+profile_dir = os.getenv("LOCAL_HOSTING_PROFILE_DIR")
+if profile_dir:
+    os.makedirs(profile_dir, exist_ok=True)
+
+# Load the model from the local directory (bfloat16 on GPU, float32 on CPU where bfloat16 kernels are slow)
+model = transformers.AutoModelForCausalLM.from_pretrained(
+    cache_dir, torch_dtype=torch.bfloat16 if device.startswith("cuda") else torch.float32
+).to(device)
+model.eval()
 tokenizer = transformers.AutoTokenizer.from_pretrained(cache_dir)
+# Decoder-only models continue from the right edge, so batches are padded on the left
+tokenizer.padding_side = "left"
+if tokenizer.pad_token is None:
+    tokenizer.pad_token = tokenizer.eos_token
+
+
+class PendingRequest:
+    """A prompt waiting for (or in) a batch, with the way back to the handler awaiting it"""
+
+    def __init__(self, prompt: str, max_length: int, return_full_text: bool, loop: asyncio.AbstractEventLoop, stream: bool):
+        self.prompt = prompt
+        self.max_length = max_length
+        self.return_full_text = return_full_text
+        self.loop = loop
+        self.future = loop.create_future()
+        # Text deltas for /generate/stream, None marks the end
+        self.deltas = asyncio.Queue() if stream else None
+        self.enqueued = time.perf_counter()
+        self.tokens: List[int] = []
+        self.text = ""
+        self.max_new_tokens = 1
+        self.finished = False
+
+    def emit(self, delta: Optional[str]) -> None:
+        if self.deltas is not None:
+            self.loop.call_soon_threadsafe(self.deltas.put_nowait, delta)
+
+    def resolve(self, result=None, error: Optional[Exception] = None) -> None:
+        def settle():
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+        self.loop.call_soon_threadsafe(settle)
+        self.emit(None)
+
+
+class BatchStreamer(BaseStreamer):
+    """
+    Receives each generation step of a batch from model.generate, keeps every request's
+    tokens until its own max_new_tokens or end of sequence, and streams text deltas to
+    the requests that asked for them
+    """
+
+    def __init__(self, requests: List[PendingRequest]):
+        self.requests = requests
+        self.prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the padded prompts
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        for request, token in zip(self.requests, value.reshape(len(self.requests), -1)[:, -1].tolist()):
+            if request.finished:
+                continue
+            if token == tokenizer.eos_token_id:
+                request.finished = True
+                continue
+            request.tokens.append(token)
+            request.finished = len(request.tokens) >= request.max_new_tokens
+            if request.deltas is None:
+                continue
+            text = tokenizer.decode(request.tokens, skip_special_tokens=True)
+            # Multi-byte characters may need several tokens, only emit once they are complete
+            if len(text) > len(request.text) and not text.endswith("\ufffd"):
+                request.emit(text[len(request.text):])
+                request.text = text
+
+    def end(self):
+        pass
+
 
-pipeline = transformers.pipeline(
-  "text-generation",
-  model=model,
-  tokenizer=tokenizer,
-  device="cuda",
-  pad_token_id=tokenizer.eos_token_id,
-  truncation=True,
-  max_length=50
-)
+class MicroBatcher:
+    """
+    Collects concurrent requests into padded batches on one worker thread that owns the model
 
-# # Test the pipeline
-# output = pipeline("Will generative AI take over the world?")
-# print(output)
+    Handlers enqueue a PendingRequest and await it; the worker waits for the first
+    request, keeps collecting until max_batch requests or max_wait_ms have passed,
+    runs one generate call for all of them and fans the results back out.
+    """
+
+    def __init__(self, max_batch: int, max_wait_ms: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.in_flight = 0
+        self.requests_total = 0
+        self.errors_total = 0
+        self.batch_sizes = Counter()
+        self.generated_tokens = 0
+        self.generate_s = 0.0
+        self.queue_wait_s = 0.0
+        # (finish time, generated tokens) of recent batches for the sliding tokens/s window
+        self.recent = deque(maxlen=1024)
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, request: PendingRequest) -> None:
+        self.queue.put(request)
+
+    def _collect(self) -> List[PendingRequest]:
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            with self.lock:
+                self.in_flight = len(batch)
+                self.queue_wait_s += sum(started - request.enqueued for request in batch)
+            profiler = cProfile.Profile() if profile_dir else None
+            if profiler:
+                profiler.enable()
+            try:
+                generate_batch(batch)
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                if profiler:
+                    profiler.disable()
+                    profiler.dump_stats(os.path.join(profile_dir, f"batch_{time.time_ns()}_{len(batch)}.prof"))
+            elapsed = time.perf_counter() - started
+            tokens = sum(len(request.tokens) for request in batch)
+            with self.lock:
+                self.in_flight = 0
+                self.requests_total += len(batch)
+                self.errors_total += len(batch) if error else 0
+                self.batch_sizes[len(batch)] += 1
+                self.generated_tokens += tokens
+                self.generate_s += elapsed
+                self.recent.append((time.time(), tokens))
+            for request in batch:
+                if error is not None:
+                    request.resolve(error=error)
+                else:
+                    final = tokenizer.decode(request.tokens, skip_special_tokens=True)
+                    if len(final) > len(request.text):
+                        request.emit(final[len(request.text):])
+                    request.text = final
+                    text = (request.prompt if request.return_full_text else "") + request.text
+                    request.resolve({"generated_text": text, "generated_tokens": len(request.tokens),
+                                     "batch_size": len(batch)})
+
+    def metrics(self, window_s: float = 60.0) -> dict:
+        with self.lock:
+            batches = sum(self.batch_sizes.values())
+            now = time.time()
+            window_tokens = sum(tokens for finished, tokens in self.recent if now - finished <= window_s)
+            return {
+                "queue_depth": self.queue.qsize(),
+                "in_flight": self.in_flight,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "requests_total": self.requests_total,
+                "errors_total": self.errors_total,
+                "batches_total": batches,
+                "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "mean_batch_size": self.requests_total / batches if batches else 0.0,
+                "mean_queue_wait_ms": self.queue_wait_s / self.requests_total * 1000 if self.requests_total else 0.0,
+                "generated_tokens_total": self.generated_tokens,
+                # While generating, and over the last window_s seconds of wall time
+                "tokens_per_second": self.generated_tokens / self.generate_s if self.generate_s else 0.0,
+                "recent_tokens_per_second": window_tokens / min(window_s, now - self.started) if now > self.started else 0.0,
+                "uptime_s": now - self.started,
+            }
+
+
+@torch.inference_mode()
+def generate_batch(batch: List[PendingRequest]) -> None:
+    """
+    run one padded generate call for a batch, each request keeps max_length - its prompt tokens new tokens
+    """
+    inputs = tokenizer([request.prompt for request in batch], return_tensors="pt", padding=True, truncation=True).to(device)
+    prompt_lengths = inputs["attention_mask"].sum(dim=1).tolist()
+    for request, prompt_length in zip(batch, prompt_lengths):
+        # max_length counts the prompt, as it did for the transformers pipeline
+        request.max_new_tokens = max(1, request.max_length - int(prompt_length))
+    model.generate(
+        **inputs,
+        max_new_tokens=max(request.max_new_tokens for request in batch),
+        pad_token_id=tokenizer.pad_token_id,
+        streamer=BatchStreamer(batch),
+    )
+
+
+batcher = MicroBatcher(max_batch=max_batch, max_wait_ms=max_wait_ms)
 
 # Create FastAPI app
 app = FastAPI()
@@ -30,19 +244,43 @@ app = FastAPI()
 class TextGenerationRequest(BaseModel):
     prompt: str
     max_length: int = 50
+    return_full_text: bool = True
 
 @app.post("/generate")
-def generate_text(request: TextGenerationRequest):
+async def generate_text(request: TextGenerationRequest):
+    pending = PendingRequest(request.prompt, request.max_length, request.return_full_text, asyncio.get_running_loop(), stream=False)
+    batcher.submit(pending)
     try:
-        result = pipeline(request.prompt, max_length=request.max_length)
-        output = result[0]['generated_text']
-        print(output)
-        return {"generated_text": output}
+        return await pending.future
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate/stream")
+async def generate_text_stream(request: TextGenerationRequest):
+    """
+    newline-delimited JSON: {"text": delta} per decoded piece, then the /generate response with "done": true
+    """
+    pending = PendingRequest(request.prompt, request.max_length, request.return_full_text, asyncio.get_running_loop(), stream=True)
+    batcher.submit(pending)
+
+    async def events():
+        while True:
+            delta = await pending.deltas.get()
+            if delta is None:
+                break
+            yield json.dumps({"text": delta}) + "\n"
+        try:
+            yield json.dumps(dict(await pending.future, done=True)) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e), "done": True}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+def metrics():
+    return batcher.metrics()
+
 # Health check endpoint
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
-health_check()
\ No newline at end of file
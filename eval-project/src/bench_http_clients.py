@@ -0,0 +1,164 @@
+# ----- REQUIRED IMPORTS -----
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# The OpenAI-compatible stub lives with the main project's benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "bench"))
+
+from mock_llm_server import serve
+from prediction_model import ModelPredictor
+
+# prediction_model logs at INFO, which would print every request httpx sends
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# ----- CLIENT STRATEGIES -----
+
+SYSTEM_PROMPT = "You are a Singapore tort law tutor."
+
+def unpooled_lm_studio(base_url):
+    """
+    the previous lm_studio path: a bare requests.post, one new TCP connection per request
+    """
+    def call(prompt):
+        data = {"messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+                "temperature": 0.2, "max_tokens": 600, "stream": False}
+        response = requests.post(f"{base_url}/chat/completions", headers={"Content-Type": "application/json"}, data=json.dumps(data))
+        return response.json()['choices'][0]['message']['content']
+    return call, lambda: None
+
+def unpooled_openai(base_url):
+    """
+    the previous openai path: a new OpenAI client (and connection pool) per request
+    """
+    from openai import OpenAI
+
+    def call(prompt):
+        client = OpenAI(api_key="sk-bench", base_url=base_url)
+        completion = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+        )
+        return completion.choices[0].message.content
+    return call, lambda: None
+
+def pooled_lm_studio(base_url, connections):
+    os.environ["LM_STUDIO_BASE_URL"] = base_url
+    predictor = ModelPredictor(SYSTEM_PROMPT, "Mistral-Nemo-Instruct-2407", max_connections=connections, pipeline="lm_studio")
+    return predictor.predict, predictor.close
+
+def pooled_openai(base_url, connections):
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    predictor = ModelPredictor(SYSTEM_PROMPT, "gpt-4o-mini", max_connections=connections)
+    return predictor.predict, predictor.close
+
+STRATEGIES = {
+    "lm_studio/unpooled": lambda url, n: unpooled_lm_studio(url),
+    "lm_studio/pooled": pooled_lm_studio,
+    "openai/unpooled": lambda url, n: unpooled_openai(url),
+    "openai/pooled": pooled_openai,
+}
+
+def measure(call, requests_total, concurrency):
+    """
+    send requests_total prompts from concurrency threads, return (requests/s, per-request latencies)
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.perf_counter()
+        call(f"Question {i}: is the occupier liable in negligence?")
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests_total)))
+    return requests_total / (time.perf_counter() - started), latencies
+
+def measure_samples(base_url, questions, samples, concurrency):
+    """
+    samples answers per question as repeated predict calls (the previous epoch loop) and as one predict_n call,
+    return {strategy: (seconds, prompt tokens billed by the stub)}
+    """
+    results = {}
+    for name in ("openai/predict x n", "openai/predict_n"):
+        call, close = pooled_openai(base_url, concurrency)
+        predictor = call.__self__
+        before = requests.get(f"{base_url}/stats").json().get("prompt_tokens", 0)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            if name.endswith("predict_n"):
+                list(executor.map(lambda i: predictor.predict_n(f"Question {i}: is the occupier liable?", samples), range(questions)))
+            else:
+                list(executor.map(lambda job: predictor.predict(f"Question {job // samples}: is the occupier liable?"),
+                                  range(questions * samples)))
+        results[name] = (time.perf_counter() - started, requests.get(f"{base_url}/stats").json()["prompt_tokens"] - before)
+        close()
+    return results
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Requests per second of pooled vs per-request HTTP clients against a local stub")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per strategy and concurrency level")
+    parser.add_argument("--concurrency", type=str, default="1,8", help="Comma-separated client thread counts")
+    parser.add_argument("--latency", type=str, default="constant:0", help="Stub time to first token (see mock_llm_server.py)")
+    parser.add_argument("--strategies", type=str, default=",".join(STRATEGIES), help="Comma-separated strategies to run")
+    parser.add_argument("--samples", type=int, default=3, help="Samples per question for the predict vs predict_n comparison")
+    parser.add_argument("--sample-latency", type=str, default="constant:0.2", help="Stub time to first token for the sample comparison")
+    parser.add_argument("--port", type=int, default=8091)
+    return parser.parse_args()
+
+def main():
+    """
+    main execution flow
+    """
+    args = parse_arguments()
+    server = serve("127.0.0.1", args.port, latency=args.latency, tokens_per_sec=0.0, answer_tokens=50)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    print(f"{'strategy':<22}{'threads':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        for name in args.strategies.split(","):
+            call, close = STRATEGIES[name](base_url, concurrency)
+            try:
+                call("warm-up")
+                rate, latencies = measure(call, args.requests, concurrency)
+            finally:
+                close()
+            latencies.sort()
+            print(f"{name:<22}{concurrency:>8}{rate:>10.1f}{statistics.median(latencies) * 1000:>9.2f}"
+                  f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:>9.2f}")
+    server.shutdown()
+    server.server_close()
+
+    # Repeated samples per question, against a stub with realistic latency
+    server = serve("127.0.0.1", args.port, latency=args.sample_latency, tokens_per_sec=0.0, answer_tokens=50)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    questions = max(1, args.requests // 20)
+    concurrency = int(args.concurrency.split(",")[-1])
+    print(f"\n{questions} questions x {args.samples} samples, {concurrency} threads, latency {args.sample_latency}")
+    print(f"{'strategy':<22}{'seconds':>10}{'prompt tokens':>15}")
+    for name, (seconds, prompt_tokens) in measure_samples(base_url, questions, args.samples, concurrency).items():
+        print(f"{name:<22}{seconds:>10.2f}{prompt_tokens:>15}")
+    server.shutdown()
+    server.server_close()
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    main()
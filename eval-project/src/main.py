@@ -1,43 +1,199 @@
+import os
 import json
-from prediction_model import ModelPredictor
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from prediction_model import ModelPredictor, PredictionError
 from system_prompts import sys_prompt
 from datetime import datetime
 
-def generate_answers(data, epoch):
-    predictor = ModelPredictor(
-        system_prompt=sys_prompt("ans_tort_qns"),
-    )
+# Requests in flight per backend; the local transformers pipeline and LM Studio serve one request at a time
+DEFAULT_BACKEND_LIMITS = {
+    "openai": 8,
+    "anthropic": 4,
+    "google": 4,
+    "vertex_ai": 4,
+    "lm_studio": 1,
+    "local_model": 1,
+}
 
-    # Iterate over each file in the JSON data
-    for item in data:
-        scenario = item['scenario']
-        questions = item['questions']
-        answers = {}
+def backend_of(predictor):
+    """
+    concurrency group of a predictor: its provider, or its pipeline for self-hosted models
+    """
+    return predictor.pipeline if predictor.origin == "others" else predictor.origin
 
-        # For each question, prepare the prompt and get the model's prediction multiple times
-        for i, question in enumerate(questions):
-            question_key = f"question_{i + 1}"
-            answers[question_key] = []
+def answer_key(model_name, item_index, question_key, epoch_index):
+    return f"{model_name}|{item_index}|{question_key}|{epoch_index}"
 
-            for _ in range(epoch):
-                prompt = f"Scenario: {scenario}\nQuestion: {question}\n\nMy answer is:"
-                answer = predictor.predict(prompt)
-                print(answer)
-                answers[question_key].append(answer)
+def load_journal(journal_path):
+    """
+    answers already written to a journal, keyed by answer_key (a truncated last line from a crash is skipped)
+    """
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+    with open(journal_path, 'r') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[answer_key(entry["model"], entry["item"], entry["question"], entry["epoch"])] = entry["answer"]
+    return done
 
-        # Add the answers to the data
-        item['answers'] = answers
+class Progress:
+    """
+    thread-safe progress and throughput readout
+    """
+    def __init__(self, total, already_done=0):
+        self.total = total
+        self.done = already_done
+        self.new = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
 
-    return data
+    def update(self, label, failed=False, count=1):
+        with self.lock:
+            self.done += count
+            self.new += count
+            self.failed += count if failed else 0
+            elapsed = time.perf_counter() - self.started
+            rate = self.new / elapsed if elapsed else 0.0
+            eta = (self.total - self.done) / rate if rate else 0.0
+            print(f"[{self.done}/{self.total}] {label} {'FAILED' if failed else 'ok'} | "
+                  f"{rate * 60:.1f} answers/min, elapsed {elapsed:.0f}s, ETA {eta:.0f}s")
 
-with open('data/processed/extracted_data.json', 'r') as file:
-    data = json.load(file)
+def generate_answers(data, epoch, model_names, max_workers=8, backend_limits=None, journal_path=None):
+    """
+    answers every question of every file epoch times with each model, concurrently. The samples of a question
+    come from one predict_n call where the backend can return several at once. At most max_workers
+    calls run at once and at most backend_limits[backend] against one backend; every answer is appended
+    to journal_path as it arrives and answers already in the journal are not generated again. Returns
+    {model_name: data with 'answers' filled in}
+    """
+    limits = dict(DEFAULT_BACKEND_LIMITS, **(backend_limits or {}))
+    predictors = {
+        model_name: ModelPredictor(system_prompt=sys_prompt("ans_tort_qns"), model_name=model_name, max_connections=max_workers)
+        for model_name in model_names
+    }
+    semaphores = {
+        backend: threading.BoundedSemaphore(limits.get(backend, max_workers))
+        for backend in {backend_of(predictor) for predictor in predictors.values()}
+    }
+    done = load_journal(journal_path) if journal_path else {}
+    journal = open(journal_path, 'a') if journal_path else None
+    journal_lock = threading.Lock()
 
-updated_data = generate_answers(data, epoch=3)
+    # Interleave models so one slow backend does not hold every worker
+    total = 0
+    jobs = []
+    for item_index, item in enumerate(data):
+        for i, question in enumerate(item['questions']):
+            for model_name in model_names:
+                question_key = f"question_{i + 1}"
+                missing = [e for e in range(epoch) if answer_key(model_name, item_index, question_key, e) not in done]
+                total += epoch
+                if missing:
+                    jobs.append((model_name, item_index, question_key, missing, question))
+    pending = sum(len(job[3]) for job in jobs)
+    if pending < total:
+        print(f"Resuming: {total - pending} of {total} answers already in {journal_path}")
+    progress = Progress(total, already_done=total - pending)
 
-current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-output_filename = f'results/exam_answers_{current_datetime}.json'
-with open(output_filename, 'w') as file:
-    json.dump(updated_data, file, indent=4)
+    def run(model_name, item_index, question_key, epochs, question):
+        predictor = predictors[model_name]
+        prompt = f"Scenario: {data[item_index]['scenario']}\nQuestion: {question}\n\nMy answer is:"
+        with semaphores[backend_of(predictor)]:
+            # Raises PredictionError on failure, so nothing below journals an error as an answer
+            answers = predictor.predict_n(prompt, len(epochs))
+        if len(answers) != len(epochs):
+            raise PredictionError(f"expected {len(epochs)} answers, got {len(answers)}")
+        if journal:
+            with journal_lock:
+                for epoch_index, answer in zip(epochs, answers):
+                    entry = {"model": model_name, "item": item_index, "question": question_key, "epoch": epoch_index, "answer": answer}
+                    journal.write(json.dumps(entry) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+        return answers
 
-print(f"Processing complete. The updated data is saved in '{output_filename}'.")
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run, *job): job for job in jobs}
+            for future in as_completed(futures):
+                model_name, item_index, question_key, epochs, _ = futures[future]
+                label = f"{model_name} {data[item_index].get('file', item_index)} {question_key} x{len(epochs)}"
+                try:
+                    for epoch_index, answer in zip(epochs, future.result()):
+                        done[answer_key(model_name, item_index, question_key, epoch_index)] = answer
+                    progress.update(label, count=len(epochs))
+                except Exception as e:
+                    # Not journaled, so a resumed run retries it
+                    print(f"Error generating {label}: {e}")
+                    progress.update(label, failed=True, count=len(epochs))
+    finally:
+        if journal:
+            journal.close()
+        for predictor in predictors.values():
+            predictor.close()
+
+    results = {}
+    for model_name in model_names:
+        model_data = []
+        for item_index, item in enumerate(data):
+            answers = {}
+            for i in range(len(item['questions'])):
+                question_key = f"question_{i + 1}"
+                answers[question_key] = [
+                    done[key] for key in (answer_key(model_name, item_index, question_key, e) for e in range(epoch)) if key in done
+                ]
+            model_data.append(dict(item, answers=answers))
+        results[model_name] = model_data
+
+    elapsed = time.perf_counter() - progress.started
+    print(f"\nGenerated {progress.new - progress.failed} answers in {elapsed:.0f}s ({progress.new / elapsed * 60 if elapsed else 0:.1f} answers/min), "
+          f"{progress.failed} failed")
+    return results
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Generate exam answers with one or more models")
+    parser.add_argument("--models", type=str, required=True, help="Comma-separated model names, e.g. 'gpt-4o,Mistral-Nemo-Instruct-2407'")
+    parser.add_argument("--input", type=str, default="data/processed/extracted_data.json", help="Extracted exam data")
+    parser.add_argument("--epochs", type=int, default=3, help="Answers generated per question and model")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum requests in flight across all backends")
+    parser.add_argument("--backend-limit", action="append", default=[], metavar="BACKEND=N",
+                        help=f"Override the requests in flight for one backend (defaults: {DEFAULT_BACKEND_LIMITS})")
+    parser.add_argument("--resume", type=str, help="Journal (.jsonl) of an interrupted run to continue")
+    return parser.parse_args()
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    with open(args.input, 'r') as file:
+        data = json.load(file)
+
+    backend_limits = {}
+    for limit in args.backend_limit:
+        backend, _, value = limit.partition("=")
+        backend_limits[backend.strip()] = int(value)
+
+    os.makedirs("results", exist_ok=True)
+    journal_path = args.resume or f"results/exam_answers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    print(f"Writing answers to '{journal_path}' as they arrive")
+    model_names = [name.strip() for name in args.models.split(",") if name.strip()]
+    results = generate_answers(data, args.epochs, model_names, max_workers=args.workers,
+                               backend_limits=backend_limits, journal_path=journal_path)
+
+    for model_name, updated_data in results.items():
+        output_filename = f"{os.path.splitext(journal_path)[0]}_{model_name.replace('/', '_')}.json"
+        with open(output_filename, 'w') as file:
+            json.dump(updated_data, file, indent=4)
+        print(f"Processing complete. The updated data for {model_name} is saved in '{output_filename}'.")
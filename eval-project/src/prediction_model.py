@@ -2,9 +2,11 @@ import json
 import os
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,19 +30,26 @@ def identify_origin(model_name):
 
 
 class ModelPredictor:
-    def __init__(self, system_prompt, model_name):
+    def __init__(self, system_prompt, model_name, timeout=120.0, max_connections=16, pipeline=None):
+        """
+        One predictor per model, safe to share between threads. HTTP backends keep a pool of up to
+        max_connections keep-alive connections and give up on a request after timeout seconds;
+        pipeline overrides the "pipeline" setting in settings.json for non-OpenAI models
+        """
         self.system_prompt = system_prompt
         self.max_length = 2000
         self.model_name = model_name
-        
-        # Load settings from settings.json
-        with open('settings.json', 'r') as settings_file:
-            settings = json.load(settings_file)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.messages = [{"role": "system", "content": system_prompt}]
         
         self.origin = identify_origin(model_name)
         if self.origin == 'others':
             # Load settings of each pipeline below:
-            self.pipeline = settings["pipeline"]
+            if pipeline is None:
+                with open('settings.json', 'r') as settings_file:
+                    pipeline = json.load(settings_file)["pipeline"]
+            self.pipeline = pipeline
             if self.pipeline == "vertex_ai":
                 from google.cloud import aiplatform
                 """
@@ -73,9 +82,49 @@ class ModelPredictor:
                     max_length=self.max_length
                 )
 
+            elif self.pipeline == "lm_studio":
+                # One session per predictor: requests reuse keep-alive connections instead of a new TCP handshake each
+                self.url = os.environ.get("LM_STUDIO_BASE_URL", "http://localhost:1234/v1").rstrip("/") + "/chat/completions"
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+                self.session.mount("http://", adapter)
+                self.session.mount("https://", adapter)
+                self.session.headers.update({"Content-Type": "application/json"})
+
+        elif self.origin == "openai":
+            import httpx
+            from openai import OpenAI
+
+            self.http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                timeout=timeout,
+            )
+            self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), timeout=timeout, http_client=self.http_client)
+
+    def close(self):
+        """
+        close pooled connections
+        """
+        if getattr(self, "session", None) is not None:
+            self.session.close()
+        if getattr(self, "http_client", None) is not None:
+            self.http_client.close()
 
         
     def predict(self, user_prompt: str = None) -> str:
+        """
+        one answer, or the error message if the backend failed
+        """
+        try:
+            return self._predict(user_prompt)
+        except PredictionError as e:
+            logger.error(str(e))
+            return str(e)
+
+    def _predict(self, user_prompt: str = None) -> str:
+        """
+        one answer; raises PredictionError if the backend fails or returns nothing
+        """
         prompt = f"{self.system_prompt} \n{user_prompt}\n"
         if self.origin == 'others':
             if self.pipeline == "vertex_ai":
@@ -88,25 +137,28 @@ class ModelPredictor:
                 parameters = json_format.ParseDict(parameters_dict, Value())
 
                 try:
-                    response = self.client.predict(endpoint=self.endpoint, instances=formatted_instances, parameters=parameters)
+                    response = self.client.predict(endpoint=self.endpoint, instances=formatted_instances, parameters=parameters,
+                                                   timeout=self.timeout)
                     predictions = response.predictions
                     cleaned_predictions = []
                     for prediction in predictions:
                         parts = prediction.split("My answer is:")
                         cleaned_text = parts[-1] if len(parts) > 1 else prediction
                         cleaned_predictions.append(cleaned_text)
-                    return cleaned_predictions[0]
+                    return _answer(cleaned_predictions[0], "Prediction")
+                except PredictionError:
+                    raise
                 except Exception as e:
-                    logger.error(f"Prediction failed: {e}")
-                    return f"Prediction failed: {e}"
+                    raise PredictionError(f"Prediction failed: {e}") from e
 
             elif self.pipeline == "local_model":
                 try:
                     predictions = self.local_pipeline(prompt)
-                    return predictions[0]["generated_text"]
+                    return _answer(predictions[0]["generated_text"], "Local model prediction")
+                except PredictionError:
+                    raise
                 except Exception as e:
-                    logger.error(f"Local model prediction failed: {e}")
-                    return f"Local model prediction failed: {e}"
+                    raise PredictionError(f"Local model prediction failed: {e}") from e
 
             elif self.pipeline == "lm_studio": 
                 try:            
@@ -119,36 +171,117 @@ class ModelPredictor:
                         "max_tokens": 600,
                         "stream": False
                         }
-                    
-                    # Define the API URL and headers
-                    url = "http://localhost:1234/v1/chat/completions"
-                    headers = {
-                        "Content-Type": "application/json"
-                    }
-
-                    # Send the POST request
-                    response = requests.post(url, headers=headers, data=json.dumps(data))
-                    response_data = response.json()
-
-                    # Handle the response
-                    if response.ok:
-                        return response_data['choices'][0]['message']['content']                         
-                
+
+                    # Send the POST request over the pooled session
+                    response = self.session.post(self.url, data=json.dumps(data), timeout=self.timeout)
                 except Exception as e:
-                    logger.error(f"LM Studio prediction failed: {e}")
-                    return f"LM Studio prediction failed: {e}"
+                    raise PredictionError(f"LM Studio prediction failed: {e}") from e
+                return _answer(_lm_studio_choices(response)[0], "LM Studio prediction")
 
         elif self.origin == "openai":
-            from openai import OpenAI
-
-            client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
             try:
-                completion = client.chat.completions.create(
+                completion = self.client.chat.completions.create(
                     model=self.model_name,
                     messages=self.messages + [{"role": "user", "content": user_prompt}]
                 )
-                # Extracting the text content from the response
-                return completion.choices[0].message.content
             except Exception as e:
-                logger.error(f"OpenAI model prediction failed: {e}")
-                return f"OpenAI model prediction failed: {e}"
\ No newline at end of file
+                raise PredictionError(f"OpenAI model prediction failed: {e}") from e
+            # Extracting the text content from the response
+            return _answer(completion.choices[0].message.content, "OpenAI model prediction")
+
+        raise PredictionError(f"No prediction backend for {self.origin} model {self.model_name}")
+
+    def predict_n(self, user_prompt: str = None, n: int = 1) -> List[str]:
+        """
+        n samples for one prompt. OpenAI-compatible backends return them from one request (n), the local
+        pipeline from one sampled generate call (num_return_sequences) and Vertex AI from one predict call
+        with n instances; other backends, and servers that return fewer choices than asked, fall back to
+        concurrent single predictions. Raises PredictionError if any sample cannot be generated, so callers
+        never mistake an error message for an answer
+        """
+        if n <= 1:
+            return [self._predict(user_prompt)][:max(n, 0)]
+        prompt = f"{self.system_prompt} \n{user_prompt}\n"
+        samples = []
+        if self.origin == "openai":
+            try:
+                completion = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=self.messages + [{"role": "user", "content": user_prompt}],
+                    n=n
+                )
+            except Exception as e:
+                raise PredictionError(f"OpenAI model prediction failed: {e}") from e
+            samples = [_answer(choice.message.content, "OpenAI model prediction") for choice in completion.choices]
+
+        elif self.origin == 'others' and self.pipeline == "lm_studio":
+            data = {
+                "messages": [
+                    { "role": "system", "content": self.system_prompt },
+                    { "role": "user", "content": user_prompt }
+                ],
+                "temperature": 0.2,
+                "max_tokens": 600,
+                "n": n,
+                "stream": False
+            }
+            try:
+                response = self.session.post(self.url, data=json.dumps(data), timeout=self.timeout)
+            except Exception as e:
+                raise PredictionError(f"LM Studio prediction failed: {e}") from e
+            samples = [_answer(content, "LM Studio prediction") for content in _lm_studio_choices(response)]
+
+        elif self.origin == 'others' and self.pipeline == "local_model":
+            try:
+                # Several return sequences need sampling, greedy decoding would repeat one answer
+                predictions = self.local_pipeline(prompt, num_return_sequences=n, do_sample=True)
+            except Exception as e:
+                raise PredictionError(f"Local model prediction failed: {e}") from e
+            samples = [_answer(prediction["generated_text"], "Local model prediction") for prediction in predictions]
+
+        elif self.origin == 'others' and self.pipeline == "vertex_ai":
+            from google.protobuf import json_format
+            from google.protobuf.struct_pb2 import Value
+
+            instances = [json_format.ParseDict({"prompt": prompt, "max_tokens": self.max_length}, Value()) for _ in range(n)]
+            try:
+                response = self.client.predict(endpoint=self.endpoint, instances=instances,
+                                               parameters=json_format.ParseDict({}, Value()), timeout=self.timeout)
+            except Exception as e:
+                raise PredictionError(f"Prediction failed: {e}") from e
+            for prediction in response.predictions:
+                parts = prediction.split("My answer is:")
+                samples.append(_answer(parts[-1] if len(parts) > 1 else prediction, "Prediction"))
+
+        missing = n - len(samples)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=min(missing, self.max_connections)) as executor:
+                samples += list(executor.map(lambda _: self._predict(user_prompt), range(missing)))
+        return samples[:n]
+
+
+class PredictionError(Exception):
+    """
+    a backend failed or returned no answer
+    """
+
+
+def _answer(content, what):
+    if content is None:
+        raise PredictionError(f"{what} failed: no content returned")
+    return content
+
+
+def _lm_studio_choices(response):
+    """
+    message contents of an LM Studio chat completion response; raises PredictionError for an error response
+    """
+    if not response.ok:
+        raise PredictionError(f"LM Studio prediction failed: HTTP {response.status_code} {response.text[:200]}")
+    try:
+        choices = [choice['message']['content'] for choice in response.json()['choices']]
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise PredictionError(f"LM Studio prediction failed: unexpected response: {e}") from e
+    if not choices:
+        raise PredictionError("LM Studio prediction failed: no choices returned")
+    return choices
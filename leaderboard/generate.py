@@ -1,239 +1,310 @@
-import json
-import shutil
-from pathlib import Path
-
-shutil.copyfile('analysis_results.json', 'leaderboard/site/analysis_results.json')
-
-with open('analysis_results.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-models = sorted(
-    data,
-    key=lambda x: x.get('final_score', x.get('average_score', 0)),
-    reverse=True
-)
-
-for idx, model in enumerate(models, 1):
-    model['rank'] = idx
-
-html_template = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>SMU LLM Project Leaderboard</title>
-    <style>
-    body {{
-        font-family: 'Inter', 'Segoe UI', Arial, sans-serif;
-        background: #f7f8fa;
-        color: #23272f;
-        margin: 0;
-        padding: 0;
-    }}
-
-    .header-section {{
-        max-width: 700px;
-        margin: 40px auto 0 auto;
-        padding: 0 16px;
-        text-align: center;
-    }}
-
-    .header-section h1 {{
-        font-size: 2.2rem;
-        font-weight: 700;
-        margin-bottom: 0.5rem;
-        color: #23272f;
-        letter-spacing: -1px;
-    }}
-
-    .header-section p {{
-        color: #6c7280;
-        font-size: 1.1rem;
-        margin-bottom: 1.2rem;
-        line-height: 1.5;
-    }}
-
-    .header-section .view-json-btn {{
-        background: #f3f6fa;
-        border: 1px solid #dbe0e8;
-        color: #374151;
-        border-radius: 8px;
-        font-weight: 500;
-        padding: 8px 18px;
-        font-size: 1rem;
-        cursor: pointer;
-        transition: background 0.2s, border 0.2s;
-        margin-bottom: 24px;
-    }}
-    .header-section .view-json-btn:hover {{
-        background: #e5eaf1;
-        border-color: #bfc9d7;
-    }}
-
-    .leaderboard-card {{
-        background: #fff;
-        border-radius: 18px;
-        max-width: 1500px;
-        margin: 32px auto 32px auto;
-        box-shadow: 0 4px 24px rgba(32, 39, 54, 0.10);
-        padding: 32px 24px 32px 24px;
-        overflow-x: auto;
-    }}
-
-    #leaderboard {{
-        width: 100%;
-        border-collapse: separate;
-        border-spacing: 0;
-        font-size: 1.04rem;
-        background: #fff;
-        table-layout: auto;
-    }}
-
-    #leaderboard thead th {{
-        background: #f6f7fb;
-        color: #23272f;
-        font-weight: 600;
-        padding: 13px 10px;
-        border-bottom: 2px solid #e3e6ee;
-        text-align: left;
-        font-size: 1.05rem;
-        min-width: 120px;
-        padding: 13px 14px;
-    }}
-
-    #leaderboard tbody tr {{
-        transition: background 0.13s;
-    }}
-
-    #leaderboard tbody tr:hover {{
-        background: #f3f6fa;
-    }}
-
-    #leaderboard td {{
-        padding: 13px 10px;
-        border-bottom: 1px solid #f0f1f6;
-        vertical-align: middle;
-    }}
-
-    #leaderboard td:first-child,
-    #leaderboard th:first-child {{
-        text-align: right;
-        min-width: 60px;
-        width: 70px;
-        color: #c0c4cc;
-        font-weight: 700;
-        font-size: 1.1rem;
-    }}
-
-    .model-name {{
-        font-weight: 500;
-        color: #222;
-    }}
-
-    #leaderboard th.model-name, #leaderboard td.model-name {{
-        min-width: 170px;
-        width: 200px;
-    }}
-
-    .rank-badge {{
-        display: inline-block;
-        min-width: 32px;
-        height: 32px;
-        line-height: 32px;
-        border-radius: 50%;
-        font-weight: 700;
-        font-size: 1.08rem;
-        text-align: center;
-        background: #f3f6fa;
-        color: #6c7280;
-    }}
-    .rank-1 {{ background: linear-gradient(135deg, #ffe082 60%, #fffde4 100%); color: #bfa700; }}
-    .rank-2 {{ background: linear-gradient(135deg, #e0e0e0 60%, #f8f9fa 100%); color: #888; }}
-    .rank-3 {{ background: linear-gradient(135deg, #ffb07c 60%, #fff0e4 100%); color: #b86b00; }}
-
-    @media (max-width: 700px) {{
-        .leaderboard-card {{
-            padding: 12px 2px;
-        }}
-        #leaderboard th, #leaderboard td {{
-            font-size: 0.95rem;
-            padding: 8px 6px;
-        }}
-    }}
-    </style>
-    <link rel="stylesheet" href="https://cdn.datatables.net/1.13.6/css/jquery.dataTables.min.css">
-    <script src="https://code.jquery.com/jquery-3.7.1.min.js"></script>
-    <script src="https://cdn.datatables.net/1.13.6/js/jquery.dataTables.min.js"></script>
-</head>
-<body>
-    <div class="header-section">
-        <h1>SMU LLM Project Leaderboard</h1>
-        <p>
-            See how leading models stack up across legal reasoning, jurisdictional understanding.<br>
-            This leaderboard is updated automatically from <code>analysis_results.json</code>.
-        </p>
-        <button class="view-json-btn" onclick="window.open('analysis_results.json', '_blank')">
-            View Raw analysis_results.json
-        </button>
-    </div>
-    <div class="leaderboard-card">
-        <table id="leaderboard" class="display">
-            <thead>
-                <tr>
-                    <th>Rank</th>
-                    <th>Model</th>
-                    <th>Jurisdictional Understanding</th>
-                    <th>Legal Reasoning</th>
-                    <th>Comparative Analysis</th>
-                    <th>Practical Application</th>
-                    <th>Average Score</th>
-                    <th>Overall Assessment</th>
-                    <th>Final Score</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-
-for model in models:
-    try:
-        scores = model['final_synthesis']['evaluation']['scores']
-        avg_score = model['final_synthesis']['evaluation']['average_score']
-        assessment = model['final_synthesis']['evaluation']['overall_assessment']
-        final_score = model.get('final_score', '')
-        rank_class = f"rank-badge rank-{model['rank']}" if model['rank'] <= 3 else "rank-badge"
-        html_template += f"""
-            <tr>
-                <td><span class="{rank_class}">{model['rank']}</span></td>
-                <td class="model-name">{model['model']}</td>
-                <td>{scores.get('jurisdictional_understanding**', '')}</td>
-                <td>{scores.get('legal_reasoning**', '')}</td>
-                <td>{scores.get('comparative_analysis**', '')}</td>
-                <td>{scores.get('practical_application**', '')}</td>
-                <td>{avg_score}</td>
-                <td class="overall-assessment">{assessment}</td>
-                <td>{final_score}</td>
-            </tr>
-        """
-    except Exception as e:
-        print(f"Skipping model {model.get('model', '')} due to error: {e}")
-
-html_template += """
-            </tbody>
-        </table>
-    </div>
-    <script>
-        $(document).ready(function() {
-            $('#leaderboard').DataTable({
-                "order": [[0, "asc"]],
-                "paging": false,
-                "info": false,
-                "searching": true
-            });
-        });
-    </script>
-</body>
-</html>
-"""
-
-Path('leaderboard/site').mkdir(parents=True, exist_ok=True)
-with open('leaderboard/site/index.html', 'w', encoding='utf-8') as f:
-    f.write(html_template)
+import os
+import sys
+import argparse
+from pathlib import Path
+
+# The index and streaming parser live with the main project so batch_eval.py can update the site as runs finish
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from helper.leaderboard import LeaderboardIndex, iter_json_array, source_stamp
+
+# Static page: rows come from the compact summary.json, a run's full analysis from runs/<id>.json when expanded
+html_template = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>SMU LLM Project Leaderboard</title>
+    <style>
+    body {
+        font-family: 'Inter', 'Segoe UI', Arial, sans-serif;
+        background: #f7f8fa;
+        color: #23272f;
+        margin: 0;
+        padding: 0;
+    }
+
+    .header-section {
+        max-width: 700px;
+        margin: 40px auto 0 auto;
+        padding: 0 16px;
+        text-align: center;
+    }
+
+    .header-section h1 {
+        font-size: 2.2rem;
+        font-weight: 700;
+        margin-bottom: 0.5rem;
+        color: #23272f;
+        letter-spacing: -1px;
+    }
+
+    .header-section p {
+        color: #6c7280;
+        font-size: 1.1rem;
+        margin-bottom: 1.2rem;
+        line-height: 1.5;
+    }
+
+    .header-section .view-json-btn {
+        background: #f3f6fa;
+        border: 1px solid #dbe0e8;
+        color: #374151;
+        border-radius: 8px;
+        font-weight: 500;
+        padding: 8px 18px;
+        font-size: 1rem;
+        cursor: pointer;
+        transition: background 0.2s, border 0.2s;
+        margin-bottom: 24px;
+    }
+    .header-section .view-json-btn:hover {
+        background: #e5eaf1;
+        border-color: #bfc9d7;
+    }
+
+    .leaderboard-card {
+        background: #fff;
+        border-radius: 18px;
+        max-width: 1500px;
+        margin: 32px auto 32px auto;
+        box-shadow: 0 4px 24px rgba(32, 39, 54, 0.10);
+        padding: 32px 24px 32px 24px;
+        overflow-x: auto;
+    }
+
+    #leaderboard {
+        width: 100%;
+        border-collapse: separate;
+        border-spacing: 0;
+        font-size: 1.04rem;
+        background: #fff;
+        table-layout: auto;
+    }
+
+    #leaderboard thead th {
+        background: #f6f7fb;
+        color: #23272f;
+        font-weight: 600;
+        padding: 13px 10px;
+        border-bottom: 2px solid #e3e6ee;
+        text-align: left;
+        font-size: 1.05rem;
+        min-width: 120px;
+        padding: 13px 14px;
+    }
+
+    #leaderboard tbody tr {
+        transition: background 0.13s;
+    }
+
+    #leaderboard tbody tr:hover {
+        background: #f3f6fa;
+    }
+
+    #leaderboard td {
+        padding: 13px 10px;
+        border-bottom: 1px solid #f0f1f6;
+        vertical-align: middle;
+    }
+
+    #leaderboard td:first-child,
+    #leaderboard th:first-child {
+        text-align: right;
+        min-width: 60px;
+        width: 70px;
+        color: #c0c4cc;
+        font-weight: 700;
+        font-size: 1.1rem;
+    }
+
+    .model-name {
+        font-weight: 500;
+        color: #222;
+    }
+
+    #leaderboard th.model-name, #leaderboard td.model-name {
+        min-width: 170px;
+        width: 200px;
+    }
+
+    .rank-badge {
+        display: inline-block;
+        min-width: 32px;
+        height: 32px;
+        line-height: 32px;
+        border-radius: 50%;
+        font-weight: 700;
+        font-size: 1.08rem;
+        text-align: center;
+        background: #f3f6fa;
+        color: #6c7280;
+    }
+    .rank-1 { background: linear-gradient(135deg, #ffe082 60%, #fffde4 100%); color: #bfa700; }
+    .rank-2 { background: linear-gradient(135deg, #e0e0e0 60%, #f8f9fa 100%); color: #888; }
+    .rank-3 { background: linear-gradient(135deg, #ffb07c 60%, #fff0e4 100%); color: #b86b00; }
+
+    .details-btn {
+        background: #f3f6fa;
+        border: 1px solid #dbe0e8;
+        border-radius: 6px;
+        color: #374151;
+        cursor: pointer;
+        padding: 4px 10px;
+    }
+
+    .run-detail {
+        max-height: 480px;
+        overflow: auto;
+        white-space: pre-wrap;
+        font-size: 0.9rem;
+        background: #fafbfc;
+        padding: 12px;
+        border-radius: 8px;
+    }
+
+    @media (max-width: 700px) {
+        .leaderboard-card {
+            padding: 12px 2px;
+        }
+        #leaderboard th, #leaderboard td {
+            font-size: 0.95rem;
+            padding: 8px 6px;
+        }
+    }
+    </style>
+    <link rel="stylesheet" href="https://cdn.datatables.net/1.13.6/css/jquery.dataTables.min.css">
+    <script src="https://code.jquery.com/jquery-3.7.1.min.js"></script>
+    <script src="https://cdn.datatables.net/1.13.6/js/jquery.dataTables.min.js"></script>
+</head>
+<body>
+    <div class="header-section">
+        <h1>SMU LLM Project Leaderboard</h1>
+        <p>
+            See how leading models stack up across legal reasoning, jurisdictional understanding.<br>
+            This leaderboard is updated automatically from <code>analysis_results.json</code>.
+        </p>
+        <button class="view-json-btn" onclick="window.open('summary.json', '_blank')">
+            View Raw summary.json
+        </button>
+    </div>
+    <div class="leaderboard-card">
+        <table id="leaderboard" class="display">
+            <thead>
+                <tr>
+                    <th>Rank</th>
+                    <th>Model</th>
+                    <th>Jurisdictional Understanding</th>
+                    <th>Legal Reasoning</th>
+                    <th>Comparative Analysis</th>
+                    <th>Practical Application</th>
+                    <th>Average Score</th>
+                    <th>Overall Assessment</th>
+                    <th>Final Score</th>
+                    <th>Details</th>
+                </tr>
+            </thead>
+            <tbody></tbody>
+        </table>
+    </div>
+    <script>
+        function escapeHtml(value) {
+            return $('<div>').text(value === null || value === undefined ? '' : String(value)).html();
+        }
+
+        $(document).ready(function() {
+            $.getJSON('summary.json', function(index) {
+                var table = $('#leaderboard').DataTable({
+                    "data": index.runs,
+                    "columns": [
+                        {"data": "rank", "render": function(rank) {
+                            var rankClass = rank <= 3 ? 'rank-badge rank-' + rank : 'rank-badge';
+                            return '<span class="' + rankClass + '">' + rank + '</span>';
+                        }},
+                        {"data": "model", "className": "model-name", "render": escapeHtml},
+                        {"data": "scores.jurisdictional_understanding"},
+                        {"data": "scores.legal_reasoning"},
+                        {"data": "scores.comparative_analysis"},
+                        {"data": "scores.practical_application"},
+                        {"data": "average_score"},
+                        {"data": "overall_assessment", "className": "overall-assessment", "render": escapeHtml},
+                        {"data": "final_score"},
+                        {"data": "detail", "orderable": false, "render": function() {
+                            return '<button class="details-btn">Show</button>';
+                        }}
+                    ],
+                    "order": [[0, "asc"]],
+                    "paging": false,
+                    "info": false,
+                    "searching": true
+                });
+
+                // Full analyses are only fetched when a row is expanded
+                $('#leaderboard tbody').on('click', '.details-btn', function() {
+                    var button = $(this);
+                    var row = table.row(button.closest('tr'));
+                    if (row.child.isShown()) {
+                        row.child.hide();
+                        button.text('Show');
+                        return;
+                    }
+                    button.text('Hide');
+                    if (row.child() && row.child().length) {
+                        row.child.show();
+                        return;
+                    }
+                    row.child('<div class="run-detail">Loading...</div>').show();
+                    $.getJSON(row.data().detail, function(run) {
+                        row.child('<div class="run-detail">' + escapeHtml(JSON.stringify(run, null, 2)) + '</div>').show();
+                    }).fail(function() {
+                        row.child('<div class="run-detail">Could not load ' + escapeHtml(row.data().detail) + '</div>').show();
+                    });
+                });
+            });
+        });
+    </script>
+</body>
+</html>
+"""
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Update the leaderboard site from analysis_results.json")
+    parser.add_argument("--results", type=str, default="analysis_results.json", help="Leaderboard results (a json list)")
+    parser.add_argument("--site", type=str, default="leaderboard/site", help="Site directory")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from an empty one, even if the results file is unchanged since the last update")
+    return parser.parse_args()
+
+
+def main():
+    """
+    main execution flow
+    """
+    args = parse_arguments()
+    Path(args.site).mkdir(parents=True, exist_ok=True)
+    index = LeaderboardIndex(args.site, empty=args.rebuild)
+
+    # Runs appended by batch_eval.py --leaderboard are already indexed, a rescan picks up other edits and removals
+    stamp = source_stamp(args.results)
+    if args.rebuild or stamp != index.meta:
+        index.sync(iter_json_array(args.results))
+        index.save(stamp)
+        print(f"Indexed {args.results}: {index.added} new, {index.updated} changed, {index.removed} removed runs ({len(index.rows)} total)")
+    else:
+        print(f"{args.results} is unchanged since the last update ({len(index.rows)} runs)")
+
+    # The site used to ship a full copy of the results, which the page now never loads
+    legacy_copy = os.path.join(args.site, "analysis_results.json")
+    if os.path.exists(legacy_copy):
+        os.remove(legacy_copy)
+
+    html_path = os.path.join(args.site, "index.html")
+    if not os.path.exists(html_path) or Path(html_path).read_text(encoding='utf-8') != html_template:
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(html_template)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# ----- REQUIRED IMPORTS -----
+
+import os
+import json
+import datetime
+import argparse
+from typing import Dict, List, Optional
+from helper.agent_clients import AgentClient
+from helper.legalagents import LegalReviewPanel
+from helper.batch import BatchRequest, BatchRunner
+from helper.configloader import load_agent_config
+from helper.inference import LEDGER, get_provider
+from helper.markdown_translator import convert_to_md
+from helper.leaderboard import LeaderboardIndex, append_json_array, source_stamp
+from helper.results_store import ResultsStore, analysis_row
+from helper.scheduler import ancestors, topological_generations
+from helper.tracing import TRACER, span
+from helper.profiling import PROFILE_MODES, profile_run
+from main import extract_hypotheticals, select_hypotheticals, build_analysis_text
+
+# ----- BATCH WORKFLOW -----
+
+class BatchLegalWorkflow:
+    """
+    Offline variant of LegalSimulationWorkflow for leaderboard refreshes.
+
+    Every selected hypothetical is analyzed independently, but all prompts of the
+    same stage (each agent phase, then synthesis, then evaluation) are sent together
+    as one provider batch job. Stages still run in order because each phase prompt
+    carries the agent's history from the previous phases.
+    """
+
+    def __init__(self, hypo_dir: str, api_keys: dict, model_backbone: str, selection: str = "all",
+                 poll_interval: float = 30.0, max_wait: float = 24 * 3600, snapshot: bool = False):
+        """
+        initialize the batch workflow, snapshot retrieves from the published read-only vector store snapshots
+        """
+        self.hypo_dir = hypo_dir
+        self.api_keys = api_keys
+        self.model_backbone = model_backbone
+        self.selection = selection
+        self.agent_configs = load_agent_config()
+
+        self.timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.results_dir = os.path.join("results", f"batch_{self.timestamp}")
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        # One AgentClient per agent is used for retrieval only; phase state lives in per-hypothetical agents
+        self.retrievers = {}
+        for agent_name, config in self.agent_configs.items():
+            self.retrievers[agent_name] = AgentClient(
+                name=agent_name,
+                config=self.agent_configs,
+                agent_type=config["type"],
+                model_str=self.model_backbone,
+                api_keys=self.api_keys,
+                allowed_collections=config["allowed_collections"],
+                run_id=self.timestamp,
+                snapshot=snapshot
+            )
+
+        self.runner = BatchRunner(
+            model_str=self.model_backbone,
+            api_key=self.api_keys.get(get_provider(self.model_backbone)),
+            run_id=self.timestamp,
+            poll_interval=poll_interval,
+            max_wait=max_wait,
+        )
+
+    def _unit_run_id(self, unit_id: str) -> str:
+        return f"{self.timestamp}_{unit_id}"
+
+    def run(self) -> List[Dict]:
+        """
+        execute all stages as batch jobs and return one analysis result per hypothetical
+        """
+        TRACER.start_run(self.timestamp, os.path.join(self.results_dir, "trace.jsonl"))
+        try:
+            with span("batch_run", run_id=self.timestamp, model=self.model_backbone) as run_span:
+                extracted_data = extract_hypotheticals(self.hypo_dir)
+                selected_indices = select_hypotheticals(extracted_data, self.selection)
+                units = {f"h{idx}": (extracted_data[idx - 1], build_analysis_text(extracted_data, [idx])) for idx in selected_indices}
+
+                # Fresh agent state per hypothetical, with retrieval context resolved up front
+                agents = {}
+                contexts = {}
+                for unit_id, (_, analysis_text) in units.items():
+                    for agent_name, retriever in self.retrievers.items():
+                        agent = type(retriever.agent)(
+                            input_model=self.model_backbone,
+                            api_keys=self.api_keys,
+                            config=self.agent_configs,
+                        )
+                        agent.run_id = self._unit_run_id(unit_id)
+                        agents[(unit_id, agent_name)] = agent
+                        contexts[(unit_id, agent_name)] = retriever.retrieve_packed(analysis_text)
+
+                # Agent phases, one batch per generation of the phase graph so independent phases share a batch
+                agent_outputs = {unit_id: {agent_name: {} for agent_name in self.retrievers} for unit_id in units}
+                generations = {key: topological_generations(agent.phases, agent.phase_dependencies) for key, agent in agents.items()}
+                max_generations = max(len(g) for g in generations.values())
+                for level in range(max_generations):
+                    requests = []
+                    for (unit_id, agent_name), agent in agents.items():
+                        if level >= len(generations[(unit_id, agent_name)]):
+                            continue
+                        outputs = agent_outputs[unit_id][agent_name]
+                        for phase in generations[(unit_id, agent_name)][level]:
+                            prior = {dep: outputs[dep] for dep in ancestors(phase, agent.phase_dependencies)}
+                            layout = agent.build_prompts(units[unit_id][1], phase, agent.phases.index(phase) + 1,
+                                                         context=contexts[(unit_id, agent_name)].text, prior=prior)
+                            requests.append(BatchRequest(
+                                custom_id=f"{unit_id}-{agent_name}-{phase}",
+                                system_prompt=layout.system,
+                                prompt=layout.user,
+                                cache_split=layout.cache_split,
+                                agent=agent.agent_type,
+                                phase=phase,
+                                run_id=agent.run_id,
+                            ))
+                    print(f"\nBatch phase generation {level + 1}/{max_generations}: {len(requests)} phase prompts")
+                    answers = self.runner.run(requests)
+                    for (unit_id, agent_name), agent in agents.items():
+                        if level >= len(generations[(unit_id, agent_name)]):
+                            continue
+                        for phase in generations[(unit_id, agent_name)][level]:
+                            answer = answers[f"{unit_id}-{agent_name}-{phase}"]
+                            agent.record_response(phase, agent.phases.index(phase) + 1, answer)
+                            agent_outputs[unit_id][agent_name][phase] = answer
+
+                # Synthesis
+                review_panel = LegalReviewPanel(
+                    input_model=self.model_backbone,
+                    api_keys=self.api_keys,
+                    agent_config=self.agent_configs,
+                    max_steps=2,
+                    run_id=self.timestamp,
+                )
+                syntheses = {}
+                requests = []
+                for unit_id in units:
+                    reviews = [
+                        {"perspective": "internal_law", "review": LegalReviewPanel.compile_review(agent_outputs[unit_id]["internal"])},
+                        {"perspective": "external_law", "review": LegalReviewPanel.compile_review(agent_outputs[unit_id]["external"])}
+                    ]
+                    sys_prompt, synthesis_prompt, internal, external = review_panel.build_synthesis_prompt(reviews)
+                    syntheses[unit_id] = (internal, external)
+                    requests.append(BatchRequest(f"{unit_id}-synthesis", sys_prompt, synthesis_prompt,
+                                                 agent="review_panel", phase="synthesis", run_id=self._unit_run_id(unit_id)))
+                print(f"\nBatch synthesis: {len(requests)} prompts")
+                synthesis_answers = self.runner.run(requests)
+
+                # Evaluation
+                requests = []
+                for unit_id, (_, analysis_text) in units.items():
+                    sys_prompt, eval_prompt = review_panel.build_evaluation_prompt(synthesis_answers[f"{unit_id}-synthesis"], analysis_text)
+                    requests.append(BatchRequest(f"{unit_id}-evaluation", sys_prompt, eval_prompt,
+                                                 agent="review_panel", phase="evaluation", run_id=self._unit_run_id(unit_id)))
+                print(f"\nBatch evaluation: {len(requests)} prompts")
+                evaluation_answers = self.runner.run(requests)
+
+                # Assemble and save one result per hypothetical
+                results, result_paths = [], []
+                for unit_id, (item, analysis_text) in units.items():
+                    try:
+                        evaluation = review_panel.parse_evaluation(evaluation_answers[f"{unit_id}-evaluation"])
+                    except Exception as e:
+                        evaluation = review_panel.fallback_evaluation(e)
+                    internal, external = syntheses[unit_id]
+                    synthesis = review_panel.assemble_synthesis(
+                        internal, external, synthesis_answers[f"{unit_id}-synthesis"], evaluation, source_text=analysis_text
+                    )
+                    result = {
+                        "legal_question": None,
+                        "hypothetical": analysis_text,
+                        "timestamp": self.timestamp,
+                        "model": self.model_backbone,
+                        "agent_outputs": agent_outputs[unit_id],
+                        "final_synthesis": synthesis,
+                        "usage": LEDGER.totals(self._unit_run_id(unit_id)),
+                        "context_packing": {agent_name: contexts[(unit_id, agent_name)].summary() for agent_name in self.retrievers},
+                        "batch": True,
+                    }
+                    result_paths.append(self._save_result(unit_id, item["file"], result))
+                    results.append(result)
+
+                summary = {"timestamp": self.timestamp, "model": self.model_backbone,
+                           "hypotheticals": [item["file"] for item, _ in units.values()],
+                           "usage": LEDGER.totals(),
+                           "timing": TRACER.summary(self.timestamp, wall_s=run_span.elapsed())}
+                try:
+                    store = ResultsStore()
+                    store.ingest(analysis_row(result, path, store.text) for result, path in zip(results, result_paths))
+                except Exception as e:
+                    print(f"Warning: could not add the batch to the results store: {e}")
+                with open(os.path.join(self.results_dir, "batch_summary.json"), 'w') as f:
+                    json.dump(summary, f, indent=2)
+                print(f"\nBatch analysis complete! Estimated cost: ${summary['usage']['total']['cost_usd']:.4f}. Results saved in: {self.results_dir}")
+        finally:
+            TRACER.end_run(self.timestamp)
+        return results
+
+    def _save_result(self, unit_id: str, file_name: str, result: Dict) -> str:
+        """
+        save a single hypothetical's results as json and markdown, return the json path
+        """
+        unit_dir = os.path.join(self.results_dir, f"{unit_id}_{os.path.splitext(file_name)[0]}")
+        os.makedirs(unit_dir, exist_ok=True)
+        output_file = os.path.join(unit_dir, "analysis_results.json")
+        with open(output_file, 'w') as f:
+            json.dump(result, f, indent=2)
+        convert_to_md(output_file, data=result)
+        return output_file
+
+
+def append_to_leaderboard(results: List[Dict], leaderboard_path: str, site_dir: Optional[str] = None) -> None:
+    """
+    append batch results to a leaderboard analysis_results.json (a json list) and index them in the leaderboard site
+    """
+    if site_dir is None:
+        site_dir = os.path.join(os.path.dirname(os.path.abspath(leaderboard_path)), "leaderboard", "site")
+    index = LeaderboardIndex(site_dir) if os.path.isdir(site_dir) else None
+    in_sync = index is not None and os.path.exists(leaderboard_path) and index.meta == source_stamp(leaderboard_path)
+
+    # Only the closing bracket is rewritten, the existing results are never loaded
+    append_json_array(leaderboard_path, results)
+    print(f"Appended {len(results)} results to {leaderboard_path}")
+    if index is not None:
+        index.add_all(results)
+        # If the index already covered the file it covers the grown one too, and leaderboard/generate.py can skip the rescan
+        index.save(source_stamp(leaderboard_path) if in_sync else None)
+        print(f"Indexed {index.added} new runs in {site_dir}")
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Offline batch evaluation of hypotheticals via provider Batch APIs")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini", help="Model with Batch API support (OpenAI or Anthropic)")
+    parser.add_argument("--hypo", type=str, required=True, help="Directory path containing hypothetical PDFs to analyze")
+    parser.add_argument("--select", type=str, default="all", help="Hypotheticals to analyze, e.g. '1,3' or 'all'")
+    parser.add_argument("--poll", type=float, default=30.0, help="Seconds between batch status checks")
+    parser.add_argument("--max-wait", type=float, default=24 * 3600, help="Cancel a batch job after this many seconds")
+    parser.add_argument("--leaderboard", type=str, help="Append results to this analysis_results.json (e.g. ../analysis_results.json)")
+    parser.add_argument("--leaderboard-site", type=str, help="Leaderboard site to index the results in (default: leaderboard/site next to --leaderboard)")
+    parser.add_argument("--vdb-snapshot", action="store_true", help="Retrieve from the published read-only vector store snapshots (python -m helper.vdb_snapshot)")
+    parser.add_argument("--profile", type=str, choices=PROFILE_MODES, help="Profile the run with deterministic cProfile or the low-overhead sampler; output goes to the results directory")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="Sampling interval in seconds for --profile sample")
+    return parser.parse_args()
+
+
+def main():
+    """
+    main execution flow
+    """
+    args = parse_arguments()
+    if not os.path.isdir(args.hypo):
+        raise ValueError(f"The specified hypothetical directory '{args.hypo}' does not exist or is not a directory.")
+
+    api_keys = {
+        'openai': os.getenv('OPENAI_API_KEY'),
+        'deepseek': os.getenv('DEEPSEEK_API_KEY'),
+        'anthropic': os.getenv('ANTHROPIC_API_KEY'),
+    }
+
+    workflow = BatchLegalWorkflow(
+        hypo_dir=args.hypo,
+        api_keys=api_keys,
+        model_backbone=args.model,
+        selection=args.select,
+        poll_interval=args.poll,
+        max_wait=args.max_wait,
+        snapshot=args.vdb_snapshot,
+    )
+    with profile_run(args.profile, workflow.results_dir, interval=args.profile_interval):
+        results = workflow.run()
+    if args.leaderboard:
+        append_to_leaderboard(results, args.leaderboard, args.leaderboard_site)
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,574 @@
+# ----- IMPORTS -----
+
+import json
+import math
+import hashlib
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+# ----- LATENCY -----
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    build a sampler from a latency spec: "constant:S", "uniform:LO,HI" or "lognormal:MEDIAN,SIGMA" (seconds)
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    if kind == "constant" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1]) if values[0] > 0 else 0.0
+    raise ValueError(f"Invalid latency spec '{spec}', expected constant:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+
+
+# ----- CANNED RESPONSES -----
+
+IRAC_APPLICATION = (
+    "Applying these principles, the defendant's conduct fell below the standard expected of a reasonable "
+    "person in the circumstances, and the harm suffered was a foreseeable consequence of that breach. "
+)
+
+def canned_answer(system_prompt: str, prompt: str, answer_tokens: int = 300) -> str:
+    """
+    return a deterministic answer shaped like what the pipeline expects for the given prompt
+    """
+    if "Criterion: [criterion name]" in prompt:
+        criteria = [line[3:].strip() for line in prompt.splitlines() if line.startswith("## ")]
+        sections = [
+            f"Criterion: {criterion}\nScore: 7\nAssessment: Mock assessment of {criterion.lower()}."
+            for criterion in criteria
+        ]
+        return "\n\n".join(sections) + "\n\nOverall Assessment: Mock overall assessment."
+    # IRAC-shaped analysis padded to roughly answer_tokens (4 chars per token)
+    answer = (
+        "Issue: Whether the defendant owed the claimant a duty of care and breached it.\n\n"
+        "Rule: A duty of care arises where harm is reasonably foreseeable and there is sufficient proximity "
+        "between the parties (Spandeck Engineering v DSTA [2007] SGCA 37).\n\n"
+        "Application: "
+    )
+    while len(answer) < answer_tokens * 4:
+        answer += IRAC_APPLICATION
+    return answer + "\n\nConclusion: The claimant is likely to succeed in negligence, subject to any contributory fault."
+
+
+# ----- SERVER STATE -----
+
+class MockState:
+    """Configuration, in-memory files and batch jobs shared by all request handlers"""
+
+    def __init__(
+        self,
+        batch_delay: float = 2.0,
+        latency: str = "constant:0",
+        tokens_per_sec: float = 0.0,
+        error_429: float = 0.0,
+        error_500: float = 0.0,
+        retry_after: float = 1.0,
+        answer_tokens: int = 300,
+        seed: Optional[int] = None
+    ):
+        self.batch_delay = batch_delay
+        self.latency = parse_latency(latency)
+        self.tokens_per_sec = tokens_per_sec
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.retry_after = retry_after
+        self.answer_tokens = answer_tokens
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.prefix_cache = set()
+        self.files = {}
+        self.batches = {}
+        self.message_batches = {}
+
+    def sample(self):
+        """
+        draw (time to first token, injected error status or None) for one completion request
+        """
+        with self.lock:
+            delay = self.latency(self.rng)
+            roll = self.rng.random()
+        if roll < self.error_429:
+            return delay, 429
+        if roll < self.error_429 + self.error_500:
+            return delay, 500
+        return delay, None
+
+    def generation_time(self, answer: str) -> float:
+        return (len(answer) / 4) / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.lock:
+            self.stats[key] += amount
+
+
+# Prompt caching is simulated like the providers do it: OpenAI caches prefixes of at least
+# 1024 tokens in 128-token steps, Anthropic caches the prefix up to each cache_control block
+CACHE_MIN_CHARS = 1024 * 4
+CACHE_STEP_CHARS = 128 * 4
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def openai_cached_chars(state: "MockState", prompt_text: str) -> int:
+    """
+    length of the longest previously seen prefix of prompt_text, and remember this prompt's prefixes
+    """
+    steps = range(CACHE_MIN_CHARS, len(prompt_text) + 1, CACHE_STEP_CHARS)
+    digests = [_digest(prompt_text[:end]) for end in steps]
+    with state.lock:
+        cached = max((end for end, key in zip(steps, digests) if key in state.prefix_cache), default=0)
+        state.prefix_cache.update(digests)
+    return cached
+
+
+def anthropic_cache_chars(state: "MockState", body: dict):
+    """
+    (read, written) characters for the cache_control breakpoints of a messages request
+    """
+    blocks = []
+    system = body.get("system", "")
+    blocks.extend(system if isinstance(system, list) else [{"type": "text", "text": system}])
+    for message in body.get("messages", []):
+        content = message["content"]
+        blocks.extend(content if isinstance(content, list) else [{"type": "text", "text": content}])
+    prefix, read, written = "", 0, 0
+    for block in blocks:
+        prefix += block.get("text", "")
+        if not block.get("cache_control"):
+            continue
+        key = _digest(prefix)
+        with state.lock:
+            hit = key in state.prefix_cache
+            state.prefix_cache.add(key)
+        if hit:
+            read = len(prefix)
+        elif len(prefix) >= CACHE_MIN_CHARS:
+            written = len(prefix) - read
+    return read, written
+
+
+def _usage_openai(prompt_text: str, answer: str, cached_chars: int = 0) -> dict:
+    prompt_tokens, completion_tokens = len(prompt_text) // 4, len(answer) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_chars // 4}}
+
+
+def _text_of(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content or [])
+
+
+def _chat_prompts(body: dict):
+    messages = body.get("messages", [])
+    system_prompt = "".join(_text_of(m["content"]) for m in messages if m["role"] == "system")
+    prompt = "".join(_text_of(m["content"]) for m in messages if m["role"] != "system")
+    return system_prompt, prompt
+
+
+def _message_prompts(body: dict):
+    return _text_of(body.get("system", "")), "".join(_text_of(m["content"]) for m in body.get("messages", []))
+
+
+def chat_completion_body(body: dict, answer: str, cached_chars: int = 0) -> dict:
+    system_prompt, prompt = _chat_prompts(body)
+    # n samples share one prompt, as with the real API
+    n = int(body.get("n") or 1)
+    usage = _usage_openai(system_prompt + prompt, answer * n, cached_chars)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": i, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}} for i in range(n)],
+        "usage": usage,
+    }
+
+
+def message_body(body: dict, answer: str, cache_chars=(0, 0)) -> dict:
+    system_prompt, prompt = _message_prompts(body)
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:12]}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "mock"),
+        "content": [{"type": "text", "text": answer}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": (len(system_prompt + prompt) - sum(cache_chars)) // 4,
+            "output_tokens": len(answer) // 4,
+            "cache_read_input_tokens": cache_chars[0] // 4,
+            "cache_creation_input_tokens": cache_chars[1] // 4,
+        },
+    }
+
+
+def _stream_pieces(answer: str):
+    """split an answer into roughly token-sized pieces (words keep their trailing space)"""
+    words = answer.split(" ")
+    return [w + " " for w in words[:-1]] + [words[-1]]
+
+
+# ----- REQUEST HANDLER -----
+
+class MockHandler(BaseHTTPRequestHandler):
+    state: MockState = None
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY keep-alive clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, text: str, content_type="application/jsonl"):
+        data = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _base_url(self) -> str:
+        return f"http://{self.headers.get('Host', 'localhost')}"
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        parts = path.strip("/").split("/")
+        state = self.state
+        # /v1/files/{id}/content
+        if len(parts) == 4 and parts[1] == "files" and parts[3] == "content":
+            with state.lock:
+                entry = state.files.get(parts[2])
+            if entry is None:
+                return self._send_json({"error": {"message": "file not found"}}, 404)
+            return self._send_text(entry["content"])
+        # /v1/batches/{id}
+        if len(parts) == 3 and parts[1] == "batches":
+            batch = self._refresh_batch(parts[2])
+            return self._send_json(batch) if batch else self._send_json({"error": {"message": "not found"}}, 404)
+        # /v1/messages/batches/{id} and /v1/messages/batches/{id}/results
+        if len(parts) >= 4 and parts[1] == "messages" and parts[2] == "batches":
+            batch = self._refresh_message_batch(parts[3])
+            if batch is None:
+                return self._send_json({"error": {"message": "not found"}}, 404)
+            if len(parts) == 5 and parts[4] == "results":
+                return self._send_text(batch["_results"])
+            return self._send_json({k: v for k, v in batch.items() if not k.startswith("_")})
+        if path in ("/health", "/v1/health"):
+            return self._send_json({"status": "healthy"})
+        if path in ("/stats", "/v1/stats"):
+            with state.lock:
+                return self._send_json(dict(state.stats))
+        self._send_json({"error": {"message": f"unknown path {path}"}}, 404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        parts = path.strip("/").split("/")
+        raw = self._read_body()
+        if path == "/v1/chat/completions":
+            return self._completion(json.loads(raw), anthropic=False)
+        if path == "/v1/messages":
+            return self._completion(json.loads(raw), anthropic=True)
+        if path == "/v1/files":
+            return self._send_json(self._create_file(raw))
+        if path == "/v1/batches":
+            return self._send_json(self._create_batch(json.loads(raw)))
+        if len(parts) == 4 and parts[1] == "batches" and parts[3] == "cancel":
+            return self._send_json(self._cancel_batch(parts[2]))
+        if path == "/v1/messages/batches":
+            return self._send_json(self._create_message_batch(json.loads(raw)))
+        if len(parts) == 5 and parts[2] == "batches" and parts[4] == "cancel":
+            with self.state.lock:
+                batch = self.state.message_batches[parts[3]]
+                batch["processing_status"] = "ended"
+            return self._send_json({k: v for k, v in batch.items() if not k.startswith("_")})
+        self._send_json({"error": {"message": f"unknown path {path}"}}, 404)
+
+    # ----- SYNCHRONOUS COMPLETIONS -----
+
+    def _completion(self, body: dict, anthropic: bool) -> None:
+        state = self.state
+        state.count("requests")
+        delay, error = state.sample()
+        time.sleep(delay)
+        if error == 429:
+            state.count("injected_429")
+            return self._send_json(
+                {"type": "error", "error": {"type": "rate_limit_error", "message": "Mock rate limit"}},
+                429, headers={"Retry-After": str(state.retry_after)},
+            )
+        if error == 500:
+            state.count("injected_500")
+            return self._send_json({"type": "error", "error": {"type": "api_error", "message": "Mock server error"}}, 500)
+
+        system_prompt, prompt = _message_prompts(body) if anthropic else _chat_prompts(body)
+        state.count("prompt_tokens", len(system_prompt + prompt) // 4)
+        answer = canned_answer(system_prompt, prompt, state.answer_tokens)
+        if anthropic:
+            cache_chars = anthropic_cache_chars(state, body)
+        else:
+            cache_chars = (openai_cached_chars(state, system_prompt + prompt), 0)
+        if cache_chars[0]:
+            state.count("cache_hits")
+        if body.get("stream"):
+            state.count("streams")
+            return self._stream_anthropic(body, answer) if anthropic else self._stream_openai(body, answer)
+        time.sleep(state.generation_time(answer))
+        if anthropic:
+            return self._send_json(message_body(body, answer, cache_chars))
+        self._send_json(chat_completion_body(body, answer, cache_chars[0]))
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _event(self, data: dict, event: Optional[str] = None) -> None:
+        prefix = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _pace(self) -> None:
+        if self.state.tokens_per_sec > 0:
+            time.sleep(1 / self.state.tokens_per_sec)
+
+    def _stream_openai(self, body: dict, answer: str) -> None:
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "mock")}
+        self._start_stream()
+        self._event({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        for piece in _stream_pieces(answer):
+            self._pace()
+            self._event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+        self._event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            system_prompt, prompt = _chat_prompts(body)
+            self._event({**base, "choices": [], "usage": _usage_openai(system_prompt + prompt, answer)})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _stream_anthropic(self, body: dict, answer: str) -> None:
+        message = message_body(body, answer)
+        usage = message["usage"]
+        self._start_stream()
+        self._event({"type": "message_start", "message": {**message, "content": [], "stop_reason": None,
+                                                          "usage": {**usage, "output_tokens": 1}}}, "message_start")
+        self._event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                    "content_block_start")
+        for piece in _stream_pieces(answer):
+            self._pace()
+            self._event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}},
+                        "content_block_delta")
+        self._event({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        self._event({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                     "usage": {"output_tokens": usage["output_tokens"]}}, "message_delta")
+        self._event({"type": "message_stop"}, "message_stop")
+
+    # ----- OPENAI BATCH -----
+
+    def _create_file(self, raw: bytes) -> dict:
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=HTTP).parsebytes(header + raw)
+        content, filename, purpose = "", "upload.jsonl", "batch"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                filename = part.get_filename() or filename
+                content = part.get_payload(decode=True).decode("utf-8")
+            elif name == "purpose":
+                purpose = part.get_payload(decode=True).decode("utf-8")
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        entry = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                 "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.state.lock:
+            self.state.files[file_id] = {**entry, "content": content}
+        return entry
+
+    def _create_batch(self, body: dict) -> dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        with self.state.lock:
+            input_file = self.state.files[body["input_file_id"]]
+            count = len([line for line in input_file["content"].splitlines() if line.strip()])
+            batch = {
+                "id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+                "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                "error_file_id": None, "request_counts": {"total": count, "completed": 0, "failed": 0},
+            }
+            self.state.batches[batch_id] = batch
+            self.state.stats["batches"] += 1
+        return batch
+
+    def _refresh_batch(self, batch_id: str):
+        state = self.state
+        with state.lock:
+            batch = state.batches.get(batch_id)
+            if batch is None or batch["status"] != "in_progress":
+                return batch
+            if time.time() - batch["created_at"] < state.batch_delay:
+                return batch
+            lines = []
+            for line in state.files[batch["input_file_id"]]["content"].splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                answer = canned_answer(*_chat_prompts(item["body"]), state.answer_tokens)
+                lines.append(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": item["custom_id"],
+                    "response": {"status_code": 200, "request_id": uuid.uuid4().hex,
+                                 "body": chat_completion_body(item["body"], answer)},
+                    "error": None,
+                }))
+            output_id = f"file-{uuid.uuid4().hex[:12]}"
+            state.files[output_id] = {"id": output_id, "object": "file", "purpose": "batch_output",
+                                      "content": "\n".join(lines) + "\n"}
+            batch.update(status="completed", output_file_id=output_id, completed_at=int(time.time()),
+                         request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+            return batch
+
+    def _cancel_batch(self, batch_id: str) -> dict:
+        with self.state.lock:
+            batch = self.state.batches[batch_id]
+            batch["status"] = "cancelled"
+            return batch
+
+    # ----- ANTHROPIC MESSAGE BATCH -----
+
+    def _create_message_batch(self, body: dict) -> dict:
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:12]}"
+        now = time.time()
+        batch = {
+            "id": batch_id, "type": "message_batch", "processing_status": "in_progress",
+            "request_counts": {"processing": len(body["requests"]), "succeeded": 0, "errored": 0,
+                               "canceled": 0, "expired": 0},
+            "created_at": _iso(now), "expires_at": _iso(now + 86400), "ended_at": None,
+            "cancel_initiated_at": None, "archived_at": None, "results_url": None,
+            "_requests": body["requests"], "_created": now, "_results": "",
+        }
+        with self.state.lock:
+            self.state.message_batches[batch_id] = batch
+            self.state.stats["batches"] += 1
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    def _refresh_message_batch(self, batch_id: str):
+        state = self.state
+        with state.lock:
+            batch = state.message_batches.get(batch_id)
+            if batch is None or batch["processing_status"] == "ended":
+                return batch
+            if time.time() - batch["_created"] < state.batch_delay:
+                return batch
+            lines = []
+            for request in batch["_requests"]:
+                answer = canned_answer(*_message_prompts(request["params"]), state.answer_tokens)
+                lines.append(json.dumps({
+                    "custom_id": request["custom_id"],
+                    "result": {"type": "succeeded", "message": message_body(request["params"], answer)},
+                }))
+            batch.update(
+                processing_status="ended", ended_at=_iso(time.time()), _results="\n".join(lines) + "\n",
+                results_url=f"{self._base_url()}/v1/messages/batches/{batch_id}/results",
+                request_counts={"processing": 0, "succeeded": len(lines), "errored": 0, "canceled": 0, "expired": 0},
+            )
+            return batch
+
+
+def _iso(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+def serve(host: str = "127.0.0.1", port: int = 8089, **state_kwargs) -> ThreadingHTTPServer:
+    """
+    create (but do not start) a mock server; state_kwargs are passed to MockState. call serve_forever() on the result
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(**state_kwargs)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    add the mock server options to a parser (shared with bench/run_benchmark.py)
+    """
+    parser.add_argument("--latency", type=str, default="lognormal:0.8,0.4",
+                        help="Time to first token: constant:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--tps", type=float, default=80.0, help="Generated tokens per second (0 for instant responses)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of completions answered with 429")
+    parser.add_argument("--error-500", type=float, default=0.0, help="Fraction of completions answered with 500")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--answer-tokens", type=int, default=300, help="Approximate length of canned analyses")
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="Seconds before a batch job completes")
+    parser.add_argument("--seed", type=int, help="Random seed for latency and error injection")
+
+
+def server_args(args: argparse.Namespace) -> list:
+    """
+    turn parsed mock server options back into command-line flags
+    """
+    flags = [
+        "--latency", args.latency, "--tps", str(args.tps), "--error-429", str(args.error_429),
+        "--error-500", str(args.error_500), "--retry-after", str(args.retry_after),
+        "--answer-tokens", str(args.answer_tokens), "--batch-delay", str(args.batch_delay),
+    ]
+    if args.seed is not None:
+        flags += ["--seed", str(args.seed)]
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI/Anthropic-compatible mock LLM server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = serve(
+        args.host, args.port,
+        latency=args.latency, tokens_per_sec=args.tps, error_429=args.error_429, error_500=args.error_500,
+        retry_after=args.retry_after, answer_tokens=args.answer_tokens, batch_delay=args.batch_delay, seed=args.seed,
+    )
+    print(f"Mock LLM server on http://{args.host}:{args.port} "
+          f"(OPENAI_BASE_URL=http://{args.host}:{args.port}/v1, ANTHROPIC_BASE_URL=http://{args.host}:{args.port})")
+    server.serve_forever()
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# ----- REQUIRED IMPORTS -----
+
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+import urllib.request
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# bench/ scripts are run from src/ like main.py, but make the helper package importable regardless
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from mock_llm_server import add_server_arguments, server_args
+
+# ----- RESOURCE SAMPLING -----
+
+def current_rss_mb() -> float:
+    """
+    resident set size of this process in MB (falls back to peak RSS where /proc is unavailable)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(np.max(values)),
+    }
+
+
+class StageMeter:
+    """
+    Wraps pipeline methods to record wall time, CPU time and RSS per stage.
+
+    CPU is thread CPU time of the calling thread, so concurrent stages are not
+    charged for each other. Nested stages (e.g. evaluation inside synthesis) are
+    inclusive of their children.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(list)
+        self._patched = []
+
+    def wrap(self, owner, attr: str, stage: str) -> None:
+        original = getattr(owner, attr)
+        meter = self
+
+        def timed(*args, **kwargs):
+            rss_before = current_rss_mb()
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                rss_after = current_rss_mb()
+                with meter._lock:
+                    meter.calls[stage].append({
+                        "wall_s": time.perf_counter() - wall,
+                        "cpu_s": time.thread_time() - cpu,
+                        "rss_mb": rss_after,
+                        "rss_delta_mb": rss_after - rss_before,
+                    })
+
+        self._patched.append((owner, attr, original))
+        setattr(owner, attr, timed)
+
+    def restore(self) -> None:
+        for owner, attr, original in reversed(self._patched):
+            setattr(owner, attr, original)
+        self._patched.clear()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+    def report(self) -> Dict[str, Dict]:
+        with self._lock:
+            calls = {stage: list(entries) for stage, entries in self.calls.items()}
+        return {
+            stage: {
+                "calls": len(entries),
+                "wall_s": percentiles([e["wall_s"] for e in entries]),
+                "cpu_s_total": sum(e["cpu_s"] for e in entries),
+                "cpu_s_per_call": sum(e["cpu_s"] for e in entries) / len(entries),
+                "rss_mb_peak": max(e["rss_mb"] for e in entries),
+                "rss_delta_mb_max": max(e["rss_delta_mb"] for e in entries),
+            }
+            for stage, entries in calls.items()
+        }
+
+
+def instrument(meter: StageMeter) -> None:
+    """
+    attach the meter to every stage of the sync and batch pipelines
+    """
+    import main
+    import batch_eval
+    from helper.agent_clients import AgentClient
+    from helper.legalagents import LegalReviewPanel
+    from helper.batch import BatchRunner
+    from helper.providers import get_backend, list_models
+
+    meter.wrap(main.LegalSimulationWorkflow, "__init__", "init")
+    meter.wrap(main, "extract_hypotheticals", "hypothetical_extraction")
+    meter.wrap(batch_eval, "extract_hypotheticals", "hypothetical_extraction")
+    meter.wrap(AgentClient, "retrieve_packed", "retrieval")
+    meter.wrap(AgentClient, "perform_phase_analysis", "agent_phase")
+    meter.wrap(LegalReviewPanel, "synthesize_reviews", "synthesis")
+    meter.wrap(LegalReviewPanel, "evaluate_legal_analysis", "evaluation")
+    meter.wrap(LegalReviewPanel, "evaluate_factual_consistency", "factual_consistency")
+    meter.wrap(main.LegalSimulationWorkflow, "_save_analysis_results", "save_results")
+    meter.wrap(batch_eval.BatchLegalWorkflow, "_save_result", "save_results")
+    meter.wrap(BatchRunner, "run", "batch_job")
+    for name in list_models():
+        meter.wrap(get_backend(name), "complete", "llm_call")
+
+
+# ----- MOCK SERVER -----
+
+@contextlib.contextmanager
+def mock_server(args: argparse.Namespace):
+    """
+    run the mock server in a child process (so its CPU does not count against the pipeline)
+    and point every provider at it
+    """
+    url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_llm_server.py"),
+         "--port", str(args.port)] + server_args(args),
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{url}/health", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise Exception(f"Mock server did not start on {url}")
+
+        overrides = {
+            "OPENAI_BASE_URL": f"{url}/v1",
+            "ANTHROPIC_BASE_URL": url,
+            "DEEPSEEK_BASE_URL": f"{url}/v1",
+            "LM_STUDIO_BASE_URL": f"{url}/v1",
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "mock",
+            "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY") or "mock",
+            "DEEPSEEK_API_KEY": os.getenv("DEEPSEEK_API_KEY") or "mock",
+        }
+        if not args.ratelimit:
+            # Real provider limits would throttle the mock, and must not share buckets with real runs
+            config_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "ratelimits.json")
+            with open(config_path, "w") as f:
+                json.dump({"backend": "memory", "default": {}, "models": {}}, f)
+            overrides["RATELIMIT_CONFIG"] = config_path
+        os.environ.update(overrides)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def mock_stats(url: str) -> Dict:
+    with urllib.request.urlopen(f"{url}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+# ----- SCENARIOS -----
+
+def _wait_for_new_second(last: Optional[str]) -> str:
+    # Workflows use a second-resolution timestamp as run id and results directory
+    while True:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        if stamp != last:
+            return stamp
+        time.sleep(0.05)
+
+
+def run_sync(args: argparse.Namespace, api_keys: Dict, fan_out: bool = False) -> List[float]:
+    """
+    run LegalSimulationWorkflow end to end args.runs times and return per-run latencies
+    """
+    from main import LegalSimulationWorkflow
+
+    latencies, last = [], None
+    for i in range(args.runs):
+        last = _wait_for_new_second(last)
+        started = time.perf_counter()
+        workflow = LegalSimulationWorkflow(
+            legal_question="" if args.hypo else args.question,
+            api_keys=api_keys,
+            model_backbone=args.model,
+            hypothetical=args.hypo or "",
+            deadline=args.deadline,
+            selection=args.select,
+            concurrency=args.concurrency,
+            fan_out=fan_out,
+        )
+        workflow.perform_legal_analysis()
+        latencies.append(time.perf_counter() - started)
+        print(f"  {'fanout' if fan_out else 'sync'} run {i + 1}/{args.runs}: {latencies[-1]:.2f}s", file=sys.__stdout__)
+    return latencies
+
+
+def run_batch(args: argparse.Namespace, api_keys: Dict) -> List[float]:
+    """
+    run BatchLegalWorkflow args.runs times and return per-run latencies
+    """
+    from batch_eval import BatchLegalWorkflow
+
+    latencies, last = [], None
+    for i in range(args.runs):
+        last = _wait_for_new_second(last)
+        started = time.perf_counter()
+        workflow = BatchLegalWorkflow(
+            hypo_dir=args.hypo,
+            api_keys=api_keys,
+            model_backbone=args.model,
+            selection=args.select,
+            poll_interval=args.poll,
+        )
+        workflow.run()
+        latencies.append(time.perf_counter() - started)
+        print(f"  batch run {i + 1}/{args.runs}: {latencies[-1]:.2f}s", file=sys.__stdout__)
+    return latencies
+
+
+def run_fanout(args: argparse.Namespace, api_keys: Dict) -> List[float]:
+    """
+    run LegalSimulationWorkflow with one analysis unit per (scenario, question) pair
+    """
+    return run_sync(args, api_keys, fan_out=True)
+
+
+SCENARIOS: Dict[str, Callable] = {"sync": run_sync, "fanout": run_fanout, "batch": run_batch}
+
+
+def summarize(name: str, latencies: List[float], stages: Dict, stats: Dict) -> Dict:
+    total = sum(latencies)
+    return {
+        "scenario": name,
+        "runs": len(latencies),
+        "runs_per_min": 60 * len(latencies) / total if total else 0.0,
+        "latency_s": percentiles(latencies),
+        "stages": stages,
+        "mock_server": stats,
+    }
+
+
+def print_summary(summary: Dict) -> None:
+    latency = summary["latency_s"]
+    print(f"\n=== {summary['scenario']} ===")
+    print(f"runs: {summary['runs']}  runs/min: {summary['runs_per_min']:.2f}  "
+          f"p50: {latency.get('p50', 0):.2f}s  p95: {latency.get('p95', 0):.2f}s")
+    print(f"mock server: {summary['mock_server']}")
+    print(f"{'stage':<24}{'calls':>7}{'p50 s':>9}{'p95 s':>9}{'cpu s':>9}{'cpu/call':>10}{'rss MB':>9}{'ΔrssMB':>9}")
+    for stage, row in sorted(summary["stages"].items(), key=lambda item: -item[1]["cpu_s_total"]):
+        print(f"{stage:<24}{row['calls']:>7}{row['wall_s']['p50']:>9.3f}{row['wall_s']['p95']:>9.3f}"
+              f"{row['cpu_s_total']:>9.3f}{row['cpu_s_per_call']:>10.4f}{row['rss_mb_peak']:>9.1f}{row['rss_delta_mb_max']:>9.1f}")
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against the local mock LLM server")
+    parser.add_argument("--scenario", type=str, default="sync", help="Comma-separated scenarios: sync, fanout, batch")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per scenario")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini", help="Model name; requests are served by the mock")
+    parser.add_argument("--question", type=str, default="Can an AI model hold liability under current IP laws?")
+    parser.add_argument("--hypo", type=str, help="Directory of hypothetical PDFs (required for the batch scenario)")
+    parser.add_argument("--select", type=str, default="all", help="Hypotheticals to analyze, e.g. '1,3' or 'all'")
+    parser.add_argument("--concurrency", type=int, default=4, help="Agent phases running at once in the sync and fanout scenarios")
+    parser.add_argument("--deadline", type=float, default=3600, help="Per-run time budget in seconds")
+    parser.add_argument("--poll", type=float, default=1.0, help="Batch status poll interval in seconds")
+    parser.add_argument("--port", type=int, default=8089, help="Port for the mock server")
+    parser.add_argument("--ratelimit", action="store_true", help="Keep settings/ratelimits.json limits instead of disabling them")
+    parser.add_argument("--output", type=str, help="Where to write the json report (default results/benchmark_<timestamp>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline output")
+    add_server_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """
+    main execution flow
+    """
+    args = parse_arguments()
+    scenarios = [s.strip() for s in args.scenario.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenarios {unknown}. Available: {list(SCENARIOS)}")
+    for name in ("batch", "fanout"):
+        if name in scenarios and not args.hypo:
+            raise ValueError(f"The {name} scenario needs --hypo")
+
+    report = {
+        "timestamp": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "model": args.model,
+        "mock": {key: value for key, value in vars(args).items()
+                 if key in ("latency", "tps", "error_429", "error_500", "retry_after", "answer_tokens", "batch_delay", "seed")},
+        "scenarios": [],
+    }
+    with mock_server(args) as url:
+        api_keys = {
+            'openai': os.getenv('OPENAI_API_KEY'),
+            'deepseek': os.getenv('DEEPSEEK_API_KEY'),
+            'anthropic': os.getenv('ANTHROPIC_API_KEY'),
+        }
+        meter = StageMeter()
+        instrument(meter)
+        try:
+            for name in scenarios:
+                print(f"\nRunning scenario '{name}' ({args.runs} runs) against {url}...")
+                meter.reset()
+                stats_before = mock_stats(url)
+                output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+                with output:
+                    latencies = SCENARIOS[name](args, api_keys)
+                stats_after = mock_stats(url)
+                stats = {key: stats_after.get(key, 0) - stats_before.get(key, 0) for key in stats_after}
+                summary = summarize(name, latencies, meter.report(), stats)
+                print_summary(summary)
+                report["scenarios"].append(summary)
+        finally:
+            meter.restore()
+
+    output_file = args.output or os.path.join("results", f"benchmark_{report['timestamp']}.json")
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report saved to {output_file}")
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    main()
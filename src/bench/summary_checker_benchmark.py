@@ -0,0 +1,145 @@
+# ----- REQUIRED IMPORTS -----
+
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import argparse
+
+import torch
+
+# bench/ scripts are run from src/ like main.py, but make eval.py importable regardless
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from eval import SummaryChecker
+
+# ----- SYNTHETIC EXAM ANSWERS -----
+
+FACTS = [
+    "The occupier owed the visitor a duty of care under the Occupiers' Liability Act.",
+    "The defendant breached the standard of care by leaving the floor wet without a warning sign.",
+    "The claimant slipped and fractured her wrist in the supermarket aisle.",
+    "Causation is satisfied because the injury would not have occurred but for the wet floor.",
+    "The damage was a reasonably foreseeable consequence of the breach.",
+    "The claimant was partly at fault for running while looking at her phone.",
+    "Damages should therefore be reduced for contributory negligence.",
+    "The exclusion notice at the entrance does not exclude liability for personal injury.",
+    "The employer is vicariously liable for the cleaner who mopped the aisle.",
+    "The contract between the parties contained an arbitration clause.",
+    "The tenancy agreement required the landlord to repair the roof.",
+    "The company director owed fiduciary duties to the company, not to its shareholders.",
+    "A misrepresentation induced the buyer to enter into the sale agreement.",
+    "The limitation period for the claim in tort is six years from the date of damage.",
+    "The court may award nominal damages where no loss is proved.",
+]
+
+
+def make_answer(rng: random.Random, sentences: int) -> str:
+    return " ".join(rng.choice(FACTS) for _ in range(sentences))
+
+
+def legacy_evaluate(checker: SummaryChecker, source_document: str, summary: str) -> dict:
+    """
+    the previous evaluate_summary: one forward pass per (source, summary) sentence pair, without the per-pair print
+    """
+    source_sentences = checker.tokenize_sentences(source_document)
+    summary_sentences = checker.tokenize_sentences(summary)
+    total_entailment_prob = 0
+    total_contradiction_prob = 0
+    covered_sentences = set()
+    for i, source_sentence in enumerate(source_sentences):
+        for summary_sentence in summary_sentences:
+            probabilities = checker.check_sentences(source_sentence, summary_sentence)
+            entailment_prob = probabilities[0][checker.entailment_index].item()
+            total_entailment_prob += entailment_prob
+            total_contradiction_prob += probabilities[0][checker.contradiction_index].item()
+            if entailment_prob > 0.5:
+                covered_sentences.add(i)
+    total_pairs = len(source_sentences) * len(summary_sentences)
+    return {
+        "Average Entailment Score": total_entailment_prob / total_pairs * 100,
+        "Average Contradiction Score": total_contradiction_prob / total_pairs * 100,
+        "Coverage Percentage": len(covered_sentences) / len(source_sentences) * 100,
+    }
+
+
+def run(name, evaluate, documents) -> dict:
+    started = time.perf_counter()
+    scores = [evaluate(source, summary) for source, summary in documents]
+    elapsed = time.perf_counter() - started
+    pairs = sum(score.get("Pairs Scored", 0) for score in scores)
+    print(f"  {name:<22}{elapsed:>10.2f}s{len(documents) / elapsed:>10.2f} docs/s")
+    return {"strategy": name, "seconds": elapsed, "docs_per_second": len(documents) / elapsed,
+            "pairs_scored": pairs, "scores": scores}
+
+
+def max_difference(reference: list, scores: list) -> float:
+    return max(abs(a[key] - b[key]) for a, b in zip(reference, scores) for key in a)
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark per-pair vs batched NLI scoring in SummaryChecker")
+    parser.add_argument("--model", type=str, default="cross-encoder/nli-deberta-v3-xsmall", help="NLI model")
+    parser.add_argument("--prefilter-model", type=str, default="sentence-transformers/all-MiniLM-L6-v2", help="Embedding model for the prefilter")
+    parser.add_argument("--prefilter-threshold", type=float, default=0.2, help="Cosine similarity below which pairs are skipped")
+    parser.add_argument("--documents", type=int, default=10, help="(source, summary) documents to score")
+    parser.add_argument("--source-sentences", type=int, default=30, help="Sentences per source document")
+    parser.add_argument("--summary-sentences", type=int, default=10, help="Sentences per summary")
+    parser.add_argument("--batch-size", type=int, default=32, help="Pairs per forward pass")
+    parser.add_argument("--max-length", type=int, help="Truncate batched pairs at this many tokens (default: the model maximum)")
+    parser.add_argument("--device", type=str, help="torch device (default cuda if available)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=str, help="Where to write the json report (default results/summary_checker_benchmark_<timestamp>.json)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    main execution flow
+    """
+    args = parse_arguments()
+    torch.manual_seed(args.seed)
+    rng = random.Random(args.seed)
+    documents = [(make_answer(rng, args.source_sentences), make_answer(rng, args.summary_sentences)) for _ in range(args.documents)]
+
+    checker = SummaryChecker(args.model, device=args.device, batch_size=args.batch_size, max_length=args.max_length)
+    filtered = SummaryChecker(args.model, device=args.device, batch_size=args.batch_size, max_length=args.max_length,
+                              prefilter_model=args.prefilter_model, prefilter_threshold=args.prefilter_threshold)
+    # Warm up both models so neither strategy pays for lazy initialisation
+    checker.evaluate_summary(*documents[0])
+    filtered.evaluate_summary(*documents[0])
+
+    report = {
+        "timestamp": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "pairs_total": args.documents * args.source_sentences * args.summary_sentences,
+        "results": [],
+    }
+    print(f"{args.documents} documents x {args.source_sentences} x {args.summary_sentences} sentence pairs on {checker.device}")
+    legacy = run("per-pair (legacy)", lambda s, h: legacy_evaluate(checker, s, h), documents)
+    batched = run("batched", checker.evaluate_summary, documents)
+    prefiltered = run("batched + prefilter", filtered.evaluate_summary, documents)
+
+    for row in (legacy, batched, prefiltered):
+        row["speedup"] = legacy["seconds"] / row["seconds"]
+        row["max_score_difference"] = max_difference(legacy["scores"], row["scores"])
+        report["results"].append(row)
+        print(f"  {row['strategy']:<22} speedup {row['speedup']:6.1f}x  max score difference {row['max_score_difference']:.3f}"
+              f"  pairs scored {row['pairs_scored'] or report['pairs_total']}")
+
+    output_file = args.output or os.path.join("results", f"summary_checker_benchmark_{report['timestamp']}.json")
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report saved to {output_file}")
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# ----- REQUIRED IMPORTS -----
+
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import argparse
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+# bench/ scripts are run from src/ like main.py, but make the helper package importable regardless
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from helper.vdb_manager import db
+from helper.metadata import build_where, date_ordinal
+from run_benchmark import percentiles
+
+# ----- SYNTHETIC CORPUS -----
+
+TAGS = [
+    "negligence", "duty of care", "contract", "misrepresentation", "estoppel", "trusts", "criminal", "evidence",
+    "sentencing", "defamation", "employment", "tenancy", "company", "insolvency", "arbitration", "family",
+    "intellectual property", "privacy", "administrative", "constitutional", "tort", "equity", "restitution",
+    "property", "banking", "insurance", "shipping", "competition", "tax", "immigration",
+]
+COURTS = [("SGCA", "Singapore"), ("SGHC", "Singapore"), ("SGDC", "Singapore"), ("UKSC", "United Kingdom"),
+          ("EWCA", "England"), ("EWHC", "England"), ("U.S.", "United States"), ("F.3d", "USA")]
+
+
+class TopicEmbedding(EmbeddingFunction):
+    """
+    Embeds queries of the form "topic:<n>" near that topic's centroid, so similarity
+    thresholds select a realistic slice of the corpus without loading a real model
+    """
+
+    def __init__(self, centroids: np.ndarray, noise: float, seed: int):
+        self.centroids = centroids
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = []
+        for text in input:
+            topic = int(text.split(":", 1)[1]) if text.startswith("topic:") else 0
+            vector = self.centroids[topic] + self.noise * self.rng.standard_normal(self.centroids.shape[1])
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+
+
+def build_corpus(store: db, collection: str, args: argparse.Namespace, centroids: np.ndarray) -> float:
+    """
+    ingest args.chunks synthetic chunks through db.add_documents (metadata normalization and bm25 included)
+    """
+    rng = np.random.default_rng(args.seed)
+    pyrng = random.Random(args.seed)
+    started = time.perf_counter()
+    for offset in range(0, args.chunks, args.batch):
+        size = min(args.batch, args.chunks - offset)
+        topics = rng.integers(0, len(centroids), size)
+        vectors = centroids[topics] + args.doc_noise * rng.standard_normal((size, centroids.shape[1]))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        documents, metadatas = [], []
+        for topic in topics:
+            court, jurisdiction = pyrng.choice(COURTS)
+            year = pyrng.randint(1965, 2024)
+            citation = f"[{year}] {court} {pyrng.randint(1, 400)}" if court.isalpha() else f"{pyrng.randint(1, 600)} {court} {pyrng.randint(1, 999)}"
+            documents.append(f"Topic {topic} passage citing {citation} on {pyrng.choice(TAGS)} and related principles.")
+            metadatas.append({
+                "case_date": f"{pyrng.randint(1, 28):02d}/{pyrng.randint(1, 12):02d}/{year}",
+                "jurisdiction": jurisdiction,
+                "court": court,
+                "tags": pyrng.sample(TAGS, pyrng.randint(1, 3)),
+            })
+        store.add_documents(collection, documents, metadatas,
+                            ids=[f"c{offset + i}" for i in range(size)], embeddings=vectors.tolist())
+        if (offset // args.batch) % 10 == 0:
+            print(f"  ingested {offset + size}/{args.chunks} chunks ({time.perf_counter() - started:.0f}s)")
+    return time.perf_counter() - started
+
+
+# ----- QUERY STRATEGIES -----
+
+def legacy_query(store: db, collection: str, query: str, filters: Dict, threshold: float) -> List:
+    """
+    the previous approach: pull every neighbour into Python, then filter metadata and sort by date there
+    """
+    chroma = store.collections[collection]
+    result = chroma.query(query_texts=[query], n_results=chroma.count(), include=["documents", "metadatas", "distances"])
+    wanted_tags = set(filters.get("tags") or [])
+    hits = []
+    for doc, metadata, distance in zip(result["documents"][0], result["metadatas"][0], result["distances"][0]):
+        if 1 - distance < threshold:
+            continue
+        if wanted_tags and not wanted_tags & {t.strip() for t in metadata.get("tags", "").split(",")}:
+            continue
+        if filters.get("jurisdiction") and metadata.get("jurisdiction") != filters["jurisdiction"]:
+            continue
+        if filters.get("min_court_level") is not None and metadata.get("court_level", -1) < filters["min_court_level"]:
+            continue
+        if filters.get("date_from") and date_ordinal(metadata) < date_ordinal({"case_date": filters["date_from"]}):
+            continue
+        hits.append((doc, metadata, distance))
+    return sorted(hits, key=lambda hit: date_ordinal(hit[1]), reverse=True)
+
+
+def indexed_query(store: db, collection: str, query: str, filters: Dict, threshold: float) -> List:
+    """
+    the indexed approach: chroma where pre-filter on normalized fields, threshold-bounded candidate growth
+    """
+    where_filters = {key: value for key, value in filters.items() if key != "tags"}
+    result = store.query_collection(collection, query, tags=filters.get("tags"), similarity_threshold=threshold,
+                                    filters=where_filters, order="date")
+    return result["documents"]
+
+
+FILTER_SETS = {
+    "unfiltered": {},
+    "tag": {"tags": ["negligence"]},
+    "jurisdiction_court": {"jurisdiction": "sg", "min_court_level": 3},
+    "recent_tagged": {"tags": ["contract", "estoppel"], "date_from": "2015-01-01"},
+}
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark metadata-filtered vector queries on a large synthetic collection")
+    parser.add_argument("--chunks", type=int, default=500_000, help="Chunks in the synthetic collection")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--topics", type=int, default=2000, help="Topic clusters in the corpus")
+    parser.add_argument("--doc-noise", type=float, default=0.03, help="Per-dimension noise around a topic centroid for chunks")
+    parser.add_argument("--query-noise", type=float, default=0.02, help="Per-dimension noise around a topic centroid for queries")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Similarity threshold")
+    parser.add_argument("--queries", type=int, default=30, help="Queries per strategy and filter set")
+    parser.add_argument("--legacy-queries", type=int, default=5, help="Queries for the (slow) legacy strategy")
+    parser.add_argument("--batch", type=int, default=5000, help="Ingest batch size")
+    parser.add_argument("--dir", type=str, help="Directory for the collection (default: a new temp dir); reused if it already holds the corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=str, help="Where to write the json report (default results/vector_filter_benchmark_<timestamp>.json)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    main execution flow
+    """
+    args = parse_arguments()
+    centroids = np.random.default_rng(args.seed).standard_normal((args.topics, args.dim))
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+    root = args.dir or tempfile.mkdtemp(prefix="vector_bench_")
+    store = db("bench", ["chunks"], embedding_function=TopicEmbedding(centroids, args.query_noise, args.seed), root=root)
+
+    report = {
+        "timestamp": datetime.datetime.now().strftime("%Y%m%d_%H%M%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "root": root,
+        "results": [],
+    }
+    existing = store.collections["chunks"].count()
+    if existing != args.chunks:
+        if existing:
+            raise ValueError(f"{root} already holds {existing} chunks, expected {args.chunks}")
+        print(f"Ingesting {args.chunks} chunks into {root}...")
+        report["ingest_s"] = build_corpus(store, "chunks", args, centroids)
+        print(f"Ingest took {report['ingest_s']:.0f}s")
+
+    rng = random.Random(args.seed)
+    for name, filters in FILTER_SETS.items():
+        print(f"\nFilter set '{name}': {build_where(**filters)}")
+        for strategy, run, n_queries in (("indexed", indexed_query, args.queries), ("legacy", legacy_query, args.legacy_queries)):
+            latencies, hits = [], []
+            for _ in range(n_queries):
+                query = f"topic:{rng.randrange(args.topics)}"
+                started = time.perf_counter()
+                results = run(store, "chunks", query, filters, args.threshold)
+                latencies.append(time.perf_counter() - started)
+                hits.append(len(results))
+            row = {"filters": name, "strategy": strategy, "latency_s": percentiles(latencies), "mean_hits": float(np.mean(hits))}
+            report["results"].append(row)
+            print(f"  {strategy:<8} p50 {row['latency_s']['p50'] * 1000:9.1f}ms  p95 {row['latency_s']['p95'] * 1000:9.1f}ms  "
+                  f"hits {row['mean_hits']:.1f}")
+
+    output_file = args.output or os.path.join("results", f"vector_filter_benchmark_{report['timestamp']}.json")
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report saved to {output_file}")
+
+# ----- EXECUTION CODE -----
+
+if __name__ == "__main__":
+    main()
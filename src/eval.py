@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import nltk
@@ -6,51 +7,96 @@ from nltk import sent_tokenize
 nltk.download('punkt', quiet=True)
 
 class SummaryChecker:
-    def __init__(self, model_name):
+    def __init__(self, model_name, device=None, batch_size=32, max_length=None, prefilter_model=None, prefilter_threshold=0.2):
+        """
+        scores every (source sentence, summary sentence) pair with an nli model in padded batches of batch_size;
+        pairs are truncated at the tokenizer's model_max_length like the per-pair check_sentences, or at max_length
+        tokens if given (shorter limits are faster but change the scores of long pairs); with prefilter_model (a sentence-transformers model) pairs whose embedding cosine similarity is below
+        prefilter_threshold are not sent to the nli model and count as neutral
+        """
+        self.device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).to(self.device)
+        self.model.eval()
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        # NLI checkpoints disagree on label order, read it from the config (entailment, neutral, contradiction by default)
+        labels = {label.lower(): index for index, label in self.model.config.id2label.items()}
+        self.entailment_index = next((i for label, i in labels.items() if label.startswith("entail")), 0)
+        self.contradiction_index = next((i for label, i in labels.items() if label.startswith("contradict")), 2)
+
+        self.prefilter_threshold = prefilter_threshold
+        self.prefilter = None
+        if prefilter_model:
+            from sentence_transformers import SentenceTransformer
+            self.prefilter = SentenceTransformer(prefilter_model, device=str(self.device))
 
     def tokenize_sentences(self, text):
         return sent_tokenize(text)
 
     def check_sentences(self, source, hypothesis):
-        inputs = self.tokenizer(source, hypothesis, return_tensors="pt", truncation=True, padding=True)
+        inputs = self.tokenizer(source, hypothesis, return_tensors="pt", truncation=True, padding=True).to(self.device)
         with torch.no_grad():
             outputs = self.model(**inputs)
             probabilities = torch.softmax(outputs.logits, dim=-1)
         return probabilities
 
+    def score_pairs(self, premises, hypotheses):
+        """
+        (entailment, contradiction) probabilities of each premise/hypothesis pair as two numpy arrays
+        """
+        entailment = np.zeros(len(premises), dtype=np.float32)
+        contradiction = np.zeros(len(premises), dtype=np.float32)
+        # Batching pairs of similar length keeps padding small
+        order = np.argsort([len(p) + len(h) for p, h in zip(premises, hypotheses)], kind="stable")
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            inputs = self.tokenizer(
+                [premises[i] for i in batch], [hypotheses[i] for i in batch],
+                return_tensors="pt", truncation=True, padding=True, max_length=self.max_length
+            ).to(self.device)
+            with torch.no_grad():
+                probabilities = torch.softmax(self.model(**inputs).logits, dim=-1).float().cpu().numpy()
+            entailment[batch] = probabilities[:, self.entailment_index]
+            contradiction[batch] = probabilities[:, self.contradiction_index]
+        return entailment, contradiction
+
+    def related_pairs(self, source_sentences, summary_sentences):
+        """
+        (n source, m summary) boolean mask of the pairs worth scoring
+        """
+        if self.prefilter is None:
+            return np.ones((len(source_sentences), len(summary_sentences)), dtype=bool)
+        source = self.prefilter.encode(source_sentences, normalize_embeddings=True, convert_to_numpy=True)
+        summary = self.prefilter.encode(summary_sentences, normalize_embeddings=True, convert_to_numpy=True)
+        return source @ summary.T >= self.prefilter_threshold
+
     def evaluate_summary(self, source_document, summary):
         source_sentences = self.tokenize_sentences(source_document)
         summary_sentences = self.tokenize_sentences(summary)
+        if not source_sentences or not summary_sentences:
+            return {
+                "Average Entailment Score": 0,
+                "Average Contradiction Score": 0,
+                "Coverage Percentage": 0,
+                "Pairs Scored": 0,
+                "Pairs Total": 0
+            }
 
-        total_contradiction = 0
-        total_entailment = 0
-        coverage_hits = [False] * len(source_sentences)
-        count = 0
-
-        for source_idx, source_sentence in enumerate(source_sentences):
-            source_covered = False
-            for summary_sentence in summary_sentences:
-                result = self.check_sentences(source_sentence, summary_sentence)
-                print(f"Entailment: {result[0][0].item()*100:.2f}%, Neutral: {result[0][1].item()*100:.2f}%, Contradiction: {result[0][2].item()*100:.2f}%")
-                contradiction_probability = result[0][2].item()
-                entailment_probability = result[0][0].item()
-                total_contradiction += contradiction_probability
-                total_entailment += entailment_probability
-                count += 1
-
-                if entailment_probability > 0.5:
-                    source_covered = True
-
-            coverage_hits[source_idx] = source_covered
-
-        average_entailment = total_entailment / count if count else 0
-        average_contradiction = total_contradiction / count if count else 0
-        coverage_percentage = sum(coverage_hits) / len(source_sentences) * 100
+        # (source, summary) probability matrices; pairs skipped by the prefilter stay neutral
+        entailment = np.zeros((len(source_sentences), len(summary_sentences)), dtype=np.float32)
+        contradiction = np.zeros_like(entailment)
+        source_idx, summary_idx = np.nonzero(self.related_pairs(source_sentences, summary_sentences))
+        if len(source_idx):
+            entailment[source_idx, summary_idx], contradiction[source_idx, summary_idx] = self.score_pairs(
+                [source_sentences[i] for i in source_idx], [summary_sentences[j] for j in summary_idx]
+            )
 
         return {
-            "Average Entailment Score": average_entailment * 100,
-            "Average Contradiction Score": average_contradiction * 100,
-            "Coverage Percentage": coverage_percentage
-        }
\ No newline at end of file
+            "Average Entailment Score": float(entailment.mean()) * 100,
+            "Average Contradiction Score": float(contradiction.mean()) * 100,
+            "Coverage Percentage": float((entailment > 0.5).any(axis=1).mean()) * 100,
+            "Pairs Scored": int(len(source_idx)),
+            "Pairs Total": int(entailment.size)
+        }
@@ -1,12 +1,21 @@
 from helper.vdb_manager import db
+from helper.vdb_snapshot import SnapshotDB
 from helper.legalagents import Internal, External, LegalReviewPanel
+from helper.tracing import span
+from helper.scheduler import DAGScheduler, Task
+from helper.context_packer import Chunk, PackedContext, pack_context
 
 import os
 
+# Tokens of retrieved text per prompt when the agent's retrieval config sets no context_budget_tokens
+DEFAULT_CONTEXT_BUDGET = 6000
+
 class AgentClient:
-    def __init__(self, name, config, agent_type="internal", model_str="gpt-4o-mini", api_keys=None, allowed_collections=None):
+    def __init__(self, name, config, agent_type="internal", model_str="gpt-4o-mini", api_keys=None, allowed_collections=None, run_id=None,
+                 snapshot=False):
         """
-        initializes an agentclient with access to specific collections in the chromadb database
+        initializes an agentclient with access to specific collections in the chromadb database,
+        snapshot reads the latest published read-only snapshot instead (shared by many worker processes)
         """
         if allowed_collections is None:
             allowed_collections = []
@@ -17,7 +26,11 @@ class AgentClient:
             api_keys=api_keys,
             config=config,
         )
-        self.vdb_manager = db(client_name=name, allowed_collections=allowed_collections)
+        self.agent.run_id = run_id
+        store = SnapshotDB if snapshot else db
+        self.vdb_manager = store(client_name=name, allowed_collections=allowed_collections)
+        # query mode ("dense", "lexical" or "hybrid") and result cap for the ranked modes
+        self.retrieval = config.get(name, {}).get("retrieval", {})
         self.phases = self.agent.phases  
         # @zhiyi
         # if im not wrong the phases are currently hardcoded within legalagents right if 
@@ -42,31 +55,38 @@ class AgentClient:
             metadata=metadata,
         )
 
-    def query_documents(self, collection_name, query_text, tags=None, similarity_threshold=0.7):
+    def query_documents(self, collection_name, query_text, tags=None, similarity_threshold=0.7, mode=None, top_k=None):
         """
-        queries documents from a specific collection in the chromadb database
+        queries documents from a specific collection in the chromadb database,
+        mode and top_k default to the agent's retrieval config
         """
         return self.vdb_manager.query_collection(
             collection_name=collection_name,
             query_text=query_text,
             tags=tags,
             include=["documents"],
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            mode=mode or self.retrieval.get("mode", "dense"),
+            top_k=top_k or self.retrieval.get("top_k")
         )["documents"]
 
-    def query_metadatas(self, collection_name, query_text, tags=None, similarity_threshold=0.7):
+    def query_metadatas(self, collection_name, query_text, tags=None, similarity_threshold=0.7, mode=None, top_k=None):
         """
-        queries metadata from a specific collection in the chromadb database
+        queries metadata from a specific collection in the chromadb database,
+        mode and top_k default to the agent's retrieval config
         """
         return self.vdb_manager.query_collection(
             collection_name=collection_name,
             query_text=query_text,
             tags=tags,
             include=["metadatas"],
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            mode=mode or self.retrieval.get("mode", "dense"),
+            top_k=top_k or self.retrieval.get("top_k")
         )["metadatas"]
 
-    def perform_phase_analysis(self, question: str, phase: str, step: int = 1, feedback: str = "", temp: float = None):
+    def perform_phase_analysis(self, question: str, phase: str, step: int = 1, feedback: str = "", temp: float = None, context: str = "",
+                               prior: dict = None):
         """
         performs analysis for a given structured phase defined in legalagents
         """
@@ -77,56 +97,114 @@ class AgentClient:
             phase=phase,
             step=step,
             feedback=feedback,
-            temp=temp
+            temp=temp,
+            context=context,
+            prior=prior
         )
 
-    def perform_full_structured_analysis(self, question: str, similarity_threshold=0.75):
+    def retrieve_packed(self, question: str, similarity_threshold=0.75) -> PackedContext:
         """
-        Performs all structured phases sequentially and returns aggregated results.
-        Enhanced with relevant legal documents from vector database.
+        retrieves relevant legal documents from the allowed collections and packs the best of them into
+        the agent's context token budget, recording which chunks were dropped as duplicates or for budget
         """
         # Retrieve relevant legal documents from available collections
         collections = list(self.vdb_manager.collections.keys())
-        relevant_contexts = []
+        chunks = []
         
-        for collection in collections:
-            try:
+        mode = self.retrieval.get("mode", "dense")
+        order = self.retrieval.get("order", "date")
+        with span("retrieval", run_id=self.agent.run_id, agent=self.name, collections=len(collections), mode=mode) as retrieval_span:
+            for collection in collections:
                 # Extract collection name without client prefix
                 collection_name = collection.replace(f"{self.vdb_manager.client_name}_", "")
-                documents = self.query_documents(
-                    collection_name=collection_name,
-                    query_text=question,
-                    similarity_threshold=similarity_threshold
-                )
-                
-                if documents:
-                    context = f"Documents from {collection_name}:\n" + "\n\n".join(documents)
-                    relevant_contexts.append(context)
-            except Exception as e:
-                print(f"Error querying collection {collection}: {str(e)}")
-        
-        # Create enhanced question with retrieved context
-        enhanced_question = question
-        if relevant_contexts:
-            context_text = "\n\n".join(relevant_contexts)
-            enhanced_question = (
-                f"Original Question: {question}\n\n"
-                f"Relevant Legal Context:\n{context_text}\n\n"
-                f"Based on the above context and your legal knowledge, please analyze the original question."
+                with span("retrieval_collection", collection=collection_name) as collection_span:
+                    try:
+                        result = self.query(
+                            collection_name=collection_name,
+                            query_text=question,
+                            similarity_threshold=similarity_threshold,
+                            mode=mode,
+                            top_k=self.retrieval.get("top_k"),
+                            filters=self.retrieval.get("filters"),
+                            order=order,
+                            recency_half_life_years=self.retrieval.get("recency_half_life_years", 10.0)
+                        )
+                        collection_span.set(documents=len(result["documents"]))
+                        scores = result.get("scores") or [1 - distance for distance in result["distances"]]
+                        ranked = list(zip(result["documents"], result["metadatas"], scores))
+                        if order == "date":
+                            # Newest-first is a display order, pack the most relevant chunks first
+                            ranked.sort(key=lambda item: -item[2])
+                        chunks.extend(
+                            Chunk(text=doc, source=collection_name, rank=rank, score=score, metadata=metadata)
+                            for rank, (doc, metadata, score) in enumerate(ranked, start=1) if doc
+                        )
+                    except Exception as e:
+                        collection_span.set(error=str(e))
+                        print(f"Error querying collection {collection}: {str(e)}")
+
+            packed = pack_context(
+                chunks,
+                budget_tokens=self.retrieval.get("context_budget_tokens", DEFAULT_CONTEXT_BUDGET),
+                model_str=self.agent.model,
+                dedup_threshold=self.retrieval.get("dedup_threshold", 0.85)
             )
+            retrieval_span.set(chunks=len(chunks), included=len(packed.included), dropped=len(packed.dropped), context_tokens=packed.tokens)
         
-        # Perform analysis through all phases
-        results = {}
+        return packed
+
+    def retrieve_context(self, question: str, similarity_threshold=0.75) -> str:
+        """
+        retrieves relevant legal documents from the allowed collections, returns "" when nothing matches
+        """
+        return self.retrieve_packed(question, similarity_threshold).text
+
+    def retrieval_task(self, query: str, similarity_threshold=0.75, key_prefix=()) -> dict:
+        """
+        returns context retrieval for query as a scheduler task keyed by key_prefix + (agent name, "retrieval")
+        """
+        return {key_prefix + (self.name, "retrieval"): Task(lambda _: self.retrieve_packed(query, similarity_threshold))}
+
+    def phase_tasks(self, question: str, similarity_threshold=0.75, key_prefix=(), retrieval_key=None) -> dict:
+        """
+        returns the retrieval and structured phases as scheduler tasks keyed by key_prefix + (agent name, phase),
+        each phase depends on retrieval and on the phases declared in the agent's phase_dependencies.
+        pass retrieval_key to reuse a retrieval task shared with other questions instead of adding one
+        """
+        if retrieval_key is None:
+            tasks = self.retrieval_task(question, similarity_threshold, key_prefix)
+            retrieval_key = key_prefix + (self.name, "retrieval")
+        else:
+            tasks = {}
+
+        def run_phase(phase, idx):
+            def run(inputs):
+                # Context is kept apart from the question so the prompt layout can put it in the cached prefix
+                prior = {key[-1]: output for key, output in inputs.items() if key != retrieval_key}
+                print(f"\nPerforming '{phase}' analysis for {self.name} (Step {idx}/{len(self.phases)})...")
+                with span("agent_phase", run_id=self.agent.run_id, agent=self.name, phase=phase, step=idx):
+                    return self.perform_phase_analysis(
+                        question=question,
+                        phase=phase,
+                        step=idx,
+                        context=inputs[retrieval_key].text,
+                        prior=prior
+                    )
+            return run
+
         for idx, phase in enumerate(self.phases, start=1):
-            print(f"\nPerforming '{phase}' analysis (Step {idx}/{len(self.phases)})...")
-            response = self.perform_phase_analysis(
-                question=enhanced_question,
-                phase=phase,
-                step=idx
-            )
-            results[phase] = response
-        
-        return results
+            dependencies = [retrieval_key] + [key_prefix + (self.name, dep) for dep in self.agent.phase_dependencies.get(phase, [])]
+            tasks[key_prefix + (self.name, phase)] = Task(run_phase(phase, idx), dependencies)
+        return tasks
+
+    def perform_full_structured_analysis(self, question: str, similarity_threshold=0.75, max_workers=1):
+        """
+        Performs all structured phases in dependency order and returns aggregated results.
+        Enhanced with relevant legal documents from vector database.
+        """
+        tasks = self.phase_tasks(question, similarity_threshold)
+        outputs = DAGScheduler(max_workers=max_workers).run(tasks)
+        return {phase: outputs[(self.name, phase)] for phase in self.phases}
 
     def refine_analysis_with_feedback(self, initial_results: dict, feedback: str):
         """
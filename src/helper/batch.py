@@ -0,0 +1,198 @@
+import io
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from helper.inference import _record_usage, query_model
+from helper.providers import BATCH_SUFFIX, _chat_messages, anthropic_params, resolve_model
+from helper.tracing import span
+
+TERMINAL_OPENAI_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+@dataclass
+class BatchRequest:
+    """A single prompt to be sent as part of a provider batch job"""
+    custom_id: str
+    system_prompt: str
+    prompt: str
+    agent: Optional[str] = None
+    phase: Optional[str] = None
+    temp: Optional[float] = None
+    run_id: Optional[str] = None       # Overrides the runner's run id for usage accounting
+    cache_split: Optional[int] = None  # End of the cacheable prompt prefix (see helper.prompt_layout)
+
+
+class BatchRunner:
+    """
+    Submits prompts to the OpenAI or Anthropic Batch API, polls until the job
+    finishes and returns the answers by custom_id.
+
+    Batch jobs are billed at the provider's batch discount. Requests that fail
+    inside the batch are retried once through the synchronous query_model.
+    """
+
+    def __init__(
+        self,
+        model_str: str,
+        api_key: Optional[str] = None,
+        run_id: Optional[str] = None,
+        poll_interval: float = 30.0,
+        max_wait: float = 24 * 3600,
+        max_tokens: int = 4096
+    ):
+        """
+        Args:
+            model_str: Model to run the batch on (must belong to a backend with supports_batch)
+            api_key: API key for the provider (falls back to the provider's env var)
+            run_id: Run id used for usage accounting
+            poll_interval: Seconds between status checks
+            max_wait: Give up (and cancel the job) after this many seconds
+            max_tokens: Completion limit per request (required by Anthropic)
+        """
+        self.backend, self.model_name, self.spec = resolve_model(model_str)
+        if not self.backend.supports_batch:
+            raise ValueError(f"Backend '{self.backend.name}' does not support batch jobs")
+        self.api_key = api_key
+        self.client = self.backend.get_client(api_key)
+        self.run_id = run_id
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.max_tokens = max_tokens
+
+    def run(self, requests: List[BatchRequest]) -> Dict[str, str]:
+        """
+        Run a list of requests as one batch job
+
+        Args:
+            requests: Requests with unique custom_ids
+
+        Returns:
+            Dictionary mapping custom_id to the model's answer
+        """
+        if not requests:
+            return {}
+        by_id = {r.custom_id: r for r in requests}
+        if len(by_id) != len(requests):
+            raise ValueError("Batch requests must have unique custom_ids")
+
+        print(f"\nSubmitting batch of {len(requests)} requests to {self.backend.name} ({self.model_name})...")
+        with span("batch_job", run_id=self.run_id, backend=self.backend.name, requests=len(requests)) as job_span:
+            if self.backend.name == "anthropic":
+                answers, failed = self._run_anthropic(requests)
+            else:
+                answers, failed = self._run_openai(requests)
+            job_span.set(failed=len(failed))
+
+        # Anything that failed inside the batch is retried synchronously
+        for custom_id in failed:
+            request = by_id[custom_id]
+            print(f"Batch request {custom_id} failed, retrying synchronously")
+            answers[custom_id] = query_model(
+                model_str=self.model_name,
+                system_prompt=request.system_prompt,
+                prompt=request.prompt,
+                api_key=self.api_key,
+                temp=request.temp,
+                print_cost=False,
+                run_id=request.run_id or self.run_id,
+                agent=request.agent,
+                phase=request.phase,
+                cache_split=request.cache_split
+            )
+        return answers
+
+    def _record(self, request: BatchRequest, body, answer: str) -> None:
+        _record_usage(self.model_name + BATCH_SUFFIX, body, request.system_prompt, request.prompt, answer,
+                      run_id=request.run_id or self.run_id, agent=request.agent, phase=request.phase)
+
+    def _wait(self, retrieve, is_done, cancel):
+        started = time.monotonic()
+        while True:
+            job = retrieve()
+            if is_done(job):
+                return job
+            if time.monotonic() - started > self.max_wait:
+                cancel()
+                raise TimeoutError(f"Batch job did not finish within {self.max_wait}s")
+            time.sleep(self.poll_interval)
+
+    # ----- OPENAI -----
+
+    def _run_openai(self, requests: List[BatchRequest]):
+        lines = []
+        for request in requests:
+            body = {
+                "model": self.spec.api_name,
+                "messages": _chat_messages(self.spec, request.system_prompt, request.prompt),
+            }
+            if request.temp is not None and self.spec.supports_temperature:
+                body["temperature"] = request.temp
+            lines.append(json.dumps({
+                "custom_id": request.custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }))
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        batch_file = self.client.files.create(file=("batch_input.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        print(f"Batch {batch.id} submitted, polling every {self.poll_interval}s...")
+        batch = self._wait(
+            retrieve=lambda: self.client.batches.retrieve(batch.id),
+            is_done=lambda job: job.status in TERMINAL_OPENAI_STATUSES,
+            cancel=lambda: self.client.batches.cancel(batch.id),
+        )
+        print(f"Batch {batch.id} finished with status '{batch.status}'")
+
+        by_id = {r.custom_id: r for r in requests}
+        answers = {}
+        if batch.output_file_id:
+            content = self.client.files.content(batch.output_file_id).text
+            for line in content.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    continue
+                body = response["body"]
+                answer = body["choices"][0]["message"]["content"]
+                answers[item["custom_id"]] = answer
+                self._record(by_id[item["custom_id"]], body, answer)
+        failed = [custom_id for custom_id in by_id if custom_id not in answers]
+        return answers, failed
+
+    # ----- ANTHROPIC -----
+
+    def _run_anthropic(self, requests: List[BatchRequest]):
+        batch_requests = []
+        for request in requests:
+            params = anthropic_params(self.spec, request.system_prompt, request.prompt, request.temp,
+                                      cache_split=request.cache_split, max_tokens=self.max_tokens)
+            batch_requests.append({"custom_id": request.custom_id, "params": params})
+        batch = self.client.messages.batches.create(requests=batch_requests)
+        print(f"Batch {batch.id} submitted, polling every {self.poll_interval}s...")
+        self._wait(
+            retrieve=lambda: self.client.messages.batches.retrieve(batch.id),
+            is_done=lambda job: job.processing_status == "ended",
+            cancel=lambda: self.client.messages.batches.cancel(batch.id),
+        )
+        print(f"Batch {batch.id} ended")
+
+        by_id = {r.custom_id: r for r in requests}
+        answers = {}
+        for item in self.client.messages.batches.results(batch.id):
+            if item.result.type != "succeeded":
+                continue
+            message = item.result.message
+            answer = message.content[0].text
+            answers[item.custom_id] = answer
+            self._record(by_id[item.custom_id], message, answer)
+        failed = [custom_id for custom_id in by_id if custom_id not in answers]
+        return answers, failed
@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+import zipfile
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from typing import Any, Iterator, Union
+
+import zstandard
+
+# A packed value: {"$blob": "<sha256 of the utf-8 text>"}
+BLOB_KEY = "$blob"
+
+
+class BlobStore:
+    """
+    Content-addressed store of zstd-compressed texts.
+
+    A text is stored once under <root>/<sha256[:2]>/<sha256>.zst, keyed by the hash of
+    its uncompressed bytes, so the same scenario or model answer written by many runs
+    takes the space of one compressed copy. pack() swaps long strings of a JSON value
+    for {"$blob": hash} references; lazy() wraps a packed value so each text is only
+    read and decompressed when it is accessed.
+    """
+
+    def __init__(self, root: str, level: int = 10, cache_size: int = 256):
+        """
+        Args:
+            root: Directory holding the blobs
+            level: zstd compression level
+            cache_size: Decompressed texts kept in memory
+        """
+        self.root = root
+        self.level = level
+        self._local = threading.local()
+        self.get = lru_cache(maxsize=cache_size)(self._get)
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], f"{ref}.zst")
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        # zstd contexts are not thread-safe, keep one per thread
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.compressor
+
+    def __contains__(self, ref: str) -> bool:
+        return os.path.exists(self._path(ref))
+
+    def put(self, text: Union[str, bytes]) -> str:
+        """
+        Store a text unless an identical one is already stored.
+
+        Args:
+            text: Text (or utf-8 bytes) to store
+
+        Returns:
+            sha256 of the uncompressed bytes
+        """
+        data = text.encode('utf-8') if isinstance(text, str) else text
+        ref = hashlib.sha256(data).hexdigest()
+        path = self._path(ref)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(self._compressor().compress(data))
+            os.replace(tmp_path, path)
+        return ref
+
+    def _get(self, ref: str) -> str:
+        self._compressor()
+        with open(self._path(ref), 'rb') as f:
+            return self._local.decompressor.decompress(f.read()).decode('utf-8')
+
+    def pack(self, value: Any, min_chars: int = 256) -> Any:
+        """
+        Replace every string of at least min_chars in a JSON value with a blob reference.
+
+        Args:
+            value: JSON value (dicts, lists, strings, numbers)
+            min_chars: Shorter strings stay inline, a reference costs about 80 bytes
+
+        Returns:
+            The packed value
+        """
+        if isinstance(value, str):
+            return {BLOB_KEY: self.put(value)} if len(value) >= min_chars else value
+        if isinstance(value, dict):
+            return {key: self.pack(item, min_chars) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.pack(item, min_chars) for item in value]
+        return value
+
+    def unpack(self, value: Any) -> Any:
+        """
+        Resolve every blob reference of a packed value.
+
+        Args:
+            value: Packed JSON value
+
+        Returns:
+            The value with all texts inline, as it was before pack()
+        """
+        if isinstance(value, dict):
+            if is_blob(value):
+                return self.get(value[BLOB_KEY])
+            return {key: self.unpack(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.unpack(item) for item in value]
+        return value
+
+    def lazy(self, value: Any) -> Any:
+        """
+        Read-only view of a packed value that resolves blob references on access.
+
+        Args:
+            value: Packed JSON value
+
+        Returns:
+            LazyMapping / LazySequence for containers, the text for a reference, else the value
+        """
+        if isinstance(value, dict):
+            return self.get(value[BLOB_KEY]) if is_blob(value) else LazyMapping(value, self)
+        if isinstance(value, list):
+            return LazySequence(value, self)
+        return value
+
+
+def is_blob(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_KEY in value
+
+
+class LazyMapping(Mapping):
+    """Dict view of a packed JSON object; texts are decompressed when their key is read"""
+
+    def __init__(self, data: dict, store: BlobStore):
+        self._data = data
+        self._store = store
+
+    def __getitem__(self, key):
+        return self._store.lazy(self._data[key])
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"LazyMapping({list(self._data)})"
+
+
+class LazySequence(Sequence):
+    """List view of a packed JSON array; texts are decompressed when their index is read"""
+
+    def __init__(self, data: list, store: BlobStore):
+        self._data = data
+        self._store = store
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazySequence(self._data[index], self._store)
+        return self._store.lazy(self._data[index])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"LazySequence({len(self._data)} items)"
+
+
+def load_archive(path: str, store: BlobStore) -> Any:
+    """
+    Open a packed JSON file without decompressing any of its texts.
+
+    Args:
+        path: JSON file written by archive()
+        store: Blob store holding its texts
+
+    Returns:
+        Lazy view of the file's content
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return store.lazy(json.load(f))
+
+
+def _json_sources(paths: Sequence[str]) -> Iterator:
+    """(name, parsed json) of every JSON file, and every JSON member of a .zip"""
+    for path in paths:
+        if path.endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    if member.endswith(".json"):
+                        yield member, json.loads(archive.read(member).decode('utf-8'))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield os.path.basename(path), json.load(f)
+
+
+def archive(paths: Sequence[str], out_dir: str, store: BlobStore, min_chars: int = 256) -> dict:
+    """
+    Write packed, compact copies of result files whose long texts live in the blob store.
+
+    Args:
+        paths: JSON files and zip files of JSON files
+        out_dir: Directory for the packed JSON files
+        store: Blob store receiving the texts
+        min_chars: Shortest string moved to the store
+
+    Returns:
+        Dict with files, input bytes and packed bytes (JSON files plus new blobs)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stats = {"files": 0, "input_bytes": 0, "packed_bytes": 0}
+    before = _tree_size(store.root)
+    for name, data in _json_sources(paths):
+        stats["input_bytes"] += len(json.dumps(data, indent=4).encode('utf-8'))
+        packed = json.dumps(store.pack(data, min_chars), separators=(",", ":"))
+        with open(os.path.join(out_dir, os.path.basename(name)), 'w', encoding='utf-8') as f:
+            f.write(packed)
+        stats["files"] += 1
+        stats["packed_bytes"] += len(packed.encode('utf-8'))
+    stats["packed_bytes"] += _tree_size(store.root) - before
+    return stats
+
+
+def _tree_size(root: str) -> int:
+    return sum(os.path.getsize(os.path.join(base, name)) for base, _, names in os.walk(root) for name in names)
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Archive result files into the zstd blob store, or print an archived file in full")
+    parser.add_argument("command", choices=["archive", "unpack"])
+    parser.add_argument("paths", nargs="+", help="archive: JSON or zip files; unpack: one archived JSON file")
+    parser.add_argument("--root", type=str, default="results/blobs", help="Blob store directory")
+    parser.add_argument("--out", type=str, default="results/archive", help="Directory for the packed JSON files")
+    parser.add_argument("--min-chars", type=int, default=256, help="Shortest string moved to the blob store")
+    parser.add_argument("--level", type=int, default=10, help="zstd compression level")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    store = BlobStore(args.root, level=args.level)
+    if args.command == "archive":
+        stats = archive(args.paths, args.out, store, min_chars=args.min_chars)
+        print(f"Archived {stats['files']} files: {stats['input_bytes'] / 1024:.0f} KB of JSON -> "
+              f"{stats['packed_bytes'] / 1024:.0f} KB packed JSON and new blobs in {args.out} and {args.root}")
+    else:
+        with open(args.paths[0], 'r', encoding='utf-8') as f:
+            json.dump(store.unpack(json.load(f)), sys.stdout, indent=4)
+        print()
@@ -0,0 +1,192 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Citations and section references must survive tokenization intact: "34(1)(a)",
+# "[2007]" and "s.300" are kept as single tokens alongside plain words
+TOKEN_PATTERN = re.compile(r"\[\d{4}\]|\d+[a-z]?(?:\(\w{1,4}\))+|[a-z]+\.\d+[a-z]?|\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of a text for lexical matching
+
+    Besides single tokens, adjacent pairs that contain a digit are added as
+    bigrams ("sgca_37", "section_2") so court abbreviations and section
+    numbers only match together.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    # "34(1)(a)" and "s.300" also match a bare "34" or "300"
+    bases = [
+        token.split("(", 1)[0] if "(" in token else token.split(".", 1)[1]
+        for token in tokens if "(" in token or "." in token
+    ]
+    bigrams = [
+        f"{a}_{b}" for a, b in zip(tokens, tokens[1:])
+        if any(ch.isdigit() for ch in a + b)
+    ]
+    return tokens + bases + bigrams
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index in a local SQLite file.
+
+    Kept next to a Chroma collection and updated on every ingest, so lexical
+    scores cover exactly the documents the dense index holds. Postings are
+    keyed by term, so a query reads only the rows of its own terms.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, read_only: bool = False):
+        """
+        Args:
+            path: SQLite file of the index
+            k1: Term frequency saturation
+            b: Document length normalization
+            read_only: Open an immutable index (a published snapshot) without locking, memory-mapping the file
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.read_only = read_only
+        self._local = threading.local()
+        if read_only:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO stats VALUES ('documents', 0), ('total_length', 0)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None and self.read_only:
+            # immutable=1 skips file locking entirely, pages come from the shared OS page cache
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+            conn.execute(f"PRAGMA mmap_size={os.path.getsize(self.path)}")
+            self._local.conn = conn
+        elif conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _delete(self, conn: sqlite3.Connection, ids: Sequence[str]) -> None:
+        for doc_id in ids:
+            row = conn.execute("SELECT length FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                continue
+            conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            conn.execute("UPDATE stats SET value = value - 1 WHERE key = 'documents'")
+            conn.execute("UPDATE stats SET value = value - ? WHERE key = 'total_length'", (row[0],))
+
+    def add(self, ids: Sequence[str], documents: Sequence[str]) -> None:
+        """Index documents, replacing any earlier version with the same id"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete(conn, ids)
+            total_length = 0
+            for doc_id, document in zip(ids, documents):
+                terms = Counter(tokenize(document))
+                length = sum(terms.values())
+                total_length += length
+                conn.execute("INSERT INTO documents VALUES (?, ?)", (doc_id, length))
+                conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", ((term, doc_id, tf) for term, tf in terms.items()))
+            conn.execute("UPDATE stats SET value = value + ? WHERE key = 'documents'", (len(ids),))
+            conn.execute("UPDATE stats SET value = value + ? WHERE key = 'total_length'", (total_length,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, ids: Sequence[str]) -> None:
+        """Drop documents from the index"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete(conn, ids)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self) -> None:
+        """Drop every document"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM postings")
+        conn.execute("DELETE FROM documents")
+        conn.execute("UPDATE stats SET value = 0")
+        conn.execute("COMMIT")
+
+    def freeze(self) -> None:
+        """Fold the write-ahead log into the main file so the index can be copied or opened read_only"""
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT value FROM stats WHERE key = 'documents'").fetchone()[0]
+
+    def search(self, query: str, k: int = 50) -> List[Tuple[str, float]]:
+        """
+        Rank documents against a query
+
+        Args:
+            query: Query text, tokenized like the documents
+            k: Number of results
+
+        Returns:
+            Up to k (document id, BM25 score) pairs, best first
+        """
+        conn = self._connect()
+        stats = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        n_docs = stats["documents"]
+        if not n_docs:
+            return []
+        avg_length = stats["total_length"] / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            rows = conn.execute(
+                "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN documents d ON d.id = p.doc_id WHERE p.term = ?",
+                (term,),
+            ).fetchall()
+            if not rows:
+                continue
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc_id, tf, length in rows:
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists with reciprocal rank fusion
+
+    Each list contributes 1 / (k + rank) for every id it contains, so ids
+    ranked well by several retrievers rise without calibrating their scores.
+
+    Args:
+        rankings: Id lists, best first
+        k: Damping constant (60 in the original RRF paper)
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
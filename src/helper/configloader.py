@@ -1,5 +1,6 @@
 from typing import Dict, Any
 import json
+from helper.scheduler import topological_generations
 
 def load_agent_config(config_path: str = "settings/agents.json") -> Dict[str, Any]:
     """
@@ -40,6 +41,24 @@ def load_agent_config(config_path: str = "settings/agents.json") -> Dict[str, An
                     f"Phase prompts for {agent_type} must be a dictionary"
                 )
             
+            # Validate the optional phase graph (phases run in config order without one)
+            if 'phase_dependencies' in agent_config:
+                try:
+                    topological_generations(list(agent_config['phase_prompts']), agent_config['phase_dependencies'])
+                except ValueError as e:
+                    raise ValueError(f"Invalid phase dependencies for {agent_type}: {e}")
+            
+            # Validate the optional retrieval settings
+            retrieval = agent_config.get('retrieval', {})
+            if retrieval.get('mode', 'dense') not in ('dense', 'lexical', 'hybrid'):
+                raise ValueError(
+                    f"Invalid retrieval mode for {agent_type}: {retrieval['mode']}"
+                )
+            if retrieval.get('order', 'date') not in ('date', 'relevance', 'recency'):
+                raise ValueError(
+                    f"Invalid retrieval order for {agent_type}: {retrieval['order']}"
+                )
+            
             # Validate default config
             required_config = {'model', 'max_steps', 'max_history'}
             if not all(
@@ -0,0 +1,106 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from helper.usage import estimate_tokens
+
+PREVIEW_CHARS = 120
+
+
+@lru_cache(maxsize=8192)
+def cached_token_count(text: str, model_str: str) -> int:
+    """Token count of a chunk; the same chunks come back for every question and phase of a run"""
+    return estimate_tokens(text, model_str)
+
+
+def _shingles(text: str, size: int = 5) -> frozenset:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+@dataclass
+class Chunk:
+    """A retrieved passage with its rank inside the collection it came from"""
+    text: str
+    source: str
+    rank: int
+    score: float = 0.0
+    metadata: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class PackedContext:
+    """Retrieved chunks that fit the budget, rendered per source, plus a record of what was left out"""
+    text: str
+    budget_tokens: int
+    tokens: int = 0
+    included: List[Dict[str, Any]] = field(default_factory=list)
+    dropped: List[Dict[str, Any]] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serializable packing report for the results file"""
+        return {
+            "budget_tokens": self.budget_tokens,
+            "tokens": self.tokens,
+            "included": self.included,
+            "dropped": self.dropped,
+        }
+
+
+def pack_context(
+    chunks: List[Chunk],
+    budget_tokens: int,
+    model_str: str = "gpt-4o",
+    dedup_threshold: float = 0.85
+) -> PackedContext:
+    """
+    Select retrieved chunks for a prompt within a token budget
+
+    Chunks are taken best rank first, alternating between sources so one broad
+    collection cannot crowd out the others. A chunk whose word 5-gram Jaccard
+    similarity with an already selected chunk reaches dedup_threshold is
+    dropped as a duplicate; a chunk that no longer fits is dropped for budget
+    and smaller lower-ranked chunks may still fill the remaining space.
+
+    Args:
+        chunks: Retrieved chunks from any number of sources
+        budget_tokens: Maximum tokens of chunk text to include
+        model_str: Model whose tokenizer counts the tokens
+        dedup_threshold: Similarity at which two chunks count as the same passage
+
+    Returns:
+        PackedContext whose text groups the selected chunks under "Documents from <source>:" headings
+    """
+    ordered = sorted(chunks, key=lambda c: (c.rank, -c.score))
+    packed = PackedContext(text="", budget_tokens=budget_tokens)
+    kept: List[tuple] = []
+
+    for chunk in ordered:
+        tokens = cached_token_count(chunk.text, model_str)
+        record = {"source": chunk.source, "rank": chunk.rank, "score": round(chunk.score, 4), "tokens": tokens,
+                  "preview": chunk.text[:PREVIEW_CHARS]}
+        shingles = _shingles(chunk.text)
+        duplicate_of = next(
+            (other for other, other_shingles in kept
+             if len(shingles & other_shingles) / (len(shingles | other_shingles) or 1) >= dedup_threshold),
+            None
+        )
+        if duplicate_of is not None:
+            packed.dropped.append({**record, "reason": "duplicate", "duplicate_of": f"{duplicate_of.source}#{duplicate_of.rank}"})
+        elif packed.tokens + tokens > budget_tokens:
+            packed.dropped.append({**record, "reason": "budget"})
+        else:
+            packed.tokens += tokens
+            packed.included.append(record)
+            kept.append((chunk, shingles))
+
+    by_source: Dict[str, List[str]] = {}
+    for chunk, _ in kept:
+        by_source.setdefault(chunk.source, []).append(chunk.text)
+    packed.text = "\n\n".join(
+        f"Documents from {source}:\n" + "\n\n".join(texts) for source, texts in by_source.items()
+    )
+    return packed
@@ -5,10 +5,16 @@ import fitz  # PyMuPDF
 import json
 import os
 import argparse
+import sys
 import logging
 from datetime import datetime
 import time
 
+# run as a script from src/, so make the helper package importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helper.profiling import profile_from_env
+from helper.blob_store import BLOB_KEY, BlobStore
+
 # ----- HELPER FUNCTIONS -----
 
 def setup_logging():
@@ -60,6 +66,9 @@ def main(inpath, outpath):
     setup_logging()
     pdf_files = [os.path.join(inpath, f) for f in os.listdir(inpath) if f.endswith('.pdf')]
     results = []
+    os.makedirs(outpath, exist_ok=True)
+    # Scenario texts are stored once, zstd-compressed; per-file outputs reference them by hash
+    blobs = BlobStore(os.path.join(outpath, "blobs"))
     for pdf_file in pdf_files:
         scenario, questions, metadata = extract_content(pdf_file)
         if scenario is not None and questions is not None:
@@ -73,9 +82,8 @@ def main(inpath, outpath):
             file_name = os.path.splitext(os.path.basename(pdf_file))[0] # im writing to individual json files here, but can remove if that's being extra ~ gong
             individual_output_path = os.path.join(outpath, f"{file_name}_extracted.json")
             with open(individual_output_path, 'w') as f:
-                json.dump(data, f, indent=4)
+                json.dump(dict(data, scenario={BLOB_KEY: blobs.put(scenario)}), f, indent=4)
             logging.info(f"Individual result saved to {individual_output_path}")
-    os.makedirs(outpath, exist_ok=True)
     output_file_path = os.path.join(outpath, 'extracted_data.json') # original combined JSON file 
     with open(output_file_path, 'w') as f:
         json.dump(results, f, indent=4)
@@ -89,4 +97,5 @@ if __name__ == "__main__":
     parser.add_argument('--inpath', type=str, default='data/raw', help='Input directory containing PDF files.')
     parser.add_argument('--outpath', type=str, default='data/processed', help='Output directory for JSON results.')
     args = parser.parse_args()
-    main(args.inpath, args.outpath)
\ No newline at end of file
+    with profile_from_env("extract_hypo"): # continues main.py --profile into this subprocess
+        main(args.inpath, args.outpath)
\ No newline at end of file
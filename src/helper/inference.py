@@ -1,241 +1,99 @@
-import time, tiktoken
-from openai import OpenAI
-import openai
-import os, anthropic, json
+import dataclasses
 
-TOKENS_IN = dict()
-TOKENS_OUT = dict()
-
-encoding = tiktoken.get_encoding("cl100k_base")
+from helper.usage import UsageLedger, cache_usage_from_response, estimate_tokens, usage_from_response
+from helper.retry import DEFAULT_RETRY_POLICY
+from helper.ratelimit import expected_output_tokens, get_rate_limiter
+from helper.providers import model_cache_multipliers, model_price, resolve_model
+from helper.tracing import span
 
 def get_provider(model):
-    provider_map = {
-        "gpt-4o": "openai",
-        "gpt-4o-mini": "openai",
-        "o1-preview": "openai",
-        "o1-mini": "openai",
-        "claude-3-5-sonnet": "anthropic",
-        "deepseek-chat": "deepseek",
-    }
-    return provider_map.get(model, "unknown")
+    """
+    return the name of the backend serving a model, or "unknown"
+    """
+    try:
+        backend, _, _ = resolve_model(model)
+    except Exception:
+        return "unknown"
+    return backend.name
+
+def _cost(model_str, tokens_in, tokens_out, cached_in=0, cache_write=0):
+    price_in, price_out = model_price(model_str)
+    read_multiplier, write_multiplier = model_cache_multipliers(model_str)
+    uncached_in = tokens_in - cached_in - cache_write
+    return (price_in * (uncached_in + read_multiplier * cached_in + write_multiplier * cache_write)
+            + price_out * tokens_out)
 
-def curr_cost_est():
-    costmap_in = {
-        "gpt-4o": 2.50 / 1000000,
-        "gpt-4o-mini": 0.150 / 1000000,
-        "o1-preview": 15.00 / 1000000,
-        "o1-mini": 3.00 / 1000000,
-        "claude-3-5-sonnet": 3.00 / 1000000,
-        "deepseek-chat": 1.00 / 1000000,
-    }
-    costmap_out = {
-        "gpt-4o": 10.00/ 1000000,
-        "gpt-4o-mini": 0.6 / 1000000,
-        "o1-preview": 60.00 / 1000000,
-        "o1-mini": 12.00 / 1000000,
-        "claude-3-5-sonnet": 12.00 / 1000000,
-        "deepseek-chat": 5.00 / 1000000,
-    }
-    return sum([costmap_in[_]*TOKENS_IN[_] for _ in TOKENS_IN]) + sum([costmap_out[_]*TOKENS_OUT[_] for _ in TOKENS_OUT])
+# Shared, thread-safe token ledger (per run / agent / phase / model)
+LEDGER = UsageLedger(cost_fn=_cost)
 
-def query_model(model_str, prompt, system_prompt, api_key, tries=5, timeout=5.0, temp=None, print_cost=True, version="1.5"):
+def curr_cost_est(run_id=None):
+    return LEDGER.total_cost(run_id)
 
-    provider = get_provider(model_str)
-    
-    # Set the API key for the appropriate provider
-    if provider == "openai":
-        openai.api_key = api_key
-        os.environ["OPENAI_API_KEY"] = api_key
-    elif provider == "anthropic":
-        os.environ["ANTHROPIC_API_KEY"] = api_key
-    elif provider == "deepseek":
-        os.environ["DEEPSEEK_API_KEY"] = api_key
+def _record_usage(model_str, response, system_prompt, prompt, answer, run_id=None, agent=None, phase=None):
+    """
+    record token usage for a call, preferring provider-reported usage over local estimation
+    """
+    usage = usage_from_response(response)
+    if usage is not None:
+        tokens_in, tokens_out = usage
+        estimated = False
     else:
-        raise Exception(f"Unknown provider for model: {model_str}")
-    
-    for _ in range(tries):
-        try:
-            if model_str == "gpt-4o-mini" or model_str == "gpt4omini" or model_str == "gpt-4omini" or model_str == "gpt4o-mini":
-                model_str = "gpt-4o-mini"
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}]
-                if version == "0.28":
-                    if temp is None:
-                        completion = openai.ChatCompletion.create(
-                            model=f"{model_str}",  # engine = "deployment_name".
-                            messages=messages
-                        )
-                    else:
-                        completion = openai.ChatCompletion.create(
-                            model=f"{model_str}",  # engine = "deployment_name".
-                            messages=messages, temperature=temp
-                        )
-                else:
-                    client = OpenAI()
-                    if temp is None:
-                        completion = client.chat.completions.create(
-                            model="gpt-4o-mini-2024-07-18", messages=messages, )
-                    else:
-                        completion = client.chat.completions.create(
-                            model="gpt-4o-mini-2024-07-18", messages=messages, temperature=temp)
-                answer = completion.choices[0].message.content
-            elif model_str == "claude-3.5-sonnet":
-                client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
-                message = client.messages.create(
-                    model="claude-3-5-sonnet-latest",
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": prompt}])
-                answer = json.loads(message.to_json())["content"][0]["text"]
-            elif model_str == "gpt4o" or model_str == "gpt-4o":
-                model_str = "gpt-4o"
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}]
-                if version == "0.28":
-                    if temp is None:
-                        completion = openai.ChatCompletion.create(
-                            model=f"{model_str}",  # engine = "deployment_name".
-                            messages=messages
-                        )
-                    else:
-                        completion = openai.ChatCompletion.create(
-                            model=f"{model_str}",  # engine = "deployment_name".
-                            messages=messages, temperature=temp)
-                else:
-                    client = OpenAI()
-                    if temp is None:
-                        completion = client.chat.completions.create(
-                            model="gpt-4o-2024-08-06", messages=messages, )
-                    else:
-                        completion = client.chat.completions.create(
-                            model="gpt-4o-2024-08-06", messages=messages, temperature=temp)
-                answer = completion.choices[0].message.content
-            elif model_str == "deepseek-chat" or model_str == "deepseek-reasoner":
-                # Normalize model name
-                if model_str == "deepseek-chat":
-                    deepseek_model = "deepseek-chat"
-                elif model_str == "deepseek-reasoner":
-                    deepseek_model = "deepseek-coder-instruct"
-                
-                # Format messages with system prompt
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ]
-                
-                if version == "0.28":
-                    raise Exception("Please upgrade your OpenAI version to use DeepSeek client")
-                else:
-                    try:
-                        # Initialize DeepSeek client
-                        deepseek_client = OpenAI(
-                            api_key=os.getenv('DEEPSEEK_API_KEY'),
-                            base_url="https://api.deepseek.com/v1"
-                        )
-                        
-                        # Create completion with appropriate parameters
-                        completion_params = {
-                            "model": deepseek_model,
-                            "messages": messages,
-                        }
-                        
-                        # Add temperature if specified
-                        if temp is not None:
-                            completion_params["temperature"] = temp
-                            
-                        # Make API call
-                        completion = deepseek_client.chat.completions.create(**completion_params)
-                        
-                        # Extract answer
-                        answer = completion.choices[0].message.content
-                        
-                        # Count tokens for cost tracking
-                        if model_str not in TOKENS_IN:
-                            TOKENS_IN[model_str] = 0
-                            TOKENS_OUT[model_str] = 0
-                            
-                        # DeepSeek uses cl100k_base tokenizer (same as GPT-4)
-                        encoding = tiktoken.get_encoding("cl100k_base")
-                        
-                        # Track token usage from API response if available
-                        if hasattr(completion, 'usage') and completion.usage is not None:
-                            TOKENS_IN[model_str] += completion.usage.prompt_tokens
-                            TOKENS_OUT[model_str] += completion.usage.completion_tokens
-                        else:
-                            # Fallback to estimation
-                            TOKENS_IN[model_str] += len(encoding.encode(system_prompt + prompt))
-                            TOKENS_OUT[model_str] += len(encoding.encode(answer))
-                            
-                        return answer
-                        
-                    except Exception as e:
-                        print(f"DeepSeek API error: {e}")
-                        time.sleep(timeout)
-                        continue
-            elif model_str == "o1-mini":
-                model_str = "o1-mini"
-                messages = [
-                    {"role": "user", "content": system_prompt + prompt}]
-                if version == "0.28":
-                    completion = openai.ChatCompletion.create(
-                        model=f"{model_str}",  # engine = "deployment_name".
-                        messages=messages)
-                else:
-                    client = OpenAI()
-                    completion = client.chat.completions.create(
-                        model="o1-mini-2024-09-12", messages=messages)
-                answer = completion.choices[0].message.content
-            elif model_str == "o1":
-                model_str = "o1"
-                messages = [
-                    {"role": "user", "content": system_prompt + prompt}]
-                if version == "0.28":
-                    completion = openai.ChatCompletion.create(
-                        model="o1-2024-12-17",  # engine = "deployment_name".
-                        messages=messages)
-                else:
-                    client = OpenAI()
-                    completion = client.chat.completions.create(
-                        model="o1-2024-12-17", messages=messages)
-                answer = completion.choices[0].message.content
-            elif model_str == "o1-preview":
-                model_str = "o1-preview"
-                messages = [
-                    {"role": "user", "content": system_prompt + prompt}]
-                if version == "0.28":
-                    completion = openai.ChatCompletion.create(
-                        model=f"{model_str}",  # engine = "deployment_name".
-                        messages=messages)
-                else:
-                    client = OpenAI()
-                    completion = client.chat.completions.create(
-                        model="o1-preview", messages=messages)
-                answer = completion.choices[0].message.content
+        tokens_in = estimate_tokens(system_prompt + prompt, model_str)
+        tokens_out = estimate_tokens(answer, model_str)
+        estimated = True
+    cached_in, cache_write = cache_usage_from_response(response)
+    LEDGER.record(model_str, tokens_in, tokens_out, run_id=run_id, agent=agent, phase=phase, estimated=estimated,
+                  cached_in=cached_in, cache_write=cache_write)
+    return tokens_in, tokens_out, cached_in
+
+def query_model(model_str, prompt, system_prompt, api_key, tries=5, timeout=None, temp=None, print_cost=True, version="1.5",
+                run_id=None, agent=None, phase=None, retry_policy=None, cache_split=None):
+    """
+    query a model through the backend registry; cache_split marks where the cacheable prefix of prompt ends
+    """
+
+    if version == "0.28":
+        raise Exception("openai<1.0 is no longer supported, please upgrade your OpenAI version")
 
+    # Resolve the backend from the registry (raises for unknown models)
+    backend, model_name, spec = resolve_model(model_str)
+    client = backend.get_client(api_key)
+
+    # SDK clients are created with max_retries=0 so this policy is the only retry layer
+    policy = retry_policy or DEFAULT_RETRY_POLICY
+    if timeout is not None:
+        # Keep the policy's other settings (max_delay, rate-limit backoff, metrics)
+        policy = dataclasses.replace(policy, max_tries=tries, base_delay=timeout)
+
+    # Shared RPM/TPM limiter; reserve with a cheap char estimate and settle on reported usage
+    limiter = get_rate_limiter(backend.name, model_name)
+    reserved_tokens = (len(system_prompt) + len(prompt)) // 4 + expected_output_tokens()
+
+    with span("llm_call", run_id=run_id, model=model_name, agent=agent, phase=phase) as call_span:
+        for attempt in range(tries):
+            policy.check_deadline(run_id)
+            policy.metrics.record_attempt(run_id)
+            call_span.set(attempts=attempt + 1)
+            waited = limiter.acquire(reserved_tokens)
+            if waited:
+                call_span.set(ratelimit_wait_s=call_span.attributes.get("ratelimit_wait_s", 0.0) + waited)
             try:
-                if model_str in ["o1-preview", "o1-mini", "claude-3.5-sonnet", "o1"]:
-                    encoding = tiktoken.encoding_for_model("gpt-4o")
-                elif model_str in ["deepseek-chat"]:
-                    encoding = tiktoken.get_encoding("cl100k_base")
-                else:
-                    encoding = tiktoken.encoding_for_model(model_str)
-                if model_str not in TOKENS_IN:
-                    TOKENS_IN[model_str] = 0
-                    TOKENS_OUT[model_str] = 0
-                TOKENS_IN[model_str] += len(encoding.encode(system_prompt + prompt))
-                TOKENS_OUT[model_str] += len(encoding.encode(answer))
-                if print_cost:
-                    print(f"Current experiment cost = ${curr_cost_est()}, ** Approximate values, may not reflect true cost")
+                answer, completion = backend.complete(client, spec, system_prompt, prompt, temp, cache_split=cache_split)
+
+                try:
+                    tokens_in, tokens_out, cached_in = _record_usage(model_name, completion, system_prompt, prompt, answer,
+                                                                     run_id=run_id, agent=agent, phase=phase)
+                    call_span.set(prompt_tokens=tokens_in, completion_tokens=tokens_out, cached_tokens=cached_in)
+                    limiter.settle(reserved_tokens, tokens_in + tokens_out)
+                    if print_cost:
+                        print(f"Current experiment cost = ${curr_cost_est(run_id)}, ** Approximate values, may not reflect true cost")
+                except Exception as e:
+                    if print_cost:
+                        print(f"Cost approximation has an error? {e}")
+                return answer
             except Exception as e:
-                if print_cost:
-                    print(f"Cost approximation has an error? {e}")
-            return answer
-        except Exception as e:
-            print("Inference Exception:", e)
-            time.sleep(timeout)
-            continue
-    raise Exception("Max retries: timeout")
+                policy.handle_error(e, attempt, tries=tries, run_id=run_id)
+        raise Exception("Max retries: timeout")
 
 
-# print(query_model(model_str="o1-mini", prompt="hi", system_prompt="hey"))
\ No newline at end of file
+# print(query_model(model_str="o1-mini", prompt="hi", system_prompt="hey"))
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import hashlib
+from typing import Dict, Iterable, Iterator, List
+
+# Summary fields kept per run; everything else (hypothetical, agent outputs, synthesis) goes to the detail file
+SCORE_KEYS = ["jurisdictional_understanding", "legal_reasoning", "comparative_analysis", "practical_application"]
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator:
+    """
+    Yield the elements of a top-level JSON array one at a time without loading the whole file.
+
+    Args:
+        path: JSON file holding a list
+        chunk_size: Characters read per step; the read grows while a single element is larger
+
+    Returns:
+        Iterator over the decoded elements
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof, started = "", 0, False, False
+        read_size = chunk_size
+        while True:
+            # Skip whitespace, the opening bracket and separators
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                pos += 1
+            if pos < len(buffer) and not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"{path} does not hold a JSON list")
+                started, pos = True, pos + 1
+                continue
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            if pos < len(buffer):
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                    # A value that ends exactly at the buffer edge may continue in the next chunk
+                    if end < len(buffer) or eof:
+                        yield element
+                        buffer, pos, read_size = buffer[end:], 0, chunk_size
+                        continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                if not started:
+                    return
+                raise ValueError(f"{path} ends before its closing bracket")
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            # Elements larger than the buffer would otherwise be re-parsed from the start for every small chunk
+            read_size *= 2
+
+
+def append_json_array(path: str, elements: List) -> None:
+    """
+    Append elements to a JSON list file in place, rewriting only its closing bracket.
+
+    Args:
+        path: JSON file holding a list; created if missing
+        elements: Elements to append
+    """
+    if not elements:
+        return
+    body = ",\n".join(json.dumps(element, indent=4) for element in elements)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"[\n{body}\n]\n")
+        return
+    with open(path, 'rb+') as f:
+        # Find the closing bracket, and whether anything precedes it, from the end of the file
+        end = f.seek(0, os.SEEK_END)
+        tail_start = max(0, end - 4096)
+        f.seek(tail_start)
+        tail = f.read()
+        close = tail.rfind(b']')
+        if close == -1:
+            raise ValueError(f"{path} does not end with a JSON list")
+        empty = tail[:close].rstrip().endswith(b'[')
+        f.seek(tail_start + close)
+        f.truncate()
+        f.write((("\n" if empty else ",\n") + body + "\n]\n").encode('utf-8'))
+
+
+def run_id(entry: Dict) -> str:
+    """
+    Stable id of a leaderboard entry, used for its detail file name.
+
+    Args:
+        entry: One analysis result
+
+    Returns:
+        "<timestamp>_<model>_<hash>", the hash telling apart hypotheticals of the same run
+    """
+    model = re.sub(r'[^A-Za-z0-9._-]+', '-', str(entry.get('model') or 'unknown'))
+    digest = hashlib.sha1(json.dumps(
+        [entry.get('timestamp'), entry.get('model'), entry.get('legal_question'), entry.get('hypothetical')]
+    ).encode('utf-8')).hexdigest()[:10]
+    return f"{entry.get('timestamp') or 'unknown'}_{model}_{digest}"
+
+
+def summarize(entry: Dict) -> Dict:
+    """
+    Compact leaderboard row of an analysis result.
+
+    Args:
+        entry: One analysis result
+
+    Returns:
+        Dict with id, model, timestamp, the per-criterion scores, average, assessment, final and ranking score
+    """
+    evaluation = (entry.get('final_synthesis') or {}).get('evaluation') or {}
+    # Evaluation keys sometimes keep the markdown bold markers of the model's answer
+    scores = {key.strip('*'): value for key, value in (evaluation.get('scores') or {}).items()}
+    return {
+        "id": run_id(entry),
+        "model": entry.get('model'),
+        "timestamp": entry.get('timestamp'),
+        "scores": {key: scores.get(key, '') for key in SCORE_KEYS},
+        "average_score": evaluation.get('average_score', entry.get('average_score', '')),
+        "overall_assessment": evaluation.get('overall_assessment', ''),
+        "final_score": entry.get('final_score', ''),
+        # What generate.py has always ranked by: the top-level final or average score
+        "rank_score": entry.get('final_score', entry.get('average_score', 0)),
+    }
+
+
+def rank_key(row: Dict) -> float:
+    try:
+        return float(row.get('rank_score') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def entry_digest(entry: Dict) -> str:
+    """Content hash of an analysis result, to tell whether an indexed run was edited"""
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class LeaderboardIndex:
+    """
+    Compact summary index of the leaderboard site plus one lazily loaded detail file per run.
+
+    The site directory holds summary.json (one small row per run, ranked) and runs/<id>.json
+    (the full analysis result). Adding a run writes its detail file and row only, and only
+    when the run is new or its content changed, so the index can be updated as runs finish.
+    sync() makes the index match a full rescan of the results file, dropping runs that are
+    no longer in it.
+    """
+
+    def __init__(self, site_dir: str, empty: bool = False):
+        """
+        Args:
+            site_dir: Leaderboard site directory
+            empty: Start from an empty index instead of the existing summary.json
+        """
+        self.site_dir = site_dir
+        self.runs_dir = os.path.join(site_dir, "runs")
+        self.path = os.path.join(site_dir, "summary.json")
+        self.meta = {}
+        self.rows = {}
+        if os.path.exists(self.path) and not empty:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.meta = index.get("source", {})
+            self.rows = {row["id"]: row for row in index.get("runs", [])}
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.rows
+
+    def add(self, entry: Dict) -> bool:
+        """
+        Add one analysis result, or refresh its row if the indexed copy differs.
+
+        Args:
+            entry: One analysis result
+
+        Returns:
+            True if the run was new or changed
+        """
+        row = summarize(entry)
+        row["digest"] = entry_digest(entry)
+        row["detail"] = f"runs/{row['id']}.json"
+        previous = self.rows.get(row["id"])
+        if previous is not None and previous.get("digest") == row["digest"]:
+            return False
+        os.makedirs(self.runs_dir, exist_ok=True)
+        self._write_json(os.path.join(self.site_dir, row["detail"]), entry, indent=None)
+        self.rows[row["id"]] = row
+        if previous is None:
+            self.added += 1
+        else:
+            self.updated += 1
+        return True
+
+    def add_all(self, entries: Iterable[Dict]) -> int:
+        """
+        Add many analysis results.
+
+        Args:
+            entries: Analysis results, e.g. from iter_json_array
+
+        Returns:
+            Number of new or changed runs
+        """
+        return sum(self.add(entry) for entry in entries)
+
+    def sync(self, entries: Iterable[Dict]) -> int:
+        """
+        Make the index match a full scan of the results: add new runs, refresh edited ones
+        and drop runs (and detail files) that are no longer in the results.
+
+        Args:
+            entries: Every analysis result of the results file
+
+        Returns:
+            Number of new, changed or removed runs
+        """
+        seen = set()
+        changed = 0
+        for entry in entries:
+            changed += self.add(entry)
+            seen.add(run_id(entry))
+        for entry_id in [entry_id for entry_id in self.rows if entry_id not in seen]:
+            del self.rows[entry_id]
+            self.removed += 1
+            changed += 1
+        # Detail files of dropped runs, and leftovers of an index rebuilt from empty
+        if os.path.isdir(self.runs_dir):
+            kept = {os.path.basename(row["detail"]) for row in self.rows.values()}
+            for name in os.listdir(self.runs_dir):
+                if name.endswith(".json") and name not in kept:
+                    os.remove(os.path.join(self.runs_dir, name))
+        return changed
+
+    def save(self, source: Dict = None) -> None:
+        """
+        Write summary.json with ranks, atomically.
+
+        Args:
+            source: Size and hash of the analysis_results.json the index was built from
+        """
+        if source is not None:
+            self.meta = source
+        rows = sorted(self.rows.values(), key=rank_key, reverse=True)
+        for rank, row in enumerate(rows, 1):
+            row["rank"] = rank
+        self._write_json(self.path, {"source": self.meta, "runs": rows}, indent=1)
+
+    @staticmethod
+    def _write_json(path: str, data, indent) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+
+
+def source_stamp(path: str, chunk_size: int = 1 << 20) -> Dict:
+    """
+    Size and content hash of a results file, to tell whether it changed since the index was built.
+
+    The hash rather than the mtime is recorded so the committed summary.json does not change
+    with every checkout.
+
+    Args:
+        path: analysis_results.json
+        chunk_size: Bytes hashed per read
+
+    Returns:
+        Dict with size and sha256
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return {"size": os.path.getsize(path), "sha256": digest.hexdigest()}
@@ -1,8 +1,11 @@
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union, Callable
 from dataclasses import dataclass
 import json
-import time
+import threading
 from helper.inference import *
+from helper.tracing import span
+from helper.prompt_layout import PromptLayout
+from helper.scheduler import linear_dependencies, topological_generations
 from helper.eval import SummaryEvaluator
 
 @dataclass
@@ -53,6 +56,9 @@ class BaseAgent:
         self.role_desc = agent_config['role_description']
         self.phase_prompts = agent_config['phase_prompts']
         self.phases = list(self.phase_prompts.keys())
+        # Phases run in config order unless the config declares which phases each one needs
+        self.phase_dependencies = agent_config.get('phase_dependencies') or linear_dependencies(self.phases)
+        topological_generations(self.phases, self.phase_dependencies)
         self.notes = notes or []
         self.max_steps = default_config['max_steps']
         self.model = input_model or default_config['model']
@@ -60,22 +66,13 @@ class BaseAgent:
         self.prev_comm = ""
         self.api_keys = api_keys or {}
         self.max_hist_len = default_config['max_history']
+        self.run_id: Optional[str] = None  # Set by the workflow for usage accounting
+        self._history_lock = threading.Lock()  # Phases may finish concurrently
         
         # Get the appropriate API key based on the model
         provider = get_provider(self.model)
         self.api_key = self.api_keys.get(provider)
-        
-        # Rate limiting
-        self.last_api_call = 0
-        self.min_api_interval = 1  # seconds
-
-    def _rate_limit(self) -> None:
-        """Implement rate limiting for API calls"""
-        now = time.time()
-        time_since_last = now - self.last_api_call
-        if time_since_last < self.min_api_interval:
-            time.sleep(self.min_api_interval - time_since_last)
-        self.last_api_call = now
+        # Rate limiting is handled by the shared per-model limiter in query_model
 
     def _manage_history(self, entry: str) -> None:
         """Manage history entries with cleanup"""
@@ -93,36 +90,55 @@ class BaseAgent:
             raise ValueError(f"Invalid phase {phase} for agent {self.agent_type}")
         return self.phase_prompts[phase]
 
-    def inference(
+    def build_prompts(
         self,
         question: str,
         phase: str,
         step: int,
         feedback: str = "",
-        temp: Optional[float] = None
-    ) -> str:
+        context: str = "",
+        prior: Optional[Dict[str, str]] = None
+    ) -> PromptLayout:
         """
+        Build the prompts for a phase from the agent's current state
+
+        Content shared by every phase (role, retrieved context, question) is
+        placed before the per-call content so provider prompt caches can hit.
+
         Args:
             question: The legal question to analyse
             phase: Current phase of analysis
             step: Current step number
             feedback: Previous feedback
-            temp: Temperature for model inference
-            
+            context: Retrieved legal documents for the question
+            prior: Outputs of the phases this phase depends on; replaces the
+                agent's running history when phases are scheduled as a graph
+
         Returns:
-            Model response
+            PromptLayout with the system prompt and the stable and volatile user prompt sections
         """
         if phase not in self.phases:
             raise ValueError(f"Invalid phase {phase} for agent {self.__class__.__name__}")
-            
-        self._rate_limit()
-        
-        system_prompt = (
-            f"You are {self.role_description()}\n"
-            f"Task instructions: {self.phase_prompt(phase)}\n"
+
+        layout = PromptLayout(system=f"You are {self.role_description()}\n")
+        if context:
+            layout.stable.append(f"Relevant Legal Context:\n{context}\n\n")
+        layout.stable.append(
+            f"[Objective] Your goal is to analyse the following legal question: "
+            f"{question}\n"
         )
+        if context:
+            layout.stable.append("Based on the above context and your legal knowledge, please analyze the question.\n")
         
-        history_str = "\n".join(entry[1] for entry in self.history)
+        if prior is None:
+            history_str = "\n".join(entry[1] for entry in self.history)
+            previous = self.prev_comm
+        else:
+            earlier = [p for p in self.phases if p in prior]
+            history_str = "\n".join(
+                f"Step #{self.phases.index(p) + 1}, Phase: {p}, Analysis: {prior[p]}" for p in earlier
+            )
+            previous = prior[earlier[-1]] if earlier else ""
         phase_notes = [
             note["note"] for note in self.notes 
             if phase in note["phases"]
@@ -132,33 +148,68 @@ class BaseAgent:
             if phase_notes else ""
         )
         
-        user_prompt = (
+        layout.volatile.append(
+            f"{'~' * 10}\n"
+            f"Task instructions: {self.phase_prompt(phase)}\n"
             f"History: {history_str}\n{'~' * 10}\n"
             f"Current Step #{step}, Phase: {phase}\n"
-            f"[Objective] Your goal is to analyse the following legal question: "
-            f"{question}\n"
             f"Feedback: {feedback}\nNotes: {notes_str}\n"
-            f"Your previous response was: {self.prev_comm}. "
+            f"Your previous response was: {previous}. "
             f"Please ensure your new analysis adds value.\n"
             f"Please provide your analysis below:\n"
         )
+        return layout
+
+    def record_response(self, phase: str, step: int, model_resp: str) -> None:
+        """Store a phase response in the agent's history"""
+        with self._history_lock:
+            self.prev_comm = model_resp
+            self._manage_history(
+                f"Step #{step}, Phase: {phase}, Analysis: {model_resp}"
+            )
+
+    def inference(
+        self,
+        question: str,
+        phase: str,
+        step: int,
+        feedback: str = "",
+        temp: Optional[float] = None,
+        context: str = "",
+        prior: Optional[Dict[str, str]] = None
+    ) -> str:
+        """
+        Args:
+            question: The legal question to analyse
+            phase: Current phase of analysis
+            step: Current step number
+            feedback: Previous feedback
+            temp: Temperature for model inference
+            context: Retrieved legal documents for the question
+            prior: Outputs of the phases this phase depends on (see build_prompts)
+            
+        Returns:
+            Model response
+        """
+        layout = self.build_prompts(question, phase, step, feedback, context, prior)
 
         try:
             model_resp = query_model(
                 model_str=self.model,
-                system_prompt=system_prompt,
-                prompt=user_prompt,
+                system_prompt=layout.system,
+                prompt=layout.user,
                 api_key=self.api_key,
-                temp=temp
+                temp=temp,
+                run_id=self.run_id,
+                agent=self.agent_type,
+                phase=phase,
+                cache_split=layout.cache_split
             )
         except Exception as e:
             print(f"Error during model inference: {str(e)}")
             raise
             
-        self.prev_comm = model_resp
-        self._manage_history(
-            f"Step #{step}, Phase: {phase}, Analysis: {model_resp}"
-        )
+        self.record_response(phase, step, model_resp)
         
         return model_resp
 
@@ -215,7 +266,8 @@ class LegalReviewPanel:
         max_history: int = 15,
         notes: Optional[List[Dict[str, Any]]] = None,
         review_config_path: str = "settings/review.json",
-        entailment_threshold: float = 0.84
+        entailment_threshold: float = 0.84,
+        run_id: Optional[str] = None
     ):
         """
         Initialize the review panel with configuration
@@ -229,7 +281,9 @@ class LegalReviewPanel:
             notes: Additional notes or instructions for agents
             review_config_path: Path to review configuration file
             entailment_threshold: Threshold for determining factual consistency
+            run_id: Identifier of the workflow run, used for usage accounting
         """
+        self.run_id = run_id
         self.model = input_model if input_model is not None else "gpt-4o-mini"
         provider = get_provider(self.model)
         self.api_key = api_keys.get(provider)
@@ -260,37 +314,29 @@ class LegalReviewPanel:
         # Initialize factual consistency evaluator
         self.consistency_evaluator = SummaryEvaluator(entailment_threshold=entailment_threshold)
 
-    def _query_model(self, system_prompt: str, prompt: str) -> str:
+    def _query_model(self, system_prompt: str, prompt: str, phase: Optional[str] = None) -> str:
         """Helper method to safely query the model with error handling"""
         try:
             return query_model(
                 model_str=self.model,
                 system_prompt=system_prompt,
                 prompt=prompt,
-                api_key=self.api_key
+                api_key=self.api_key,
+                run_id=self.run_id,
+                agent="review_panel",
+                phase=phase
             )
         except Exception as e:
             print(f"Error querying model: {str(e)}")
             raise
 
-    def evaluate_legal_analysis(self, legal_text: str, source_text: str) -> Dict[str, Any]:
+    def build_evaluation_prompt(self, legal_text: str, source_text: str) -> Tuple[str, str]:
         """
-        Evaluate a legal text based on the criteria defined in review_config
-        
-        Args:
-            legal_text: The legal analysis to evaluate
-            
+        Build the system and user prompts used to score a legal analysis
+
         Returns:
-            Dictionary containing scores and qualitative assessments
+            Tuple of (system prompt, evaluation prompt)
         """
-        # Initialize result structure
-        evaluation_result = {
-            "scores": {},
-            "assessments": {},
-            "average_score": 0,
-            "overall_assessment": ""
-        }
-        
         # Prepare evaluation prompt
         sys_prompt = (
             "You are an expert legal evaluation system. "
@@ -317,78 +363,117 @@ class LegalReviewPanel:
         eval_prompt += "Format your response as follows:\n"
         eval_prompt += "Criterion: [criterion name]\nScore: [numerical score 1-10]\nAssessment: [detailed assessment]\n\n"
         eval_prompt += "End with an Overall Assessment summarizing strengths and weaknesses of the analysis."
+        return sys_prompt, eval_prompt
+
+    def parse_evaluation(self, evaluation_response: str) -> Dict[str, Any]:
+        """
+        Parse a model's evaluation response into scores and assessments
+
+        Args:
+            evaluation_response: Raw evaluation text in "Criterion/Score/Assessment" format
+
+        Returns:
+            Dictionary containing scores and qualitative assessments
+        """
+        evaluation_result = {
+            "scores": {},
+            "assessments": {},
+            "average_score": 0,
+            "overall_assessment": ""
+        }
+        # Parse the evaluation response
+        sections = evaluation_response.split("Criterion:")
         
-        try:
-            # Query model for evaluation
-            evaluation_response = self._query_model(sys_prompt, eval_prompt)
-            
-            # Parse the evaluation response
-            sections = evaluation_response.split("Criterion:")
-            
-            # Process each criterion evaluation
-            for section in sections[1:]:  # Skip the first empty split
-                lines = section.strip().split("\n")
-                if len(lines) >= 3:
-                    criterion_name = lines[0].strip().lower().replace(" ", "_")
-                    score_line = lines[1].strip()
+        # Process each criterion evaluation
+        for section in sections[1:]:  # Skip the first empty split
+            lines = section.strip().split("\n")
+            if len(lines) >= 3:
+                criterion_name = lines[0].strip().lower().replace(" ", "_")
+                score_line = lines[1].strip()
+                
+                # Fix: Improve score extraction to handle non-standard formats
+                if ":" in score_line:
+                    score_text = score_line.split(":")[1].strip()
+                    # Remove any non-numeric characters and convert to int
+                    score_digits = ''.join(c for c in score_text if c.isdigit())
+                    score = int(score_digits) if score_digits else 0
+                else:
+                    score = 0
                     
-                    # Fix: Improve score extraction to handle non-standard formats
-                    if ":" in score_line:
-                        score_text = score_line.split(":")[1].strip()
-                        # Remove any non-numeric characters and convert to int
-                        score_digits = ''.join(c for c in score_text if c.isdigit())
-                        score = int(score_digits) if score_digits else 0
+                # Extract assessment (may be multiple lines)
+                assessment_start = 0
+                for i, line in enumerate(lines[2:], 2):
+                    if line.strip().startswith("Assessment:"):
+                        assessment_start = i
+                        break
+                
+                # Gather assessment text until next criterion or overall assessment
+                assessment_lines = []
+                for i in range(assessment_start, len(lines)):
+                    line = lines[i].strip()
+                    if (line.startswith("Criterion:") or 
+                        line.startswith("Overall Assessment:") or
+                        not line):
+                        break
+                    if line.startswith("Assessment:"):
+                        assessment_lines.append(line[len("Assessment:"):].strip())
                     else:
-                        score = 0
-                        
-                    # Extract assessment (may be multiple lines)
-                    assessment_start = 0
-                    for i, line in enumerate(lines[2:], 2):
-                        if line.strip().startswith("Assessment:"):
-                            assessment_start = i
-                            break
-                    
-                    # Gather assessment text until next criterion or overall assessment
-                    assessment_lines = []
-                    for i in range(assessment_start, len(lines)):
-                        line = lines[i].strip()
-                        if (line.startswith("Criterion:") or 
-                            line.startswith("Overall Assessment:") or
-                            not line):
-                            break
-                        if line.startswith("Assessment:"):
-                            assessment_lines.append(line[len("Assessment:"):].strip())
-                        else:
-                            assessment_lines.append(line)
-                    
-                    assessment = " ".join(assessment_lines).strip()
-                    
-                    # Store in results
-                    evaluation_result["scores"][criterion_name] = score
-                    evaluation_result["assessments"][criterion_name] = assessment
-            
-            # Extract overall assessment
-            if "Overall Assessment:" in evaluation_response:
-                overall_section = evaluation_response.split("Overall Assessment:")[1].strip()
-                evaluation_result["overall_assessment"] = overall_section
-            
-            # Calculate average score
-            if evaluation_result["scores"]:
-                evaluation_result["average_score"] = round(
-                    sum(evaluation_result["scores"].values()) / len(evaluation_result["scores"]), 2
-                )
-            
-            return evaluation_result
+                        assessment_lines.append(line)
+                
+                assessment = " ".join(assessment_lines).strip()
+                
+                # Store in results
+                evaluation_result["scores"][criterion_name] = score
+                evaluation_result["assessments"][criterion_name] = assessment
+        
+        # Extract overall assessment
+        if "Overall Assessment:" in evaluation_response:
+            overall_section = evaluation_response.split("Overall Assessment:")[1].strip()
+            evaluation_result["overall_assessment"] = overall_section
+        
+        # Calculate average score
+        if evaluation_result["scores"]:
+            evaluation_result["average_score"] = round(
+                sum(evaluation_result["scores"].values()) / len(evaluation_result["scores"]), 2
+            )
+
+        return evaluation_result
+
+    def fallback_evaluation(self, error: Exception) -> Dict[str, Any]:
+        """Neutral scores used when automated evaluation fails"""
+        print(f"Error in evaluation: {str(error)}")
+        evaluation_result = {
+            "scores": {},
+            "assessments": {},
+            "average_score": 5,
+            "overall_assessment": f"Automated evaluation failed: {str(error)}"
+        }
+        for criterion in self.review_config["review_criteria"].keys():
+            evaluation_result["scores"][criterion] = 5
+            evaluation_result["assessments"][criterion] = "Evaluation failed"
+        return evaluation_result
+
+    def evaluate_legal_analysis(self, legal_text: str, source_text: str) -> Dict[str, Any]:
+        """
+        Evaluate a legal text based on the criteria defined in review_config
+        
+        Args:
+            legal_text: The legal analysis to evaluate
             
-        except Exception as e:
-            print(f"Error in evaluation: {str(e)}")
-            # Fallback scoring
-            for criterion in self.review_config["review_criteria"].keys():
-                evaluation_result["scores"][criterion] = 5
-                evaluation_result["assessments"][criterion] = "Evaluation failed"
-            evaluation_result["average_score"] = 5
-            evaluation_result["overall_assessment"] = f"Automated evaluation failed: {str(e)}"
-            return evaluation_result
+        Returns:
+            Dictionary containing scores and qualitative assessments
+        """
+        sys_prompt, eval_prompt = self.build_evaluation_prompt(legal_text, source_text)
+        with span("evaluation", run_id=self.run_id) as eval_span:
+            try:
+                # Query model for evaluation
+                evaluation_response = self._query_model(sys_prompt, eval_prompt, phase="evaluation")
+                evaluation = self.parse_evaluation(evaluation_response)
+            except Exception as e:
+                eval_span.set(fallback=True, error=str(e))
+                evaluation = self.fallback_evaluation(e)
+            eval_span.set(average_score=evaluation.get("average_score"))
+            return evaluation
                     
     def evaluate_factual_consistency(self, source_text: str, generated_text: str) -> Dict[str, Any]:
         """
@@ -402,7 +487,11 @@ class LegalReviewPanel:
             Dictionary with entailment scores and flagged sentences
         """
         try:
-            return self.consistency_evaluator.evaluate_summary(source_text, generated_text)
+            with span("nli_consistency", run_id=self.run_id) as nli_span:
+                consistency = self.consistency_evaluator.evaluate_summary(source_text, generated_text)
+                nli_span.set(entailment_score=consistency.get("Entailment Score"),
+                             flagged_sentences=len(consistency.get("Flagged Sentences", [])))
+                return consistency
         except Exception as e:
             print(f"Error in factual consistency evaluation: {str(e)}")
             return {
@@ -412,26 +501,38 @@ class LegalReviewPanel:
                 "Error": str(e)
             }
     
-    def synthesize_reviews(self, reviews: List[Dict[str, Any]], source_text: str = None) -> Dict[str, Any]:
+    @staticmethod
+    def compile_review(phase_outputs: Dict[str, str]) -> str:
         """
-        Synthesize reviews with Singapore focus and provide evaluation
-        
+        Join an agent's phase outputs into the review text used for synthesis
+
+        Args:
+            phase_outputs: Phase name -> analysis, in phase order
+
+        Returns:
+            One titled section per phase
+        """
+        return "\n\n".join(
+            f"{phase.capitalize()}:\n{output}" for phase, output in phase_outputs.items() if output
+        )
+
+    def build_synthesis_prompt(self, reviews: List[Dict[str, Any]]) -> Tuple[str, str, str, str]:
+        """
+        Validate reviews and build the synthesis prompts
+
         Args:
             reviews: List of review dictionaries with perspective and content
-            source_text: Original source document to check consistency against (optional)
-            
+
         Returns:
-            Dictionary containing synthesized analysis, evaluation, and consistency check
+            Tuple of (system prompt, synthesis prompt, internal perspective, external perspective)
         """
         # Validate required perspectives
         required_perspectives = {"internal_law", "external_law"}
         provided_perspectives = {r["perspective"] for r in reviews}
-        print('check 2')
         
         if not required_perspectives.issubset(provided_perspectives):
             missing = required_perspectives - provided_perspectives
             raise ValueError(f"Missing required perspectives: {missing}")
-        print('check 3')
         # Extract perspectives
         internal_perspective = next(r["review"] for r in reviews if r["perspective"] == "internal_law")
         external_perspective = next(r["review"] for r in reviews if r["perspective"] == "external_law")
@@ -442,39 +543,75 @@ class LegalReviewPanel:
             internal_perspective=internal_perspective,
             external_perspective=external_perspective
         )
+        return sys_prompt, synthesis_prompt, internal_perspective, external_perspective
+
+    def assemble_synthesis(
+        self,
+        internal_perspective: str,
+        external_perspective: str,
+        synthesis_text: str,
+        evaluation: Dict[str, Any],
+        source_text: str = None
+    ) -> Dict[str, Any]:
+        """
+        Build the synthesis result and add the factual consistency check if source text is provided
+        """
+        # Result structure
+        result = {
+            "internal_perspective": internal_perspective,
+            "external_perspective": external_perspective,
+            "synthesis": synthesis_text,
+            "evaluation": evaluation
+        }
+        
+        # Add factual consistency check if source text is provided
+        if source_text:
+            consistency_evaluation = self.evaluate_factual_consistency(source_text, synthesis_text)
+            result["consistency_evaluation"] = consistency_evaluation
+            # Add a warning flag if factual inconsistencies are detected
+            if consistency_evaluation["Flagged Sentences"]:
+                result["has_factual_inconsistencies"] = True
+                result["factual_consistency_score"] = consistency_evaluation["Entailment Score"]
+            else:
+                result["has_factual_inconsistencies"] = False
+                result["factual_consistency_score"] = consistency_evaluation["Entailment Score"]
+        
+        return result
+
+    def synthesize_reviews(
+        self,
+        reviews: List[Dict[str, Any]],
+        source_text: str = None,
+        on_step: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Synthesize reviews with Singapore focus and provide evaluation
+        
+        Args:
+            reviews: List of review dictionaries with perspective and content
+            source_text: Original source document to check consistency against (optional)
+            on_step: Called with ("synthesis", text) and ("evaluation", scores) as each step finishes (optional)
+            
+        Returns:
+            Dictionary containing synthesized analysis, evaluation, and consistency check
+        """
+        sys_prompt, synthesis_prompt, internal_perspective, external_perspective = self.build_synthesis_prompt(reviews)
         
         try:
-            print('check 4')
             # Generate synthesis
-            synthesis_text = self._query_model(sys_prompt, synthesis_prompt)
+            with span("synthesis", run_id=self.run_id):
+                synthesis_text = self._query_model(sys_prompt, synthesis_prompt, phase="synthesis")
+            if on_step is not None:
+                on_step("synthesis", synthesis_text)
             
             # Evaluate the synthesis
-            print('check 5')
             evaluation = self.evaluate_legal_analysis(synthesis_text, source_text)
+            if on_step is not None:
+                on_step("evaluation", evaluation)
             
-            # Result structure
-            result = {
-                "internal_perspective": internal_perspective,
-                "external_perspective": external_perspective,
-                "synthesis": synthesis_text,
-                "evaluation": evaluation
-            }
-            
-            # Add factual consistency check if source text is provided
-            if source_text:
-                print('check 6')
-                consistency_evaluation = self.evaluate_factual_consistency(source_text, synthesis_text)
-                result["consistency_evaluation"] = consistency_evaluation
-                print('check 7')
-                # Add a warning flag if factual inconsistencies are detected
-                if consistency_evaluation["Flagged Sentences"]:
-                    result["has_factual_inconsistencies"] = True
-                    result["factual_consistency_score"] = consistency_evaluation["Entailment Score"]
-                else:
-                    result["has_factual_inconsistencies"] = False
-                    result["factual_consistency_score"] = consistency_evaluation["Entailment Score"]
-            
-            return result
+            return self.assemble_synthesis(
+                internal_perspective, external_perspective, synthesis_text, evaluation, source_text
+            )
             
         except Exception as e:
             print(f"Error in synthesis: {str(e)}")
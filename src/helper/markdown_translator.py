@@ -1,13 +1,15 @@
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-def convert_to_md(input_file, output_file=None):
+def convert_to_md(input_file, output_file=None, data=None):
     """
     Convert a legal analysis JSON file to a formatted Markdown file.
     
     Args:
         input_file: Path to the JSON file to convert
         output_file: Path to save the Markdown file (if None, uses input_file with .md extension)
+        data: The already loaded analysis results; when given, input_file is not read
         
     Returns:
         str: Path to the created Markdown file
@@ -16,12 +18,13 @@ def convert_to_md(input_file, output_file=None):
     if output_file is None:
         output_file = os.path.splitext(input_file)[0] + '.md'
     
-    # Read JSON file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            raise ValueError(f"Invalid JSON file: {input_file}")
+    # Read JSON file unless the caller still holds the results it just saved
+    if data is None:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                raise ValueError(f"Invalid JSON file: {input_file}")
     
     # Generate markdown content
     markdown = []
@@ -158,6 +161,47 @@ def convert_to_md(input_file, output_file=None):
                 for i, sentence in enumerate(data["final_synthesis"]["consistency_evaluation"]["Flagged Sentences"], 1):
                     markdown.append(f"{i}. \"{sentence}\"\n")
     
+    # Add where the run's time went
+    if data.get("timing") and data["timing"].get("stages"):
+        markdown.append("## Timing\n")
+        markdown.append(f"**Wall time**: {data['timing']['wall_s']:.1f}s (nested stages overlap)\n")
+        markdown.append("| Stage | Calls | Total (s) | Mean (s) | Max (s) | % of Run |")
+        markdown.append("|-------|-------|-----------|----------|---------|----------|")
+        for row in data["timing"]["stages"]:
+            markdown.append(
+                f"| {row['stage']} | {row['calls']} | {row['total_s']:.2f} | {row['mean_s']:.2f} | "
+                f"{row['max_s']:.2f} | {row['pct_of_run']:.1f} |"
+            )
+        markdown.append("")
+
+    # Add the critical path of the agent phase schedule
+    if data.get("schedule") and data["schedule"].get("critical_path"):
+        schedule = data["schedule"]
+        markdown.append("### Phase Schedule\n")
+        markdown.append(
+            f"**Tasks**: {schedule['tasks']} on {schedule['max_workers']} workers, "
+            f"parallelism {schedule['parallelism']:.2f}, critical path {schedule['critical_path_s']:.2f}s "
+            f"({schedule['critical_path_pct']:.1f}% of {schedule['wall_s']:.2f}s)\n"
+        )
+        markdown.append("| Critical Path Task | Start (s) | Duration (s) |")
+        markdown.append("|--------------------|-----------|--------------|")
+        for step in schedule["critical_path"]:
+            markdown.append(f"| {step['task']} | {step['start_s']:.2f} | {step['duration_s']:.2f} |")
+        markdown.append("")
+
+    # Add how retrieved context was packed into the prompts
+    if data.get("context_packing"):
+        markdown.append("## Retrieved Context\n")
+        markdown.append("| Retrieval | Included | Tokens / Budget | Dropped (duplicate) | Dropped (budget) |")
+        markdown.append("|-----------|----------|-----------------|---------------------|------------------|")
+        for name, packing in data["context_packing"].items():
+            reasons = [d["reason"] for d in packing["dropped"]]
+            markdown.append(
+                f"| {name} | {len(packing['included'])} | {packing['tokens']} / {packing['budget_tokens']} | "
+                f"{reasons.count('duplicate')} | {reasons.count('budget')} |"
+            )
+        markdown.append("")
+
     # Write markdown to file
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write("\n".join(markdown))
@@ -165,13 +209,26 @@ def convert_to_md(input_file, output_file=None):
     print(f"Converted {input_file} to {output_file}")
     return output_file
 
-def batch_convert_directory(directory_path, output_directory=None):
+def _convert_file(paths):
+    """
+    Process pool task: convert one file, returning (output path, error message)
+    """
+    input_path, output_path = paths
+    try:
+        return convert_to_md(input_path, output_path), None
+    except Exception as e:
+        return None, f"Error converting {input_path}: {e}"
+
+def batch_convert_directory(directory_path, output_directory=None, workers=None, force=False, recursive=False):
     """
     Convert all JSON files in a directory to Markdown files.
     
     Args:
         directory_path: Path to directory containing JSON files
         output_directory: Directory to save Markdown files (if None, uses same directory)
+        workers: Processes rendering in parallel (if None, one per CPU; 1 converts in this process)
+        force: Convert files whose Markdown output is already newer than the JSON
+        recursive: Also convert JSON files in subdirectories (e.g. results/ with one directory per run)
     
     Returns:
         list: Paths to all created Markdown files
@@ -181,17 +238,44 @@ def batch_convert_directory(directory_path, output_directory=None):
     else:
         os.makedirs(output_directory, exist_ok=True)
     
-    converted_files = []
+    if recursive:
+        filenames = [
+            os.path.relpath(os.path.join(root, filename), directory_path)
+            for root, _, files in os.walk(directory_path) for filename in files
+        ]
+    else:
+        filenames = os.listdir(directory_path)
     
-    for filename in os.listdir(directory_path):
+    tasks = []
+    skipped = 0
+    for filename in sorted(filenames):
         if filename.endswith('.json'):
             input_path = os.path.join(directory_path, filename)
             output_path = os.path.join(output_directory, os.path.splitext(filename)[0] + '.md')
             
-            try:
-                converted_file = convert_to_md(input_path, output_path)
-                converted_files.append(converted_file)
-            except Exception as e:
-                print(f"Error converting {filename}: {e}")
+            # Skip files whose Markdown is newer than the JSON it was rendered from
+            if not force and os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            tasks.append((input_path, output_path))
     
-    return converted_files
\ No newline at end of file
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        results = [_convert_file(task) for task in tasks]
+    else:
+        # Rendering is pure Python (json parsing and string building), so it scales with processes, not threads
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_convert_file, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    
+    converted_files = []
+    for converted_file, error in results:
+        if error:
+            print(error)
+        else:
+            converted_files.append(converted_file)
+    if skipped:
+        print(f"Skipped {skipped} files with up-to-date Markdown")
+    return converted_files
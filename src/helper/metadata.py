@@ -0,0 +1,191 @@
+import datetime
+import re
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# Court hierarchy, higher is more authoritative: 4 apex, 3 appellate, 2 superior first instance, 1 lower, 0 tribunal
+COURT_LEVELS = {
+    "sgca": 4, "sghc(a)": 3, "sghc": 2, "sghcr": 2, "sghcf": 2, "sghc(i)": 2, "sgdc": 1, "sgfc": 1, "sgmc": 0,
+    "uksc": 4, "ukhl": 4, "ukpc": 4, "ewca": 3, "ewhc": 2,
+    "u.s.": 4, "s. ct.": 4, "f.4th": 3, "f.3d": 3, "f.2d": 3, "f. supp.": 2,
+}
+COURT_NAMES = {
+    "supreme court": 4, "house of lords": 4, "privy council": 4, "court of appeal": 3, "appellate division": 3,
+    "high court": 2, "district court": 1, "magistrate": 0, "tribunal": 0,
+}
+JURISDICTIONS = {
+    "sg": "sg", "singapore": "sg",
+    "us": "us", "u.s.": "us", "usa": "us", "united states": "us", "united states of america": "us",
+    "uk": "uk", "united kingdom": "uk", "england": "uk", "england and wales": "uk", "gb": "uk",
+}
+# Citation prefix -> jurisdiction, for documents whose metadata names only a court or citation
+CITATION_JURISDICTIONS = {"sg": "sg", "uk": "uk", "ew": "uk", "u.s.": "us", "s. ct.": "us", "f.": "us"}
+
+CITATION_PATTERN = re.compile(
+    r"\[(\d{4})\]\s+(SGCA|SGHC\(A\)|SGHC\(I\)|SGHCR|SGHCF|SGHC|SGDC|SGFC|SGMC|UKSC|UKHL|UKPC|EWCA|EWHC)"
+    r"|\d+\s+(U\.S\.|S\. Ct\.|F\.4th|F\.3d|F\.2d|F\. Supp\.)",
+    re.IGNORECASE,
+)
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y", "%Y/%m/%d", "%Y%m%d")
+
+# Singapore's Supreme Court also hosts the High Court, so the apex label depends on the citation where there is one
+_SG_APEX = {"court of appeal": 4}
+
+
+def _slug(tag: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", tag.strip().lower()).strip("_")
+
+
+def parse_date(value: Union[str, int, datetime.date, None]) -> Optional[datetime.date]:
+    """
+    Parse the date formats found in case metadata ("2007-05-22", "22/05/2007", "22 May 2007", "2007")
+
+    Returns:
+        The date (1 January for a bare year), or None when it cannot be parsed
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    match = re.fullmatch(r"(\d{4})", text)
+    return datetime.date(int(match.group(1)), 1, 1) if match else None
+
+
+def date_ordinal(metadata: Optional[Dict[str, Any]]) -> int:
+    """Sortable YYYYMMDD integer of a document's case date, 0 when it has none"""
+    if not metadata:
+        return 0
+    if metadata.get("case_date_ord"):
+        return int(metadata["case_date_ord"])
+    date = parse_date(metadata.get("case_date"))
+    return int(date.strftime("%Y%m%d")) if date else 0
+
+
+def court_level(court: str, jurisdiction: Optional[str] = None) -> Optional[int]:
+    """Level of a court name or citation abbreviation in COURT_LEVELS, None when unknown"""
+    key = court.strip().lower()
+    if key in COURT_LEVELS:
+        return COURT_LEVELS[key]
+    names = dict(COURT_NAMES, **(_SG_APEX if jurisdiction == "sg" else {}))
+    for name, level in names.items():
+        if name in key:
+            return level
+    return None
+
+
+def normalize_metadata(metadata: Optional[Dict[str, Any]], document: str = "") -> Dict[str, Any]:
+    """
+    Normalize document metadata into scalar, filterable fields at ingest time
+
+    Chroma indexes scalar metadata only, so list-valued tags become one boolean
+    field per tag and dates become sortable integers that where clauses can range over.
+
+    Args:
+        metadata: Raw metadata as supplied by the ingest (may be None)
+        document: Document text, used to infer court, jurisdiction and year from citations
+
+    Returns:
+        Metadata with, where derivable:
+            case_date (ISO), case_date_ord (YYYYMMDD int), case_year (int),
+            jurisdiction ("sg", "us", "uk" or the lowercased original), court_level (0-4),
+            tags (comma-separated string) and tag_<slug> = True per tag
+    """
+    normalized: Dict[str, Any] = {}
+    for key, value in (metadata or {}).items():
+        if isinstance(value, (str, int, float, bool)):
+            normalized[key] = value
+
+    citation = CITATION_PATTERN.search(document or "") if document else None
+    cited_court = (citation.group(2) or citation.group(3)) if citation else None
+
+    jurisdiction = str((metadata or {}).get("jurisdiction") or "").strip().lower()
+    if not jurisdiction and cited_court:
+        jurisdiction = next((j for prefix, j in CITATION_JURISDICTIONS.items() if cited_court.lower().startswith(prefix)), "")
+    if jurisdiction:
+        normalized["jurisdiction"] = JURISDICTIONS.get(jurisdiction, jurisdiction)
+
+    court = (metadata or {}).get("court") or cited_court
+    if court:
+        level = court_level(str(court), normalized.get("jurisdiction"))
+        if level is not None:
+            normalized["court_level"] = level
+
+    date = parse_date((metadata or {}).get("case_date"))
+    if date is None and citation and citation.group(1):
+        date = datetime.date(int(citation.group(1)), 1, 1)
+    if date is not None:
+        normalized["case_date"] = date.isoformat()
+        normalized["case_date_ord"] = int(date.strftime("%Y%m%d"))
+        normalized["case_year"] = date.year
+
+    tags = (metadata or {}).get("tags")
+    if isinstance(tags, str):
+        tags = [t for t in tags.split(",") if t.strip()]
+    if tags:
+        normalized["tags"] = ", ".join(t.strip() for t in tags)
+        for tag in tags:
+            normalized[f"tag_{_slug(tag)}"] = True
+    return normalized
+
+
+def build_where(
+    tags: Optional[Iterable[str]] = None,
+    jurisdiction: Optional[Union[str, List[str]]] = None,
+    min_court_level: Optional[int] = None,
+    date_from: Optional[Union[str, datetime.date]] = None,
+    date_to: Optional[Union[str, datetime.date]] = None,
+    legacy_tags: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a Chroma where clause over the fields written by normalize_metadata
+
+    Args:
+        tags: Match documents carrying any of these tags
+        jurisdiction: One jurisdiction or a list of them (aliases such as "Singapore" are normalized)
+        min_court_level: Only courts at or above this level
+        date_from: Earliest case date (inclusive)
+        date_to: Latest case date (inclusive)
+        legacy_tags: Also match the single "tags" value of documents ingested before normalization
+
+    Returns:
+        The where clause, or None when nothing is filtered
+    """
+    clauses = []
+    if tags:
+        tag_clauses = [{f"tag_{_slug(tag)}": True} for tag in tags]
+        if legacy_tags:
+            tag_clauses.append({"tags": {"$in": list(tags)}})
+        clauses.append(tag_clauses[0] if len(tag_clauses) == 1 else {"$or": tag_clauses})
+    if jurisdiction:
+        codes = [JURISDICTIONS.get(j.strip().lower(), j.strip().lower()) for j in ([jurisdiction] if isinstance(jurisdiction, str) else jurisdiction)]
+        clauses.append({"jurisdiction": codes[0]} if len(codes) == 1 else {"jurisdiction": {"$in": codes}})
+    if min_court_level is not None:
+        clauses.append({"court_level": {"$gte": min_court_level}})
+    for bound, operator in ((date_from, "$gte"), (date_to, "$lte")):
+        date = parse_date(bound)
+        if bound is not None and date is None:
+            raise ValueError(f"Invalid date filter '{bound}'")
+        if date is not None:
+            clauses.append({"case_date_ord": {operator: int(date.strftime("%Y%m%d"))}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def recency_factor(metadata: Optional[Dict[str, Any]], half_life_years: float, today: Optional[datetime.date] = None) -> float:
+    """
+    Multiplier halving a hit's score every half_life_years of case age (1.0 for undated documents)
+    """
+    ordinal = date_ordinal(metadata)
+    if not ordinal:
+        return 1.0
+    date = datetime.date(ordinal // 10000, max(1, ordinal // 100 % 100), max(1, ordinal % 100))
+    age_years = max(0.0, ((today or datetime.date.today()) - date).days / 365.25)
+    return 0.5 ** (age_years / half_life_years)
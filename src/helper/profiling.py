@@ -0,0 +1,285 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# Environment used to hand the active profile over to child processes (e.g. extract_hypo.py)
+PROFILE_MODE_ENV = "PROFILE_MODE"
+PROFILE_DIR_ENV = "PROFILE_DIR"
+
+_active: Optional[Tuple[str, str]] = None
+# Before 3.12 cProfile only hooks the thread that enables it: worker threads add their own profilers here.
+# From 3.12 it uses sys.monitoring, which covers every thread and allows only one active profiler.
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+_thread_profiles: Optional[List[cProfile.Profile]] = None
+_thread_profiles_lock = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock sampler.
+
+    A background thread snapshots the stacks of every other thread with
+    sys._current_frames() at a fixed interval and counts identical stacks,
+    which is exactly the collapsed-stack format flamegraph tools consume.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 40) -> str:
+        """
+        Text report of the functions most often on top of the stack (self time) and anywhere on it (total)
+        """
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f}ms ({total} thread stacks)\n",
+                 f"{'self %':>8}{'total %':>9}  function"]
+        for frame, count in self_counts.most_common(limit):
+            lines.append(f"{100 * count / total:>8.1f}{100 * total_counts[frame] / total:>9.1f}  {frame}")
+        return "\n".join(lines) + "\n"
+
+
+def pstats_to_collapsed(stats: pstats.Stats, max_depth: int = 200, min_fraction: float = 1e-4) -> str:
+    """
+    Approximate collapsed stacks from a cProfile call graph
+
+    cProfile only records caller/callee pairs, so a function's time is split
+    between its callers in proportion to each caller's share of its cumulative
+    time. Values are microseconds of self time. A path is only expanded while
+    its share of cumulative time is at least min_fraction of the profile, which
+    keeps the walk bounded instead of enumerating every path of the graph; self
+    time no kept path reaches is reported on the function alone, so the total
+    matches the profile.
+
+    Args:
+        stats: Loaded profile statistics
+        max_depth: Stop descending beyond this many frames (guards deep recursion)
+        min_fraction: Smallest share of the total time that is expanded into callees
+
+    Returns:
+        Collapsed-stack text ("frame;frame;frame value" per line)
+    """
+    raw: Dict = stats.stats
+    callees: Dict = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            if caller in raw and caller != func:
+                callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func) -> str:
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    # Entry points: functions without a profiled caller, then, for call graphs made only of
+    # cycles (or parts not reachable from those), the unreached function with the most time
+    roots = [func for func, (_, _, _, _, callers) in raw.items() if not any(c in raw and c != func for c in callers)]
+    reached: set = set()
+
+    def reach(func) -> None:
+        pending = [func]
+        while pending:
+            current = pending.pop()
+            if current not in reached:
+                reached.add(current)
+                pending.extend(callee for callee, _ in callees.get(current, []))
+
+    for root in roots:
+        reach(root)
+    for func in sorted(raw, key=lambda f: raw[f][3], reverse=True):
+        if func not in reached and raw[func][2] > 0:
+            roots.append(func)
+            reach(func)
+
+    total_time = sum(tt for _, _, tt, _, _ in raw.values())
+    min_time = total_time * min_fraction
+    out: Counter = Counter()
+    attributed: Counter = Counter()
+
+    def walk(func, path, on_path, scale):
+        _, _, tt, ct, _ = raw[func]
+        path = path + [label(func)]
+        value = int(tt * scale * 1e6)
+        if value > 0:
+            out[";".join(path)] += value
+            attributed[func] += value
+        if len(path) >= max_depth or ct * scale < min_time:
+            return
+        for callee, edge_ct in callees.get(func, []):
+            callee_ct = raw[callee][3]
+            if callee in on_path or callee_ct <= 0 or edge_ct <= 0:
+                continue
+            walk(callee, path, on_path | {callee}, scale * edge_ct / callee_ct)
+
+    for root in roots:
+        walk(root, [], {root}, 1.0)
+    # Self time not reached through a kept path (pruned paths, recursion such as nested
+    # imports) is reported on the function alone, so the profile total is preserved
+    for func, (_, _, tt, _, _) in raw.items():
+        residual = int(tt * 1e6) - attributed[func]
+        if residual > 0:
+            out[label(func)] += residual
+    return "".join(f"{stack} {value}\n" for stack, value in out.most_common())
+
+
+def profile_thread(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap a function that runs on a worker thread so an active cProfile run covers it too
+
+    Before Python 3.12 the wrapped call gets its own profiler, which profile_run merges
+    into the run's profile when it ends. From 3.12 the run's profiler already sees every
+    thread, and without an active cProfile run the function is called as is.
+    """
+    def wrapper(*args, **kwargs):
+        collected = _thread_profiles
+        if collected is None:
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with _thread_profiles_lock:
+                collected.append(profiler)
+    return wrapper
+
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+@contextmanager
+def profile_run(mode: Optional[str], out_dir: str, name: str = "profile", interval: float = 0.005) -> Iterator[None]:
+    """
+    Profile a block of work and write the results into a run's results directory
+
+    Args:
+        mode: "cprofile" (deterministic; all threads on Python 3.12+, before that the calling thread plus
+            work wrapped in profile_thread, such as scheduler tasks), "sample" (low overhead, all threads)
+            or None to disable
+        out_dir: Directory the profile files are written to
+        name: File name prefix, e.g. "profile" or "extract_hypo"
+        interval: Sampling interval in seconds (sample mode only)
+
+    Writes:
+        <name>.prof (cprofile, loadable with pstats/snakeviz), <name>.txt (top functions)
+        and <name>.collapsed (collapsed stacks for flamegraph.pl / speedscope)
+    """
+    global _active, _thread_profiles
+    if not mode:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}'. Available: {PROFILE_MODES}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    previous, previous_threads = _active, _thread_profiles
+    _active = (mode, out_dir)
+    if mode == "cprofile" and PER_THREAD_PROFILERS:
+        _thread_profiles = []
+    started = time.perf_counter()
+    profiler = cProfile.Profile() if mode == "cprofile" else SamplingProfiler(interval)
+    if mode == "cprofile":
+        profiler.enable()
+    else:
+        profiler.start()
+    try:
+        yield
+    finally:
+        base = os.path.join(out_dir, name)
+        if mode == "cprofile":
+            profiler.disable()
+            report = io.StringIO()
+            stats = pstats.Stats(profiler, stream=report)
+            with _thread_profiles_lock:
+                for thread_profiler in _thread_profiles or []:
+                    stats.add(thread_profiler)
+            stats.dump_stats(base + ".prof")
+            stats.sort_stats("cumulative").print_stats(40)
+            stats.sort_stats("tottime").print_stats(40)
+            _write(base + ".txt", report.getvalue())
+            _write(base + ".collapsed", pstats_to_collapsed(stats))
+        else:
+            profiler.stop()
+            _write(base + ".txt", profiler.top())
+            _write(base + ".collapsed", profiler.collapsed())
+        _active, _thread_profiles = previous, previous_threads
+        print(f"\nProfile ({mode}, {time.perf_counter() - started:.1f}s) written to {base}.*")
+
+
+def child_env(env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Return an environment for a child process that continues the active profile (if any)
+    """
+    env = dict(os.environ if env is None else env)
+    if _active is not None:
+        env[PROFILE_MODE_ENV], env[PROFILE_DIR_ENV] = _active
+    return env
+
+
+@contextmanager
+def profile_from_env(name: str) -> Iterator[None]:
+    """
+    Profile a child process when its parent passed a profile through child_env()
+    """
+    with profile_run(os.getenv(PROFILE_MODE_ENV), os.getenv(PROFILE_DIR_ENV, "."), name=name):
+        yield
@@ -0,0 +1,35 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class PromptLayout:
+    """
+    A prompt split by how often its parts change, ordered for provider prefix caching.
+
+    Providers only reuse a cached prompt when its prefix is byte-identical, so
+    the parts shared by every phase of a run come first and anything that
+    changes between calls comes last:
+
+        system    role description, identical for every call of an agent
+        stable    retrieved context, then the question or hypothetical
+        volatile  phase instructions, notes, history, step and feedback
+    """
+    system: str
+    stable: List[str] = field(default_factory=list)
+    volatile: List[str] = field(default_factory=list)
+
+    @property
+    def prefix(self) -> str:
+        """The cacheable part of the user prompt"""
+        return "".join(self.stable)
+
+    @property
+    def user(self) -> str:
+        """The full user prompt"""
+        return self.prefix + "".join(self.volatile)
+
+    @property
+    def cache_split(self) -> Optional[int]:
+        """Character offset in the user prompt where the cacheable prefix ends (None if there is none)"""
+        return len(self.prefix) or None
@@ -0,0 +1,272 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import anthropic
+import requests
+from openai import OpenAI
+
+PER_MILLION = 1 / 1000000
+
+
+@dataclass
+class ModelSpec:
+    """A model served by a backend"""
+    api_name: str                      # Model id sent to the provider
+    aliases: Tuple[str, ...] = ()      # Other names accepted on the command line
+    price_in: float = 0.0              # USD per input token
+    price_out: float = 0.0             # USD per output token
+    system_role: bool = True           # False for models that reject a system message (o1 family)
+    supports_temperature: bool = True
+
+
+@dataclass
+class Backend:
+    """A provider: how to build its client, call it, and what it serves"""
+    name: str
+    client_factory: Callable[[Optional[str]], Any]
+    complete: Callable[..., Tuple[str, Any]]
+    models: Dict[str, ModelSpec] = field(default_factory=dict)
+    supports_streaming: bool = False
+    supports_batch: bool = False
+    batch_discount: float = 0.5        # Price multiplier for Batch API calls
+    cache_read_multiplier: float = 1.0     # Price multiplier for input tokens served from the prompt cache
+    cache_write_multiplier: float = 1.0    # Price multiplier for input tokens written to the prompt cache
+    # Local servers accept arbitrary model names written as "<prefix><model>"
+    prefix: Optional[str] = None
+    requires_api_key: bool = True
+    _clients: Dict[Optional[str], Any] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def get_client(self, api_key: Optional[str] = None) -> Any:
+        """Return a client for this backend, reusing one per API key so connections are pooled"""
+        with self._lock:
+            if api_key not in self._clients:
+                self._clients[api_key] = self.client_factory(api_key)
+            return self._clients[api_key]
+
+
+_BACKENDS: Dict[str, Backend] = {}
+
+
+def register_backend(backend: Backend) -> Backend:
+    """Add (or replace) a backend in the registry"""
+    _BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name: str) -> Backend:
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    return _BACKENDS[name]
+
+
+def list_models() -> Dict[str, list]:
+    """Return the canonical model names served by each backend"""
+    return {
+        name: list(backend.models) or [f"{backend.prefix}<model>"]
+        for name, backend in _BACKENDS.items()
+    }
+
+
+def resolve_model(model_str: str) -> Tuple[Backend, str, ModelSpec]:
+    """
+    Resolve a model string (canonical name, alias or "<prefix><model>") to its backend
+
+    Args:
+        model_str: Model name as given by the user or config
+
+    Returns:
+        Tuple of (backend, canonical model name, model spec)
+    """
+    for backend in _BACKENDS.values():
+        for name, spec in backend.models.items():
+            if model_str == name or model_str in spec.aliases:
+                return backend, name, spec
+    for backend in _BACKENDS.values():
+        if backend.prefix and model_str.startswith(backend.prefix):
+            return backend, model_str, ModelSpec(api_name=model_str[len(backend.prefix):])
+    raise Exception(f"Unknown provider for model: {model_str}")
+
+
+BATCH_SUFFIX = ":batch"
+
+
+def model_price(model_str: str) -> Tuple[float, float]:
+    """
+    Return (input, output) USD prices per token, zero for unknown models
+
+    Models recorded as "<model>:batch" are priced with the backend's batch discount.
+    """
+    multiplier = 1.0
+    if model_str.endswith(BATCH_SUFFIX):
+        model_str = model_str[:-len(BATCH_SUFFIX)]
+        multiplier = None
+    try:
+        backend, _, spec = resolve_model(model_str)
+    except Exception:
+        return 0.0, 0.0
+    if multiplier is None:
+        multiplier = backend.batch_discount
+    return spec.price_in * multiplier, spec.price_out * multiplier
+
+
+def model_cache_multipliers(model_str: str) -> Tuple[float, float]:
+    """Return the (cache read, cache write) input price multipliers for a model"""
+    if model_str.endswith(BATCH_SUFFIX):
+        model_str = model_str[:-len(BATCH_SUFFIX)]
+    try:
+        backend, _, _ = resolve_model(model_str)
+    except Exception:
+        return 1.0, 1.0
+    return backend.cache_read_multiplier, backend.cache_write_multiplier
+
+
+# ----- CALL IMPLEMENTATIONS -----
+
+def _chat_messages(spec: ModelSpec, system_prompt: str, prompt: str) -> list:
+    if spec.system_role:
+        return [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+    return [{"role": "user", "content": system_prompt + prompt}]
+
+
+def openai_chat_complete(client, spec: ModelSpec, system_prompt: str, prompt: str, temp: Optional[float] = None,
+                         cache_split: Optional[int] = None):
+    """
+    Call an OpenAI-compatible chat completions endpoint
+
+    OpenAI and DeepSeek cache identical prompt prefixes automatically, so cache_split needs no markup here.
+    """
+    params = {"model": spec.api_name, "messages": _chat_messages(spec, system_prompt, prompt)}
+    if temp is not None and spec.supports_temperature:
+        params["temperature"] = temp
+    completion = client.chat.completions.create(**params)
+    return completion.choices[0].message.content, completion
+
+
+EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+
+def anthropic_params(spec: ModelSpec, system_prompt: str, prompt: str, temp: Optional[float] = None,
+                     cache_split: Optional[int] = None, max_tokens: int = 4096) -> dict:
+    """
+    Build Anthropic messages parameters with prompt-cache breakpoints
+
+    The system prompt is always a breakpoint; when cache_split is given the user
+    prompt is split into a cached prefix (prompt[:cache_split]) and a volatile tail.
+    """
+    user_content = [{"type": "text", "text": prompt}]
+    if cache_split and 0 < cache_split < len(prompt):
+        user_content = [
+            {"type": "text", "text": prompt[:cache_split], "cache_control": EPHEMERAL_CACHE},
+            {"type": "text", "text": prompt[cache_split:]},
+        ]
+    params = {
+        "model": spec.api_name,
+        "system": [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE}],
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": user_content}],
+    }
+    if temp is not None:
+        params["temperature"] = temp
+    return params
+
+
+def anthropic_complete(client, spec: ModelSpec, system_prompt: str, prompt: str, temp: Optional[float] = None,
+                       cache_split: Optional[int] = None):
+    """Call the Anthropic messages endpoint"""
+    message = client.messages.create(**anthropic_params(spec, system_prompt, prompt, temp, cache_split))
+    return message.content[0].text, message
+
+
+def local_hosting_complete(client, spec: ModelSpec, system_prompt: str, prompt: str, temp: Optional[float] = None,
+                           cache_split: Optional[int] = None):
+    """Call the eval-project local-deploy FastAPI /generate endpoint"""
+    base_url = os.getenv("LOCAL_HOSTING_URL", "http://localhost:8000")
+    response = client.post(
+        f"{base_url}/generate",
+        json={"prompt": f"{system_prompt}\n{prompt}", "max_length": int(os.getenv("LOCAL_HOSTING_MAX_LENGTH", "2048"))},
+        timeout=float(os.getenv("LOCAL_HOSTING_TIMEOUT", "600")),
+    )
+    response.raise_for_status()
+    return response.json()["generated_text"], None
+
+
+# ----- BUILT-IN BACKENDS -----
+
+register_backend(Backend(
+    name="openai",
+    # base_url follows OPENAI_BASE_URL when set; retries are handled by helper.retry
+    client_factory=lambda api_key: OpenAI(api_key=api_key, max_retries=0),
+    complete=openai_chat_complete,
+    supports_streaming=True,
+    supports_batch=True,
+    cache_read_multiplier=0.5,
+    models={
+        "gpt-4o": ModelSpec("gpt-4o-2024-08-06", ("gpt4o",), 2.50 * PER_MILLION, 10.00 * PER_MILLION),
+        "gpt-4o-mini": ModelSpec("gpt-4o-mini-2024-07-18", ("gpt4omini", "gpt-4omini", "gpt4o-mini"),
+                                 0.150 * PER_MILLION, 0.6 * PER_MILLION),
+        "o1": ModelSpec("o1-2024-12-17", (), 15.00 * PER_MILLION, 60.00 * PER_MILLION,
+                        system_role=False, supports_temperature=False),
+        "o1-mini": ModelSpec("o1-mini-2024-09-12", (), 3.00 * PER_MILLION, 12.00 * PER_MILLION,
+                             system_role=False, supports_temperature=False),
+        "o1-preview": ModelSpec("o1-preview", (), 15.00 * PER_MILLION, 60.00 * PER_MILLION,
+                                system_role=False, supports_temperature=False),
+    },
+))
+
+register_backend(Backend(
+    name="anthropic",
+    # base_url follows ANTHROPIC_BASE_URL when set
+    client_factory=lambda api_key: anthropic.Anthropic(api_key=api_key, max_retries=0),
+    complete=anthropic_complete,
+    supports_streaming=True,
+    supports_batch=True,
+    cache_read_multiplier=0.1,
+    cache_write_multiplier=1.25,
+    models={
+        "claude-3-5-sonnet": ModelSpec("claude-3-5-sonnet-latest", ("claude-3.5-sonnet",),
+                                       3.00 * PER_MILLION, 15.00 * PER_MILLION),
+    },
+))
+
+register_backend(Backend(
+    name="deepseek",
+    client_factory=lambda api_key: OpenAI(
+        api_key=api_key or os.getenv("DEEPSEEK_API_KEY"),
+        base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1"),
+        max_retries=0,
+    ),
+    complete=openai_chat_complete,
+    supports_streaming=True,
+    cache_read_multiplier=0.1,
+    models={
+        "deepseek-chat": ModelSpec("deepseek-chat", (), 1.00 * PER_MILLION, 5.00 * PER_MILLION),
+        "deepseek-reasoner": ModelSpec("deepseek-reasoner", (), 0.55 * PER_MILLION, 2.19 * PER_MILLION,
+                                       supports_temperature=False),
+    },
+))
+
+register_backend(Backend(
+    name="lm_studio",
+    # LM Studio (and any other OpenAI-compatible local server), e.g. --model lm-studio/Meta-Llama-3-8B-Instruct-GGUF
+    client_factory=lambda api_key: OpenAI(
+        api_key=api_key or "lm-studio",
+        base_url=os.getenv("LM_STUDIO_BASE_URL", "http://localhost:1234/v1"),
+        max_retries=0,
+    ),
+    complete=openai_chat_complete,
+    supports_streaming=True,
+    prefix="lm-studio/",
+    requires_api_key=False,
+))
+
+register_backend(Backend(
+    name="local_hosting",
+    # eval-project/local-deploy/local_hosting.py, e.g. --model local/Mistral-Nemo-Instruct-2407
+    client_factory=lambda api_key: requests.Session(),
+    complete=local_hosting_complete,
+    prefix="local/",
+    requires_api_key=False,
+))
@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CONFIG_PATH = "settings/ratelimits.json"
+
+
+class MemoryBucketStore:
+    """Bucket state shared by every thread of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict[str, Tuple[float, float]] = {}
+
+    def reserve(self, key: str, capacity: float, amount: float, now: float) -> float:
+        """
+        Take `amount` from a bucket refilling at capacity per minute, going negative if needed
+
+        Returns:
+            Seconds the caller must wait before its reservation is covered
+        """
+        with self._lock:
+            level, updated = self._state.get(key, (capacity, now))
+            level, wait = _take(level, updated, capacity, amount, now)
+            self._state[key] = (level, now)
+            return wait
+
+    def adjust(self, key: str, capacity: float, amount: float, now: float) -> None:
+        """Return (positive) or take (negative) tokens without waiting"""
+        with self._lock:
+            level, updated = self._state.get(key, (capacity, now))
+            level = _refill(level, updated, capacity, now) + amount
+            self._state[key] = (min(capacity, level), now)
+
+
+class SQLiteBucketStore:
+    """Bucket state in a local SQLite file, shared by every process on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, key: str, capacity: float, amount: float, now: float, wait_for_tokens: bool) -> float:
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front, serializing processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT level, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            level, updated = row if row else (capacity, now)
+            if wait_for_tokens:
+                level, wait = _take(level, updated, capacity, amount, now)
+            else:
+                level, wait = min(capacity, _refill(level, updated, capacity, now) + amount), 0.0
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, level, updated) VALUES (?, ?, ?)", (key, level, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def reserve(self, key: str, capacity: float, amount: float, now: float) -> float:
+        return self._update(key, capacity, amount, now, wait_for_tokens=True)
+
+    def adjust(self, key: str, capacity: float, amount: float, now: float) -> None:
+        self._update(key, capacity, amount, now, wait_for_tokens=False)
+
+
+def _refill(level: float, updated: float, capacity: float, now: float) -> float:
+    return min(capacity, level + max(0.0, now - updated) * capacity / 60.0)
+
+
+def _take(level: float, updated: float, capacity: float, amount: float, now: float) -> Tuple[float, float]:
+    level = _refill(level, updated, capacity, now) - min(amount, capacity)
+    wait = 0.0 if level >= 0 else -level * 60.0 / capacity
+    return level, wait
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter enforcing requests-per-minute and tokens-per-minute for one provider/model
+
+    Callers reserve capacity up front and sleep exactly until their reservation is
+    covered, so queued calls are released at the maximum rate the quota allows.
+    """
+
+    def __init__(self, key: str, rpm: Optional[float], tpm: Optional[float], store):
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self.store = store
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+        self.acquired = 0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request and `tokens` tokens are available
+
+        Args:
+            tokens: Estimated tokens (prompt + expected completion) for the call
+
+        Returns:
+            Seconds spent waiting
+        """
+        now = time.time()
+        wait = 0.0
+        if self.rpm:
+            wait = max(wait, self.store.reserve(f"{self.key}:rpm", self.rpm, 1, now))
+        if self.tpm and tokens:
+            wait = max(wait, self.store.reserve(f"{self.key}:tpm", self.tpm, tokens, now))
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            self.waited_seconds += wait
+            self.acquired += 1
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the token bucket once the provider has reported real usage"""
+        if self.tpm and actual_tokens != estimated_tokens:
+            self.store.adjust(f"{self.key}:tpm", self.tpm, estimated_tokens - actual_tokens, time.time())
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_config: Optional[dict] = None
+_store = None
+
+
+def load_rate_limit_config(config_path: Optional[str] = None) -> dict:
+    """
+    Load rate limit settings (RATELIMIT_CONFIG overrides the default path),
+    falling back to an in-memory store with no limits
+    """
+    config_path = config_path or os.getenv("RATELIMIT_CONFIG", DEFAULT_CONFIG_PATH)
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"backend": "memory", "default": {}, "models": {}}
+
+
+def _get_store(config: dict):
+    global _store
+    if _store is None:
+        if config.get("backend", "memory") == "sqlite":
+            _store = SQLiteBucketStore(config.get("path", os.path.join(".ratelimit", "limits.sqlite3")))
+        else:
+            _store = MemoryBucketStore()
+    return _store
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    Return the limiter shared by every caller of a provider/model in this process
+    (and across processes when the sqlite backend is configured)
+    """
+    global _config
+    key = f"{provider}:{model}"
+    with _limiters_lock:
+        if key not in _limiters:
+            if _config is None:
+                _config = load_rate_limit_config()
+            limits = {**_config.get("default", {}), **_config.get("models", {}).get(model, {})}
+            _limiters[key] = RateLimiter(key, limits.get("rpm"), limits.get("tpm"), _get_store(_config))
+        return _limiters[key]
+
+
+def expected_output_tokens() -> int:
+    """Completion size assumed when reserving tokens before a call"""
+    global _config
+    if _config is None:
+        _config = load_rate_limit_config()
+    return int(_config.get("expected_output_tokens", 1000))
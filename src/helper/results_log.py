@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from helper.markdown_translator import convert_to_md
+
+
+class ResultsLog:
+    """
+    Append-only JSON Lines log of a run's results.
+
+    Each record sets (or drops) one value at a key path of the results dict, e.g.
+    ["agent_outputs", "internal", "issues"], and is written the moment the value is
+    produced. Every record is flushed to the OS right away; fsync is batched to every
+    fsync_every records or fsync_interval seconds, whichever comes first, and forced
+    on close. Replaying the log in order rebuilds the results dict, so a run that dies
+    part way still leaves everything it finished on disk.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 8, fsync_interval: float = 1.0):
+        """
+        Args:
+            path: Log file, appended to if it exists
+            fsync_every: Records written between fsyncs
+            fsync_interval: Seconds after which a pending record is fsynced with the next write
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.records = 0
+
+    def set(self, path: Sequence[str], value: Any) -> None:
+        """
+        Record a value at a key path.
+
+        Args:
+            path: Keys from the top of the results dict
+            value: JSON-serializable value
+        """
+        self._write({"op": "set", "path": list(path), "value": value})
+
+    def drop(self, path: Sequence[str]) -> None:
+        """
+        Record the removal of a key path, e.g. intermediate outputs superseded by a merged view.
+
+        Args:
+            path: Keys from the top of the results dict
+        """
+        self._write({"op": "drop", "path": list(path)})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        record["t"] = time.time()
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+    def __enter__(self) -> "ResultsLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read a results log, skipping a torn last line left by a crash.
+
+    Args:
+        path: Log file
+
+    Returns:
+        Iterator over the records in write order
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
+                print(f"Warning: ignoring incomplete last record of {path}")
+
+
+def replay(path: str) -> Dict[str, Any]:
+    """
+    Rebuild the results dict from a results log.
+
+    Args:
+        path: Log file
+
+    Returns:
+        Results dict; keys appear in the order they were first recorded
+    """
+    results: Dict[str, Any] = {}
+    for record in iter_records(path):
+        *parents, last = record["path"]
+        node = results
+        for key in parents:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if record["op"] == "set":
+            node[last] = record["value"]
+        else:
+            node.pop(last, None)
+    return results
+
+
+def build_results(log_path: str, output_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write analysis_results.json and its Markdown report from a results log.
+
+    Args:
+        log_path: Log file
+        output_file: JSON file to write (default: the log path with a .json extension)
+
+    Returns:
+        The rebuilt results dict
+    """
+    if output_file is None:
+        output_file = os.path.splitext(log_path)[0] + ".json"
+    results = replay(log_path)
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_file, output_file)
+    convert_to_md(output_file, data=results)
+    return results
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Rebuild analysis_results.json and Markdown from a run's results log, e.g. after a crash")
+    parser.add_argument("log", type=str, help="results/analysis_<timestamp>/analysis_results.jsonl")
+    parser.add_argument("--output", type=str, help="JSON file to write (default: next to the log)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    results = build_results(args.log, args.output)
+    print(f"Rebuilt {len(results)} top-level sections from {args.log}")
@@ -0,0 +1,389 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from helper.blob_store import BlobStore
+from helper.leaderboard import SCORE_KEYS, iter_json_array, run_id
+
+# One row per analysis run (or per exam answer); long text lives in the side store under text_ref
+SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("kind", pa.string()),
+    ("source_path", pa.string()),
+    ("timestamp", pa.string()),
+    ("model", pa.string()),
+    ("hypothetical", pa.string()),
+    ("question", pa.string()),
+    ("epoch", pa.int32()),
+    *[(key, pa.float64()) for key in SCORE_KEYS],
+    ("average_score", pa.float64()),
+    ("final_score", pa.float64()),
+    ("factual_consistency_score", pa.float64()),
+    ("has_factual_inconsistencies", pa.bool_()),
+    ("calls", pa.int64()),
+    ("tokens_in", pa.int64()),
+    ("tokens_out", pa.int64()),
+    ("cached_in", pa.int64()),
+    ("cost_usd", pa.float64()),
+    ("wall_s", pa.float64()),
+    ("llm_s", pa.float64()),
+    ("llm_calls", pa.int64()),
+    ("retrieval_s", pa.float64()),
+    ("text_chars", pa.int64()),
+    ("text_ref", pa.string()),
+])
+
+# Parquet metadata key of a merged part listing the part files it replaces
+REPLACES_KEY = b"replaces"
+HYPOTHETICAL_PATTERN = re.compile(r"--- HYPOTHETICAL \d+: (.+?) ---")
+# Default ingest sources, relative to src/ where main.py and batch_eval.py write their results
+DEFAULT_SOURCES = [
+    "results/analysis_*/analysis_results.json",
+    "results/batch_*/*/analysis_results.json",
+    "../analysis_results.json",
+    "../results/*.json",
+]
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in ("", None) and not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        return None
+
+
+def analysis_row(entry: Dict, source_path: str, text_store: BlobStore) -> Dict:
+    """
+    Flatten one analysis result (main.py, batch_eval.py or the leaderboard file) into a store row.
+
+    Args:
+        entry: Analysis result
+        source_path: File the result was read from
+        text_store: Side store receiving the full result as JSON
+
+    Returns:
+        Row matching SCHEMA
+    """
+    synthesis = entry.get('final_synthesis') or {}
+    evaluation = synthesis.get('evaluation') or {}
+    scores = {key.strip('*'): value for key, value in (evaluation.get('scores') or {}).items()}
+    usage = (entry.get('usage') or {}).get('total') or {}
+    stages = {row["stage"]: row for row in (entry.get('timing') or {}).get('stages', [])}
+    hypothetical = entry.get('hypothetical') or ""
+    files = HYPOTHETICAL_PATTERN.findall(hypothetical)
+    text = json.dumps(entry, ensure_ascii=False, sort_keys=True)
+    return {
+        "run_id": run_id(entry),
+        "kind": "analysis",
+        "source_path": source_path,
+        "timestamp": entry.get('timestamp'),
+        "model": entry.get('model'),
+        "hypothetical": ",".join(files) if files else ("question" if entry.get('legal_question') else None),
+        "question": None,
+        "epoch": None,
+        **{key: _number(scores.get(key)) for key in SCORE_KEYS},
+        "average_score": _number(evaluation.get('average_score', entry.get('average_score'))),
+        "final_score": _number(entry.get('final_score')),
+        "factual_consistency_score": _number(synthesis.get('factual_consistency_score')),
+        "has_factual_inconsistencies": synthesis.get('has_factual_inconsistencies'),
+        "calls": usage.get('calls'),
+        "tokens_in": usage.get('tokens_in'),
+        "tokens_out": usage.get('tokens_out'),
+        "cached_in": usage.get('cached_in'),
+        "cost_usd": usage.get('cost_usd'),
+        "wall_s": (entry.get('timing') or {}).get('wall_s'),
+        "llm_s": stages.get("llm_call", {}).get("total_s"),
+        "llm_calls": stages.get("llm_call", {}).get("calls"),
+        "retrieval_s": stages.get("retrieval", {}).get("total_s"),
+        "text_chars": len(text),
+        "text_ref": text_store.put(text),
+    }
+
+
+def exam_rows(data: Dict, source_path: str, text_store: BlobStore) -> List[Dict]:
+    """
+    One row per answer of an eval-project exam file (results/<exam>_<model>.json).
+
+    Args:
+        data: Exam file with file, scenario, questions and answers per question and epoch
+        source_path: File the answers were read from
+        text_store: Side store receiving each answer
+
+    Returns:
+        Rows matching SCHEMA, without scores
+    """
+    exam = os.path.splitext(data.get('file') or "")[0]
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    model = stem[len(exam) + 1:] if exam and stem.startswith(exam + "_") else stem
+    rows = []
+    for question, answers in (data.get('answers') or {}).items():
+        for epoch, answer in enumerate(answers):
+            answer = answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+            ref = text_store.put(answer)
+            rows.append({
+                "run_id": hashlib.sha1(f"{os.path.basename(source_path)}|{question}|{epoch}|{ref}".encode('utf-8')).hexdigest()[:20],
+                "kind": "exam",
+                "source_path": source_path,
+                "model": model,
+                "hypothetical": data.get('file'),
+                "question": question,
+                "epoch": epoch,
+                "text_chars": len(answer),
+                "text_ref": ref,
+            })
+    return rows
+
+
+class ResultsStore:
+    """
+    Append-only columnar store of analysis runs.
+
+    Every ingest writes one Parquet part file under <root>/runs with the scores, token
+    counts, latencies and model of each new run; the full results go to the zstd BlobStore
+    under <root>/text. Parts are never rewritten except by compact(), which only runs
+    when asked (the compact command), so writers only add files. Queries read the parts
+    once, keep the table in memory and only read parts that appeared since.
+    """
+
+    def __init__(self, root: str = "results/store"):
+        self.root = root
+        self.runs_dir = os.path.join(root, "runs")
+        self.text = BlobStore(os.path.join(root, "text"))
+        self._lock = threading.Lock()
+        self._parts: List[str] = []
+        self._replaces: Dict[str, List[str]] = {}
+        self._table = SCHEMA.empty_table()
+        os.makedirs(self.runs_dir, exist_ok=True)
+
+    def _part_files(self) -> List[str]:
+        return sorted(entry for entry in os.listdir(self.runs_dir) if entry.endswith(".parquet"))
+
+    def _live_parts(self, parts: List[str]) -> List[str]:
+        """
+        Parts not superseded by a merged part in the same listing.
+
+        A merged part names the parts it replaces in its Parquet metadata, so a reader that
+        lists it together with its originals (compact() removes those after the rename)
+        does not count their runs twice.
+        """
+        for part in parts:
+            if part not in self._replaces:
+                metadata = pq.read_metadata(os.path.join(self.runs_dir, part)).metadata or {}
+                self._replaces[part] = json.loads(metadata.get(REPLACES_KEY, b"[]"))
+        self._replaces = {part: self._replaces[part] for part in parts}
+        replaced = {name for part in parts for name in self._replaces[part]}
+        return [part for part in parts if part not in replaced]
+
+    def table(self, columns: Optional[Sequence[str]] = None) -> pa.Table:
+        """
+        All stored runs.
+
+        Args:
+            columns: Columns to return (default all)
+
+        Returns:
+            pyarrow Table
+        """
+        with self._lock:
+            for attempt in range(3):
+                parts = self._part_files()
+                try:
+                    live = self._live_parts(parts)
+                    if not set(self._parts) <= set(live):
+                        # compact() replaced parts, read everything again
+                        self._parts, self._table = [], SCHEMA.empty_table()
+                    new_parts = [part for part in live if part not in set(self._parts)]
+                    tables = [pq.read_table(os.path.join(self.runs_dir, part), schema=SCHEMA) for part in new_parts]
+                except FileNotFoundError:
+                    # A compaction in another process removed a part between listing and reading
+                    if attempt == 2:
+                        raise
+                    continue
+                if tables:
+                    self._table = pa.concat_tables([self._table, *tables]).combine_chunks()
+                self._parts = live
+                break
+            table = self._table
+        return table.select(list(columns)) if columns else table
+
+    def run_ids(self) -> set:
+        return set(self.table(["run_id"]).column("run_id").to_pylist())
+
+    def ingest(self, rows: Iterable[Dict]) -> int:
+        """
+        Append rows for runs not stored yet as one new part.
+
+        Args:
+            rows: Rows matching SCHEMA (missing columns are null)
+
+        Returns:
+            Number of rows written
+        """
+        known = self.run_ids()
+        new_rows = []
+        for row in rows:
+            if row["run_id"] not in known:
+                known.add(row["run_id"])
+                new_rows.append(row)
+        if not new_rows:
+            return 0
+        table = pa.Table.from_pylist(new_rows, schema=SCHEMA)
+        name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = os.path.join(self.runs_dir, f".{name}.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(self.runs_dir, name))
+        return len(new_rows)
+
+    def ingest_result(self, entry: Dict, source_path: str) -> int:
+        """
+        Append one analysis result.
+
+        Args:
+            entry: Analysis result as saved by main.py or batch_eval.py
+            source_path: Path of its analysis_results.json
+
+        Returns:
+            1 if the run was new, else 0
+        """
+        return self.ingest([analysis_row(entry, source_path, self.text)])
+
+    def ingest_paths(self, paths: Iterable[str]) -> int:
+        """
+        Append every run found in result files: analysis_results.json of a run, the leaderboard
+        list of analysis results, or eval-project exam answer files.
+
+        Args:
+            paths: JSON files
+
+        Returns:
+            Number of rows written
+        """
+        known = self.run_ids()
+
+        def rows():
+            for path in paths:
+                with open(path, 'r', encoding='utf-8') as f:
+                    first = f.read(4096).lstrip()[:1]
+                if first == '[':
+                    for entry in iter_json_array(path):
+                        # Skip serializing texts of runs that are already stored
+                        if run_id(entry) not in known:
+                            yield analysis_row(entry, path, self.text)
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if 'answers' in data:
+                    yield from exam_rows(data, path, self.text)
+                elif 'final_synthesis' in data and run_id(data) not in known:
+                    yield analysis_row(data, path, self.text)
+
+        return self.ingest(rows())
+
+    def compact(self) -> int:
+        """
+        Merge the current parts into one.
+
+        Only the parts read into the merged table are removed, so parts that other processes
+        write meanwhile are kept. The merged part records the parts it replaces, so readers
+        that list it before the originals are removed skip them. A lock file keeps two
+        compactions from running at once.
+
+        Returns:
+            Number of parts merged
+
+        Raises:
+            RuntimeError: Another compaction holds the lock
+        """
+        lock_path = os.path.join(self.runs_dir, ".compact.lock")
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise RuntimeError(f"Another compaction is running on {self.runs_dir} "
+                               f"(remove {lock_path} if a compaction was interrupted)")
+        try:
+            parts = self._part_files()
+            if len(parts) <= 1:
+                return 0
+            # Originals left behind by an interrupted compaction are already in its merged part
+            with self._lock:
+                live = self._live_parts(parts)
+            table = pa.concat_tables([pq.read_table(os.path.join(self.runs_dir, part), schema=SCHEMA) for part in live])
+            table = table.replace_schema_metadata({REPLACES_KEY: json.dumps(parts).encode('utf-8')})
+            name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+            tmp_path = os.path.join(self.runs_dir, f".{name}.tmp")
+            pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, os.path.join(self.runs_dir, name))
+            for part in parts:
+                os.remove(os.path.join(self.runs_dir, part))
+            return len(parts)
+        finally:
+            os.close(lock)
+            os.remove(lock_path)
+
+    def average_scores(self, by: Sequence[str] = ("model", "hypothetical"), metric: str = "average_score",
+                       kind: Optional[str] = "analysis") -> List[Dict]:
+        """
+        Mean of a metric per group.
+
+        Args:
+            by: Columns to group by
+            metric: Numeric column to average
+            kind: Restrict to "analysis" or "exam" rows (None for all)
+
+        Returns:
+            One dict per group with the group columns, <metric>_mean and runs, sorted by mean descending
+        """
+        table = self.table([*by, metric, "kind"])
+        if kind is not None:
+            table = table.filter(pc.equal(table["kind"], kind))
+        grouped = table.group_by(list(by)).aggregate([(metric, "mean"), (metric, "count"), ("kind", "count")])
+        rows = [
+            {**{column: row[column] for column in by}, f"{metric}_mean": row[f"{metric}_mean"],
+             "scored": row[f"{metric}_count"], "runs": row["kind_count"]}
+            for row in grouped.to_pylist()
+        ]
+        return sorted(rows, key=lambda row: (row[f"{metric}_mean"] is None, -(row[f"{metric}_mean"] or 0)))
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Ingest analysis results into the columnar results store and query it")
+    parser.add_argument("command", choices=["ingest", "query", "compact"])
+    parser.add_argument("paths", nargs="*", help="Result files to ingest (default: every known results location)")
+    parser.add_argument("--root", type=str, default="results/store", help="Store directory")
+    parser.add_argument("--by", type=str, default="model,hypothetical", help="Comma-separated columns to group by")
+    parser.add_argument("--metric", type=str, default="average_score", help="Column to average")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    store = ResultsStore(args.root)
+    if args.command == "ingest":
+        paths = args.paths or sorted(path for pattern in DEFAULT_SOURCES for path in glob.glob(pattern))
+        print(f"Ingested {store.ingest_paths(paths)} new rows from {len(paths)} files into {args.root}")
+    elif args.command == "compact":
+        merged = store.compact()
+        print(f"Compacted {merged} parts of {args.root} ({store.table().num_rows} rows)")
+    else:
+        started = time.perf_counter()
+        rows = store.average_scores(by=args.by.split(","), metric=args.metric)
+        elapsed = time.perf_counter() - started
+        by = args.by.split(",")
+        for row in rows:
+            mean = row[f"{args.metric}_mean"]
+            print("  ".join(str(row[column]) for column in by) + f"  {mean if mean is None else round(mean, 3)}  ({row['runs']} runs)")
+        print(f"{len(rows)} groups in {elapsed * 1000:.1f}ms")
@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+# Exception class names used by the openai / anthropic SDKs (matched by name so
+# neither SDK has to be imported here)
+_RATE_LIMIT_ERRORS = {"RateLimitError"}
+_TRANSIENT_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError",
+    "OverloadedError", "ServiceUnavailableError", "ConnectionError",
+    "Timeout", "ReadTimeout", "ConnectTimeout",
+}
+_FATAL_ERRORS = {
+    "AuthenticationError", "PermissionDeniedError", "NotFoundError",
+    "BadRequestError", "UnprocessableEntityError", "ConflictError",
+}
+# Programming errors never get better by waiting
+_FATAL_TYPES = (NameError, KeyError, TypeError, ValueError, AttributeError, IndexError)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a run's total deadline leaves no time for another attempt"""
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    Classify an exception raised by a provider call
+
+    Args:
+        exc: Exception raised while querying a model
+
+    Returns:
+        One of RATE_LIMIT, TRANSIENT or FATAL
+    """
+    name = type(exc).__name__
+    status = _status_code(exc)
+    if status == 429 or name in _RATE_LIMIT_ERRORS:
+        return RATE_LIMIT
+    if status is not None:
+        if status in (408, 409, 425) or status >= 500:
+            return TRANSIENT
+        if 400 <= status < 500:
+            return FATAL
+    if name in _TRANSIENT_ERRORS or isinstance(exc, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+    if name in _FATAL_ERRORS or isinstance(exc, _FATAL_TYPES):
+        return FATAL
+    return TRANSIENT
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Return the server-requested delay in seconds from Retry-After headers, if any
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryMetrics:
+    """Thread-safe retry counters per run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: Dict[Optional[str], Dict[str, Any]] = defaultdict(
+            lambda: {
+                "attempts": 0,
+                "retries": {RATE_LIMIT: 0, TRANSIENT: 0},
+                "fatal_errors": 0,
+                "exhausted": 0,
+                "deadline_exceeded": 0,
+                "backoff_seconds": 0.0,
+            }
+        )
+
+    def record_attempt(self, run_id: Optional[str]) -> None:
+        with self._lock:
+            self._runs[run_id]["attempts"] += 1
+
+    def record_retry(self, run_id: Optional[str], category: str, delay: float) -> None:
+        with self._lock:
+            self._runs[run_id]["retries"][category] += 1
+            self._runs[run_id]["backoff_seconds"] += delay
+
+    def record_failure(self, run_id: Optional[str], reason: str) -> None:
+        with self._lock:
+            self._runs[run_id][reason] += 1
+
+    def snapshot(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Return a copy of the counters for one run"""
+        with self._lock:
+            metrics = self._runs[run_id]
+            return {**metrics, "retries": dict(metrics["retries"])}
+
+
+RETRY_METRICS = RetryMetrics()
+
+_deadlines: Dict[str, float] = {}
+_deadlines_lock = threading.Lock()
+
+
+def set_run_deadline(run_id: str, seconds: Optional[float]) -> None:
+    """Give a run a total time budget (None removes it)"""
+    with _deadlines_lock:
+        if seconds is None:
+            _deadlines.pop(run_id, None)
+        else:
+            _deadlines[run_id] = time.monotonic() + seconds
+
+
+def remaining_time(run_id: Optional[str]) -> Optional[float]:
+    """Seconds left before a run's deadline, or None if it has none"""
+    with _deadlines_lock:
+        deadline = _deadlines.get(run_id)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, honoring Retry-After
+
+    Attributes:
+        max_tries: Maximum attempts per call (including the first)
+        base_delay: Base backoff for transient errors in seconds
+        max_delay: Cap on any single backoff in seconds
+        rate_limit_base_delay: Base backoff for rate-limit errors without Retry-After
+        metrics: Metrics sink for retry counts and backoff time
+    """
+    max_tries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    rate_limit_base_delay: float = 5.0
+    metrics: RetryMetrics = RETRY_METRICS
+
+    def backoff(self, attempt: int, category: str, exc: Optional[BaseException] = None) -> float:
+        """
+        Compute the delay before the next attempt
+
+        Args:
+            attempt: Zero-based index of the attempt that just failed
+            category: Error category returned by classify_error
+            exc: The exception, used to read Retry-After headers
+
+        Returns:
+            Delay in seconds
+        """
+        requested = retry_after(exc) if exc is not None else None
+        if requested is not None:
+            # Small jitter keeps workers told the same Retry-After from waking together
+            return min(self.max_delay, requested) + random.uniform(0, min(1.0, self.base_delay))
+        base = self.rate_limit_base_delay if category == RATE_LIMIT else self.base_delay
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+    def handle_error(self, exc: BaseException, attempt: int, tries: Optional[int] = None,
+                     run_id: Optional[str] = None) -> None:
+        """
+        Decide what to do after a failed attempt: sleep and return to retry, or raise
+
+        Args:
+            exc: Exception raised by the attempt
+            attempt: Zero-based index of the attempt that failed
+            tries: Attempt budget for this call (defaults to max_tries)
+            run_id: Run whose deadline and metrics apply
+        """
+        tries = self.max_tries if tries is None else tries
+        category = classify_error(exc)
+        if category == FATAL:
+            self.metrics.record_failure(run_id, "fatal_errors")
+            raise exc
+        if attempt + 1 >= tries:
+            self.metrics.record_failure(run_id, "exhausted")
+            raise Exception(f"Max retries ({tries}) exceeded: {exc}") from exc
+        delay = self.backoff(attempt, category, exc)
+        remaining = remaining_time(run_id)
+        if remaining is not None and delay >= remaining:
+            self.metrics.record_failure(run_id, "deadline_exceeded")
+            raise DeadlineExceeded(f"Run deadline reached after {attempt + 1} attempt(s): {exc}") from exc
+        print(f"Inference Exception ({category}): {exc}. Retrying in {delay:.1f}s")
+        self.metrics.record_retry(run_id, category, delay)
+        time.sleep(delay)
+
+    def check_deadline(self, run_id: Optional[str]) -> None:
+        """Raise DeadlineExceeded if the run has no time left"""
+        remaining = remaining_time(run_id)
+        if remaining is not None and remaining <= 0:
+            self.metrics.record_failure(run_id, "deadline_exceeded")
+            raise DeadlineExceeded("Run deadline reached")
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
@@ -0,0 +1,191 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Set
+
+from helper.profiling import profile_thread
+from helper.tracing import span
+
+
+def linear_dependencies(nodes: Sequence[Hashable]) -> Dict[Hashable, List[Hashable]]:
+    """Dependencies that run nodes strictly one after another, in the given order"""
+    return {node: ([nodes[i - 1]] if i else []) for i, node in enumerate(nodes)}
+
+
+def topological_generations(nodes: Sequence[Hashable], dependencies: Dict[Hashable, Sequence[Hashable]]) -> List[List[Hashable]]:
+    """
+    Group nodes into generations that only depend on earlier generations
+
+    Args:
+        nodes: All nodes of the graph, in their preferred order
+        dependencies: Node -> nodes it depends on (missing nodes have no dependencies)
+
+    Returns:
+        List of generations; nodes within a generation keep the order of `nodes`
+
+    Raises:
+        ValueError: If a dependency is not a node or the graph has a cycle
+    """
+    known = set(nodes)
+    for node, deps in dependencies.items():
+        if node not in known:
+            raise ValueError(f"Dependencies declared for unknown node '{node}'")
+        for dep in deps:
+            if dep not in known:
+                raise ValueError(f"Node '{node}' depends on unknown node '{dep}'")
+
+    done: Set[Hashable] = set()
+    generations = []
+    remaining = list(nodes)
+    while remaining:
+        generation = [node for node in remaining if all(dep in done for dep in dependencies.get(node, ()))]
+        if not generation:
+            raise ValueError(f"Dependency cycle between {remaining}")
+        generations.append(generation)
+        done.update(generation)
+        remaining = [node for node in remaining if node not in done]
+    return generations
+
+
+def ancestors(node: Hashable, dependencies: Dict[Hashable, Sequence[Hashable]]) -> Set[Hashable]:
+    """All nodes `node` depends on, directly or transitively"""
+    found: Set[Hashable] = set()
+    stack = list(dependencies.get(node, ()))
+    while stack:
+        dep = stack.pop()
+        if dep not in found:
+            found.add(dep)
+            stack.extend(dependencies.get(dep, ()))
+    return found
+
+
+def _label(key: Hashable) -> str:
+    return "/".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+
+@dataclass
+class Task:
+    """
+    A unit of work in a DAG
+
+    fn is called with the results of every task this one depends on,
+    directly or transitively, keyed by task key.
+    """
+    fn: Callable[[Dict[Hashable, Any]], Any]
+    dependencies: Sequence[Hashable] = ()
+
+
+class DAGScheduler:
+    """
+    Runs a task graph on a bounded thread pool.
+
+    A task is submitted as soon as all of its dependencies have finished, so
+    independent branches overlap while dependent ones start without waiting for
+    unrelated work. Tasks inherit the caller's tracing context, so their spans
+    nest under the span that was open when run() was called, and are covered by
+    an active --profile cprofile run although they run on worker threads.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Args:
+            max_workers: Maximum number of tasks running at once
+        """
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+        self.max_workers = max_workers
+        self.report: Optional[Dict[str, Any]] = None
+
+    def run(self, tasks: Dict[Hashable, Task], on_result: Optional[Callable[[Hashable, Any], None]] = None) -> Dict[Hashable, Any]:
+        """
+        Execute every task once its dependencies are done
+
+        Args:
+            tasks: Task key -> Task; insertion order is the submission priority among ready tasks
+            on_result: Called with (key, result) as each task finishes, on the calling thread
+
+        Returns:
+            Task key -> result. The run's schedule report is stored in self.report.
+
+        Raises:
+            ValueError: If the graph has unknown dependencies or a cycle
+            Exception: The first task error, after running tasks have finished; dependents are skipped
+        """
+        keys = list(tasks)
+        dependencies = {key: list(task.dependencies) for key, task in tasks.items()}
+        topological_generations(keys, dependencies)
+        lineage = {key: ancestors(key, dependencies) for key in keys}
+
+        results: Dict[Hashable, Any] = {}
+        timings: Dict[Hashable, tuple] = {}
+        pending = list(keys)
+        running = {}
+        lock = threading.Lock()
+        error: Optional[BaseException] = None
+        started = time.perf_counter()
+
+        def execute(key):
+            task_start = time.perf_counter()
+            try:
+                return tasks[key].fn({dep: results[dep] for dep in lineage[key]})
+            finally:
+                with lock:
+                    timings[key] = (task_start - started, time.perf_counter() - started)
+
+        with span("phase_schedule", tasks=len(keys), max_workers=self.max_workers) as schedule_span, \
+                ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="phase") as pool:
+            while pending or running:
+                if error is None:
+                    ready = [key for key in pending if all(dep in results for dep in dependencies[key])]
+                    for key in ready[:self.max_workers - len(running)]:
+                        pending.remove(key)
+                        running[pool.submit(contextvars.copy_context().run, profile_thread(execute), key)] = key
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    try:
+                        results[key] = future.result()
+                        if on_result is not None:
+                            on_result(key, results[key])
+                    except BaseException as e:
+                        error = error or e
+            self.report = self._build_report(dependencies, timings, time.perf_counter() - started)
+            schedule_span.set(critical_path_s=self.report["critical_path_s"], parallelism=self.report["parallelism"])
+
+        if error is not None:
+            raise error
+        return results
+
+    def _build_report(self, dependencies: Dict[Hashable, List[Hashable]], timings: Dict[Hashable, tuple], wall_s: float) -> Dict[str, Any]:
+        """
+        Summarize a finished schedule
+
+        The critical path is walked back from the task that finished last,
+        each time following the dependency that finished last (the one that
+        actually gated the start). Gaps between a dependency finishing and its
+        dependent starting are worker queueing.
+        """
+        busy_s = sum(end - start for start, end in timings.values())
+        path = []
+        key = max(timings, key=lambda k: timings[k][1], default=None)
+        while key is not None:
+            start, end = timings[key]
+            path.append({"task": _label(key), "start_s": round(start, 4), "duration_s": round(end - start, 4)})
+            finished_deps = [dep for dep in dependencies[key] if dep in timings]
+            key = max(finished_deps, key=lambda k: timings[k][1], default=None)
+        path.reverse()
+        critical_s = sum(step["duration_s"] for step in path)
+        return {
+            "tasks": len(timings),
+            "max_workers": self.max_workers,
+            "wall_s": wall_s,
+            "busy_s": busy_s,
+            "parallelism": busy_s / wall_s if wall_s else 0.0,
+            "critical_path": path,
+            "critical_path_s": critical_s,
+            "critical_path_pct": 100 * critical_s / wall_s if wall_s else 0.0,
+        }
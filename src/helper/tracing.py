@@ -0,0 +1,223 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Innermost open span of the current thread / task; new spans become its children
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed unit of work inside a run"""
+
+    def __init__(self, name: str, run_id: Optional[str], parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.run_id = run_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_s: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def elapsed(self) -> float:
+        """Seconds since the span started (its duration once finished)"""
+        return self.duration_s if self.duration_s is not None else time.perf_counter() - self._start_perf
+
+    def set(self, **attributes: Any) -> None:
+        """Add or update attributes while the span is open"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "run_id": self.run_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_s": self.duration_s,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _OTelBridge:
+    """Mirrors spans to OpenTelemetry when OTEL_EXPORTER_OTLP_ENDPOINT is set and the SDK is installed"""
+
+    def __init__(self, enabled: bool = True):
+        self._tracer = None
+        endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+        if not enabled or not endpoint:
+            return
+        try:
+            from opentelemetry import trace
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            print("Warning: OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk is not installed, skipping export")
+            return
+        provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "legal-analysis")}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+        trace.set_tracer_provider(provider)
+        self._tracer = trace.get_tracer("helper.tracing")
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Any]:
+        if self._tracer is None:
+            yield None
+            return
+        with self._tracer.start_as_current_span(name) as otel_span:
+            yield otel_span
+
+    @staticmethod
+    def finish(otel_span: Any, span: Span) -> None:
+        if otel_span is None:
+            return
+        otel_span.set_attribute("run_id", span.run_id or "")
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(key, value)
+        if span.error:
+            from opentelemetry.trace import Status, StatusCode
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+
+
+class Tracer:
+    """
+    Thread-safe span recorder keyed by run id.
+
+    Finished spans are kept in memory for the timing summary and, once a run
+    has been started with an output path, appended to that run's JSONL file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+        self._paths: Dict[str, str] = {}
+        self._otel: Optional[_OTelBridge] = None
+
+    def start_run(self, run_id: str, path: Optional[str] = None) -> None:
+        """
+        Begin recording a run
+
+        Args:
+            run_id: Run identifier (the workflow timestamp)
+            path: JSONL file the run's spans are appended to (None keeps them in memory only)
+        """
+        with self._lock:
+            self._spans.pop(run_id, None)
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._paths[run_id] = path
+            if self._otel is None:
+                self._otel = _OTelBridge()
+
+    def end_run(self, run_id: str) -> None:
+        """Stop writing a run's spans to disk (the in-memory copy is kept for summaries)"""
+        with self._lock:
+            self._paths.pop(run_id, None)
+
+    def reset(self, run_id: Optional[str] = None) -> None:
+        """Drop recorded spans, for every run or only one"""
+        with self._lock:
+            if run_id is None:
+                self._spans.clear()
+            else:
+                self._spans.pop(run_id, None)
+
+    @contextmanager
+    def span(self, name: str, run_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Time a block of work
+
+        Args:
+            name: Stage name, e.g. "retrieval" or "llm_call"
+            run_id: Run the span belongs to (inherited from the enclosing span when omitted)
+            **attributes: JSON-serializable details such as agent, phase or collection
+
+        Yields:
+            The open Span, so callers can attach results (token counts, document counts) with span.set()
+        """
+        parent = _current_span.get()
+        if run_id is None and parent is not None:
+            run_id = parent.run_id
+        span = Span(name, run_id, parent, attributes)
+        token = _current_span.set(span)
+        otel = self._otel or _NO_OTEL
+        with otel.span(name) as otel_span:
+            try:
+                yield span
+            except BaseException as e:
+                span.status = "error"
+                span.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                span.duration_s = time.perf_counter() - span._start_perf
+                _current_span.reset(token)
+                otel.finish(otel_span, span)
+                self._record(span)
+
+    def _record(self, span: Span) -> None:
+        record = span.to_dict()
+        with self._lock:
+            self._spans[span.run_id].append(record)
+            path = self._paths.get(span.run_id)
+            if path:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+
+    def spans(self, run_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Return a copy of the finished spans of a run"""
+        with self._lock:
+            return list(self._spans.get(run_id, []))
+
+    def summary(self, run_id: Optional[str], wall_s: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Summarize where a run's wall-clock time went
+
+        Args:
+            run_id: Run to summarize
+            wall_s: Run wall time, for summaries taken while the root span is still open
+                (defaults to the total of the finished root spans)
+
+        Returns:
+            Dictionary with the run's wall time and one row per span name (calls,
+            total/mean/max seconds and share of the run), sorted by total time.
+            Nested spans are inclusive, so shares of parent and child stages overlap.
+        """
+        spans = self.spans(run_id)
+        roots = [s for s in spans if s["parent_id"] is None]
+        wall = wall_s if wall_s is not None else sum(s["duration_s"] for s in roots)
+        stages: Dict[str, Dict[str, Any]] = {}
+        for s in spans:
+            row = stages.setdefault(s["name"], {"stage": s["name"], "calls": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0})
+            row["calls"] += 1
+            row["errors"] += int(s["status"] != "ok")
+            row["total_s"] += s["duration_s"]
+            row["max_s"] = max(row["max_s"], s["duration_s"])
+        for row in stages.values():
+            row["mean_s"] = row["total_s"] / row["calls"]
+            row["pct_of_run"] = 100 * row["total_s"] / wall if wall else 0.0
+        return {
+            "run_id": run_id,
+            "wall_s": wall,
+            "stages": sorted(stages.values(), key=lambda r: -r["total_s"]),
+        }
+
+
+_NO_OTEL = _OTelBridge(enabled=False)
+
+TRACER = Tracer()
+span = TRACER.span
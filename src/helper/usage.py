@@ -0,0 +1,190 @@
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model_str: str):
+    """
+    Return a cached tiktoken encoder for a model, falling back to cl100k_base
+    """
+    try:
+        return tiktoken.encoding_for_model(model_str)
+    except Exception:
+        pass
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoder files could not be loaded (e.g. offline), use a char heuristic
+        return None
+
+
+def estimate_tokens(text: str, model_str: str = "gpt-4o") -> int:
+    """
+    Estimate the number of tokens in a text using a cached encoder
+
+    Args:
+        text: Text to count
+        model_str: Model whose tokenizer should be used
+
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model_str)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _usage_field(usage: Any, name: str) -> Optional[int]:
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return int(value) if value is not None else None
+
+
+def usage_from_response(response: Any) -> Optional[Tuple[int, int]]:
+    """
+    Extract provider-reported (input, output) token counts from a response
+
+    Input counts include prompt-cache reads and writes for every provider
+    (Anthropic reports those separately from input_tokens).
+
+    Args:
+        response: OpenAI ChatCompletion or Anthropic Message object, or its JSON body
+
+    Returns:
+        Tuple of (tokens_in, tokens_out), or None if the response carries no usage
+    """
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return None
+    # OpenAI-compatible (OpenAI, DeepSeek, local servers)
+    prompt_tokens = _usage_field(usage, "prompt_tokens")
+    completion_tokens = _usage_field(usage, "completion_tokens")
+    if prompt_tokens is not None:
+        return prompt_tokens, completion_tokens or 0
+    # Anthropic
+    input_tokens = _usage_field(usage, "input_tokens")
+    output_tokens = _usage_field(usage, "output_tokens")
+    if input_tokens is not None:
+        cache_read, cache_write = cache_usage_from_response(response)
+        return input_tokens + cache_read + cache_write, output_tokens or 0
+    return None
+
+
+def cache_usage_from_response(response: Any) -> Tuple[int, int]:
+    """
+    Extract prompt-cache (read, write) token counts from a response
+
+    Args:
+        response: OpenAI ChatCompletion or Anthropic Message object, or its JSON body
+
+    Returns:
+        Tuple of (cached input tokens read, input tokens written to the cache); zeros when not reported
+    """
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    # Anthropic
+    cache_read = _usage_field(usage, "cache_read_input_tokens")
+    cache_write = _usage_field(usage, "cache_creation_input_tokens")
+    if cache_read is not None or cache_write is not None:
+        return cache_read or 0, cache_write or 0
+    # OpenAI (usage.prompt_tokens_details.cached_tokens); DeepSeek reports prompt_cache_hit_tokens
+    details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+    if details is not None:
+        cached = _usage_field(details, "cached_tokens")
+        if cached is not None:
+            return cached, 0
+    return _usage_field(usage, "prompt_cache_hit_tokens") or 0, 0
+
+
+class UsageLedger:
+    """Thread-safe ledger of token usage and cost per run, agent, phase and model"""
+
+    def __init__(self, cost_fn: Callable[..., float]):
+        """
+        Args:
+            cost_fn: Function mapping (model, tokens_in, tokens_out, cached_in, cache_write) to a USD cost
+        """
+        self._cost_fn = cost_fn
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "estimated_calls": 0, "tokens_in": 0, "tokens_out": 0, "cached_in": 0, "cache_write": 0}
+        )
+
+    def record(
+        self,
+        model: str,
+        tokens_in: int,
+        tokens_out: int,
+        run_id: Optional[str] = None,
+        agent: Optional[str] = None,
+        phase: Optional[str] = None,
+        estimated: bool = False,
+        cached_in: int = 0,
+        cache_write: int = 0
+    ) -> None:
+        """Record the usage of a single model call (tokens_in includes cached_in and cache_write)"""
+        with self._lock:
+            entry = self._entries[(run_id, agent, phase, model)]
+            entry["calls"] += 1
+            entry["estimated_calls"] += int(estimated)
+            entry["tokens_in"] += tokens_in
+            entry["tokens_out"] += tokens_out
+            entry["cached_in"] += cached_in
+            entry["cache_write"] += cache_write
+
+    def reset(self, run_id: Optional[str] = None) -> None:
+        """Drop all entries, or only those belonging to one run"""
+        with self._lock:
+            if run_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == run_id]:
+                    del self._entries[key]
+
+    def total_cost(self, run_id: Optional[str] = None) -> float:
+        """Return the estimated USD cost of a run, or of everything recorded"""
+        return self.totals(run_id)["total"]["cost_usd"]
+
+    def totals(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Aggregate recorded usage
+
+        Args:
+            run_id: Restrict to a single run (None aggregates every run)
+
+        Returns:
+            Dictionary with overall totals and breakdowns by model, agent and phase
+        """
+        with self._lock:
+            items = [
+                (key, dict(value)) for key, value in self._entries.items()
+                if run_id is None or key[0] == run_id
+            ]
+
+        def _empty():
+            return {"calls": 0, "estimated_calls": 0, "tokens_in": 0, "tokens_out": 0, "cached_in": 0, "cache_write": 0,
+                    "cost_usd": 0.0}
+
+        total = _empty()
+        by_model, by_agent, by_phase = defaultdict(_empty), defaultdict(_empty), defaultdict(_empty)
+        for (_, agent, phase, model), entry in items:
+            cost = self._cost_fn(model, entry["tokens_in"], entry["tokens_out"], entry["cached_in"], entry["cache_write"])
+            for bucket in (total, by_model[model], by_agent[agent or "unknown"], by_phase[phase or "unknown"]):
+                for field, value in entry.items():
+                    bucket[field] += value
+                bucket["cost_usd"] += cost
+
+        return {
+            "run_id": run_id,
+            "total": total,
+            "by_model": dict(by_model),
+            "by_agent": dict(by_agent),
+            "by_phase": dict(by_phase),
+        }
@@ -1,30 +1,49 @@
 import os
+import threading
 import chromadb
 from chromadb.utils import embedding_functions
+from helper.bm25 import BM25Index, reciprocal_rank_fusion
+from helper.metadata import build_where, date_ordinal, normalize_metadata, recency_factor
 import uuid
 
 num_results = 10000000000000000  
 char_length = 3000  
+QUERY_MODES = ("dense", "lexical", "hybrid")
+ORDERS = ("date", "relevance", "recency")
+# Dense queries start with this many nearest neighbours and grow until the similarity threshold is crossed
+INITIAL_CANDIDATES = 64
+RESULT_FIELDS = ("documents", "metadatas", "distances")
+# Documents sampled to tell whether a collection still has tags from before metadata normalization
+LEGACY_TAG_SAMPLE = 200
 
 class db:
-    def __init__(self, client_name, allowed_collections, EmbeddingModelName="BAAI/bge-m3", device="cpu"):
+    def __init__(self, client_name, allowed_collections, EmbeddingModelName="BAAI/bge-m3", device="cpu",
+                 embedding_function=None, root="vdb"):
         """
-        initialize a db instance
+        initialize a db instance, embedding_function overrides the sentence-transformers model (e.g. for benchmarks)
+        and root is the directory holding every client's chroma and bm25 files
         """
         self.client_name = client_name
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
+        self.root = root
+        self.embedding_fn = embedding_function or embedding_functions.SentenceTransformerEmbeddingFunction(
             model_name=EmbeddingModelName, device=device
         )
         self.client = self._create_client()
         self.collections = {
             name: self._create_collection(name) for name in allowed_collections
         }
+        # BM25 index stored next to each chroma collection for exact citation / section matches
+        self.lexical_indexes = {
+            name: BM25Index(os.path.join(self.root, self.client_name, "bm25", f"{name}.sqlite3")) for name in allowed_collections
+        }
+        self._sync_lock = threading.Lock()
+        self._legacy_tags = {}
 
     def _create_client(self):
         """
         create a chromadb client instance for the given client_name
         """
-        client_path = os.path.join("vdb", self.client_name)
+        client_path = os.path.join(self.root, self.client_name)
         os.makedirs(client_path, exist_ok=True)
         return chromadb.PersistentClient(path=client_path)
 
@@ -41,43 +60,204 @@ class db:
         """
         add a document to a specific collection
         """
+        self.add_documents(collection_name, [document], [metadata], [id] if id else None)
+
+    def add_documents(self, collection_name, documents, metadatas=None, ids=None, embeddings=None):
+        """
+        add documents to a specific collection in one batch, normalizing their metadata (dates, jurisdiction,
+        court level, tags) for where-clause filtering and indexing them for lexical search
+        """
         if collection_name not in self.collections:
             raise ValueError(f"Collection '{collection_name}' not accessible.")
-        collection = self.collections[collection_name]
-        collection.add(
-            documents=[document[:char_length]],
-            metadatas=[metadata] if metadata else None,
-            ids=[id] if id else [str(uuid.uuid4())]
+        documents = [document[:char_length] for document in documents]
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        metadatas = [normalize_metadata(metadata, document) for metadata, document in zip(metadatas or [None] * len(documents), documents)]
+        self.collections[collection_name].add(
+            documents=documents,
+            # chroma rejects empty metadata dicts
+            metadatas=[metadata or None for metadata in metadatas] if any(metadatas) else None,
+            embeddings=embeddings,
+            ids=ids
         )
+        self.lexical_indexes[collection_name].add(ids, documents)
+
+    def normalize_collection_metadata(self, collection_name, page_size=1000):
+        """
+        rewrites the metadata of documents ingested before metadata normalization, returns the number updated
+        """
+        collection = self.collections[collection_name]
+        updated = 0
+        for offset in range(0, collection.count(), page_size):
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            changed = [
+                (doc_id, normalized) for doc_id, doc, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+                for normalized in [normalize_metadata(metadata, doc or "")] if normalized and normalized != (metadata or {})
+            ]
+            if changed:
+                collection.update(ids=[c[0] for c in changed], metadatas=[c[1] for c in changed])
+                updated += len(changed)
+        self._legacy_tags.pop(collection_name, None)
+        return updated
+
+    def has_legacy_tags(self, collection_name):
+        """
+        whether a collection holds documents ingested before metadata normalization (a "tags" value without
+        tag_<slug> flags), judged from its first LEGACY_TAG_SAMPLE documents and cached per collection
+        """
+        if collection_name not in self._legacy_tags:
+            page = self.collections[collection_name].get(include=["metadatas"], limit=LEGACY_TAG_SAMPLE)
+            legacy = any(
+                "tags" in metadata and not any(key.startswith("tag_") for key in metadata)
+                for metadata in page["metadatas"] if metadata
+            )
+            if legacy:
+                print(f"Warning: {collection_name} has tags from before metadata normalization, tag filters also match "
+                      f"the old 'tags' field; run db.normalize_collection_metadata('{collection_name}') to migrate it")
+            self._legacy_tags[collection_name] = legacy
+        return self._legacy_tags[collection_name]
+
+    def publish_snapshot(self, keep=2):
+        """
+        exports every collection of this client as a read-only snapshot for helper.vdb_snapshot.SnapshotDB
+        readers and atomically makes it current, call after ingestion
+        """
+        from helper.vdb_snapshot import publish_snapshot
+        return publish_snapshot(self.client_name, list(self.collections), root=self.root, keep=keep, client=self.client)
+
+    def sync_lexical_index(self, collection_name, page_size=1000):
+        """
+        rebuilds the bm25 index of a collection from chromadb when their document counts differ
+        (e.g. collections ingested before the lexical index existed)
+        """
+        collection = self.collections[collection_name]
+        index = self.lexical_indexes[collection_name]
+        with self._sync_lock:
+            count = collection.count()
+            if len(index) == count:
+                return
+            print(f"Rebuilding lexical index for {collection.name} ({count} documents)...")
+            index.clear()
+            for offset in range(0, count, page_size):
+                page = collection.get(include=["documents"], limit=page_size, offset=offset)
+                index.add(page["ids"], [doc or "" for doc in page["documents"]])
 
     def query_collection(self, collection_name, query_text, tags=None, n_results=num_results,
-                         include=["documents", "metadatas", "distances"], similarity_threshold=0.7):
+                         include=RESULT_FIELDS, similarity_threshold=0.7,
+                         mode="dense", top_k=None, rrf_k=60, filters=None, order="date", recency_half_life_years=10.0):
         """
-        queries a specific collection in the chromadb database
+        queries a specific collection in the chromadb database. mode "dense" returns embedding matches above
+        similarity_threshold (at most n_results), "lexical" the top_k bm25 matches and "hybrid" fuses both rankings
+        with reciprocal rank fusion and keeps the top_k (dense candidates still have to pass similarity_threshold).
+        tags and filters (jurisdiction, min_court_level, date_from, date_to, see helper.metadata.build_where) are
+        applied by chroma before ranking. order "date" sorts dense hits newest first, "relevance" by similarity and
+        "recency" by similarity decayed with case age (ranked modes keep their fused order unless "recency").
+        include picks the returned fields among documents, metadatas and distances (ranked modes add "scores");
+        all three are always fetched since thresholding and ordering need them. Tag filters also match the old
+        "tags" field on collections that were ingested before metadata normalization
         """
         if collection_name not in self.collections:
             raise ValueError(f"Collection '{collection_name}' not accessible.")
-        where_clause = {}
-        if tags:
-            where_clause["tags"] = {"$in": tags}
-        result = self.collections[collection_name].query(
-            query_texts=[query_text],
-            n_results=n_results,
-            include=include,
-            where=where_clause,
-        )
-        return self.filter_results(result, similarity_threshold)
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Invalid query mode '{mode}'. Valid modes are: {QUERY_MODES}")
+        if order not in ORDERS:
+            raise ValueError(f"Invalid order '{order}'. Valid orders are: {ORDERS}")
+        unknown = [field for field in include if field not in RESULT_FIELDS]
+        if unknown:
+            raise ValueError(f"Invalid include fields {unknown}. Valid fields are: {RESULT_FIELDS}")
+        collection = self.collections[collection_name]
+        count = collection.count()
+        if count == 0:
+            return {field: [] for field in include}
+        where_clause = build_where(tags=tags, legacy_tags=bool(tags) and self.has_legacy_tags(collection_name), **(filters or {}))
+        if mode == "dense":
+            result = self._dense_query(collection, query_text, where_clause, similarity_threshold, min(n_results, count))
+            result = self.filter_results(result, similarity_threshold, order, recency_half_life_years)
+            return {field: result[field] for field in include}
+        result = self._ranked_query(collection_name, query_text, where_clause, similarity_threshold, mode, top_k or 8, rrf_k, count)
+        if order == "recency":
+            rescored = sorted(
+                zip(result["documents"], result["metadatas"], result["distances"],
+                    [score * recency_factor(metadata, recency_half_life_years) for score, metadata in zip(result["scores"], result["metadatas"])]),
+                key=lambda item: -item[3]
+            )
+            result = {key: [item[i] for item in rescored] for i, key in enumerate(("documents", "metadatas", "distances", "scores"))}
+        return {field: result[field] for field in (*include, "scores")}
+
+    @staticmethod
+    def _dense_query(collection, query_text, where_clause, similarity_threshold, limit):
+        """
+        nearest-neighbour query that only fetches as many rows as pass the threshold: the candidate count
+        grows 4x until the farthest hit falls below similarity_threshold, the filter is exhausted or limit is hit
+        """
+        n = min(INITIAL_CANDIDATES, limit)
+        while True:
+            result = collection.query(
+                query_texts=[query_text],
+                n_results=n,
+                include=["documents", "metadatas", "distances"],
+                where=where_clause,
+            )
+            distances = result["distances"][0]
+            if len(distances) < n or n >= limit or 1 - distances[-1] < similarity_threshold:
+                return result
+            n = min(4 * n, limit)
+
+    def _ranked_query(self, collection_name, query_text, where_clause, similarity_threshold, mode, top_k, rrf_k, count):
+        """
+        lexical or hybrid query, results are ordered by rank (best first) with the fused score under "scores"
+        """
+        collection = self.collections[collection_name]
+        self.sync_lexical_index(collection_name)
+        candidates = min(max(4 * top_k, 50), count)
+
+        rankings, found = [], {}
+        if mode == "hybrid":
+            dense = collection.query(
+                query_texts=[query_text],
+                n_results=candidates,
+                include=["documents", "metadatas", "distances"],
+                where=where_clause,
+            )
+            ranking = []
+            for doc_id, doc, metadata, distance in zip(dense["ids"][0], dense["documents"][0], dense["metadatas"][0], dense["distances"][0]):
+                if 1 - distance >= similarity_threshold:
+                    ranking.append(doc_id)
+                    found[doc_id] = (doc, metadata, distance)
+            rankings.append(ranking)
+
+        lexical_ids = [doc_id for doc_id, _ in self.lexical_indexes[collection_name].search(query_text, k=candidates)]
+        missing = [doc_id for doc_id in lexical_ids if doc_id not in found]
+        if missing:
+            # Also applies the metadata filter to lexical hits, which the bm25 index knows nothing about
+            lexical = collection.get(ids=missing, include=["documents", "metadatas"], where=where_clause)
+            for doc_id, doc, metadata in zip(lexical["ids"], lexical["documents"], lexical["metadatas"]):
+                found[doc_id] = (doc, metadata, None)
+        rankings.append([doc_id for doc_id in lexical_ids if doc_id in found])
+
+        fused = reciprocal_rank_fusion(rankings, k=rrf_k)[:top_k]
+        return {
+            "documents": [found[doc_id][0] for doc_id, _ in fused],
+            "metadatas": [found[doc_id][1] for doc_id, _ in fused],
+            "distances": [found[doc_id][2] for doc_id, _ in fused],
+            "scores": [score for _, score in fused],
+        }
 
     @staticmethod
-    def filter_results(result, similarity_threshold=0.7):
+    def filter_results(result, similarity_threshold=0.7, order="date", recency_half_life_years=10.0):
         """
-        filters and sorts query results based on a similarity threshold and case date
+        filters query results based on a similarity threshold and sorts them newest first ("date"),
+        by similarity ("relevance") or by similarity decayed with case age ("recency")
         """
         filtered_results = []
         for doc, metadata, distance in zip(result["documents"][0], result["metadatas"][0], result["distances"][0]):
             if 1 - distance >= similarity_threshold:
                 filtered_results.append((doc, metadata, distance))
-        sorted_results = sorted(filtered_results, key=lambda x: x[1].get("case_date", ""), reverse=True)
+        if order == "date":
+            sorted_results = sorted(filtered_results, key=lambda x: date_ordinal(x[1]), reverse=True)
+        elif order == "recency":
+            sorted_results = sorted(filtered_results, key=lambda x: -(1 - x[2]) * recency_factor(x[1], recency_half_life_years))
+        else:
+            sorted_results = sorted(filtered_results, key=lambda x: x[2])
         return {
             "documents": [item[0] for item in sorted_results],
             "metadatas": [item[1] for item in sorted_results],
@@ -87,11 +267,11 @@ class db:
     # OLD METHODS FOR QUERYING COLLECTIONS, DOCUMENTS and METADATA
 
     def query_internal_collection(self, query_text, tags=None, n_results=num_results,
-                                   include=["documents", "metadatas", "distances"], similarity_threshold=0.7):
+                                   include=RESULT_FIELDS, similarity_threshold=0.7):
         return self.query_collection("internal-collection", query_text, tags, n_results, include, similarity_threshold)
 
     def query_external_collection(self, query_text, tags=None, n_results=num_results,
-                                   include=["documents", "metadatas", "distances"], similarity_threshold=0.7):
+                                   include=RESULT_FIELDS, similarity_threshold=0.7):
         return self.query_collection("external-collection", query_text, tags, n_results, include, similarity_threshold)
 
     def query_internal_documents(self, query_text, tags=None, similarity_threshold=0.7):
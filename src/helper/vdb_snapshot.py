@@ -0,0 +1,435 @@
+import argparse
+import datetime
+import json
+import mmap
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from helper.bm25 import BM25Index
+from helper.vdb_manager import db
+
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+# Rows scored per matrix product, bounds the temporaries of a full scan to a few MB
+SCAN_BLOCK = 65536
+
+
+def snapshot_root(client_name: str, root: str = "vdb") -> str:
+    """Directory holding a client's published snapshots and their CURRENT pointer"""
+    return os.path.join(root, client_name, "snapshots")
+
+
+class _Blob:
+    """Variable-length utf-8 records in one memory-mapped file, located by an offsets array"""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[int(self.offsets[row]):int(self.offsets[row + 1])].decode("utf-8")
+
+    @staticmethod
+    def write(path: str, records: Sequence[str]) -> None:
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        with open(path, "wb") as f:
+            for row, record in enumerate(records):
+                encoded = record.encode("utf-8")
+                f.write(encoded)
+                offsets[row + 1] = offsets[row] + len(encoded)
+        np.save(path + ".offsets.npy", offsets)
+
+
+class _Column:
+    """
+    One metadata field as a memory-mapped array: booleans as int8, numbers as float64
+    and strings as int32 codes into a vocabulary; missing values never match a filter
+    """
+
+    def __init__(self, values: np.ndarray, kind: str, vocab: Optional[List[str]] = None):
+        self.values = values
+        self.kind = kind
+        self.codes = {value: code for code, value in enumerate(vocab or [])}
+
+    def _present(self) -> np.ndarray:
+        return np.isfinite(self.values) if self.kind == "num" else self.values >= 0
+
+    def _operand(self, value: Any) -> Any:
+        if self.kind == "str":
+            return self.codes.get(value, -2) if isinstance(value, str) else -2
+        if isinstance(value, str):
+            return None
+        return int(value) if self.kind == "bool" else float(value)
+
+    def compare(self, operator: str, value: Any) -> np.ndarray:
+        if operator in ("$in", "$nin"):
+            operands = [o for o in (self._operand(v) for v in value) if o is not None]
+            matched = np.isin(self.values, operands)
+            return matched if operator == "$in" else ~matched & self._present()
+        operand = self._operand(value)
+        if operand is None:
+            return np.zeros(len(self.values), dtype=bool)
+        if operator == "$eq":
+            return self.values == operand
+        if operator == "$ne":
+            return (self.values != operand) & self._present()
+        if self.kind != "num":
+            raise ValueError(f"Operator '{operator}' needs a numeric metadata field")
+        return {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}[operator](self.values, operand)
+
+
+class SnapshotCollection:
+    """
+    Read-only collection of a published snapshot, answering the subset of the Chroma
+    collection API that db uses (count, query, get)
+
+    Embeddings, documents, metadata and filter columns are memory-mapped, so every
+    worker process on a host shares one copy through the page cache. Ids are row
+    numbers within the snapshot, which is also how its BM25 index refers to documents.
+    """
+
+    def __init__(self, path: str, manifest: Dict[str, Any], embedding_fn):
+        """
+        Args:
+            path: Directory of the collection inside a snapshot
+            manifest: The collection's entry in the snapshot manifest
+            embedding_fn: Embeds query texts (must match the model the collection was built with)
+        """
+        self.name = manifest["name"]
+        self.embedding_fn = embedding_fn
+        self._count = manifest["count"]
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.documents = _Blob(os.path.join(path, "documents.bin"))
+        self.metadatas = _Blob(os.path.join(path, "metadatas.bin"))
+        self.columns = {
+            key: _Column(np.load(os.path.join(path, column["file"]), mmap_mode="r"), column["kind"], column.get("vocab"))
+            for key, column in manifest["columns"].items()
+        }
+        self.lexical_index = BM25Index(os.path.join(path, "bm25.sqlite3"), read_only=True)
+        # The same query is asked again when db._dense_query grows its candidate count
+        self._last = threading.local()
+
+    def count(self) -> int:
+        return self._count
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Rows matching a Chroma where clause ($and, $or, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin)"""
+        if not where:
+            return None
+        masks = []
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._mask(clause) for clause in condition]
+                masks.append(np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts))
+                continue
+            conditions = condition.items() if isinstance(condition, dict) else [("$eq", condition)]
+            column = self.columns.get(key)
+            for operator, value in conditions:
+                masks.append(column.compare(operator, value) if column else np.zeros(self._count, dtype=bool))
+        return np.logical_and.reduce(masks)
+
+    def _similarities(self, query_text: str, where: Optional[Dict[str, Any]]):
+        """(rows, cosine similarities) of every row passing the where clause, cached for the calling thread"""
+        key = (query_text, json.dumps(where, sort_keys=True))
+        if getattr(self._last, "key", None) == key:
+            return self._last.value
+        query = np.asarray(self.embedding_fn([query_text])[0], dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        mask = self._mask(where)
+        if mask is not None and mask.sum() < self._count // 4:
+            # Selective filters score only their rows
+            rows = np.flatnonzero(mask)
+            sims = self.embeddings[rows] @ query
+        else:
+            sims = np.empty(self._count, dtype=np.float32)
+            for start in range(0, self._count, SCAN_BLOCK):
+                sims[start:start + SCAN_BLOCK] = self.embeddings[start:start + SCAN_BLOCK] @ query
+            rows = np.arange(self._count) if mask is None else np.flatnonzero(mask)
+            sims = sims if mask is None else sims[mask]
+        self._last.key, self._last.value = key, (rows, sims)
+        return rows, sims
+
+    def _rows(self, rows: Sequence[int], include: Sequence[str]) -> Dict[str, List]:
+        result = {"ids": [str(row) for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self.documents[row] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(self.metadatas[row]) for row in rows]
+        return result
+
+    def query(self, query_texts: List[str], n_results: int = 10, include=("documents", "metadatas", "distances"), where=None):
+        """Exact nearest neighbours by cosine distance, best first, in Chroma's nested result layout"""
+        rows, sims = self._similarities(query_texts[0], where)
+        n = min(n_results, len(rows))
+        top = np.argpartition(-sims, n - 1)[:n] if 0 < n < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-sims[top], kind="stable")]
+        result = self._rows(rows[top], include)
+        result["distances"] = [float(1 - sims[i]) for i in top]
+        return {key: [value] for key, value in result.items()}
+
+    def get(self, ids: Optional[List[str]] = None, include=("documents", "metadatas"), where=None, limit=None, offset=0):
+        """Rows by id (snapshot row number) and/or where clause, in Chroma's flat result layout"""
+        rows = np.arange(self._count) if ids is None else np.array([int(i) for i in ids if 0 <= int(i) < self._count], dtype=np.int64)
+        mask = self._mask(where)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        rows = rows[offset:offset + limit if limit is not None else None]
+        return self._rows(rows, include)
+
+
+class _Snapshot:
+    """Collections of one published snapshot, swapped as a unit"""
+
+    def __init__(self, name: str, collections: Dict[str, SnapshotCollection]):
+        self.name = name
+        self.collections = collections
+        self.lexical_indexes = {key: collection.lexical_index for key, collection in collections.items()}
+
+
+class SnapshotDB(db):
+    """
+    Read-only db backed by the latest published snapshot of a client's collections
+
+    Meant for many worker processes on one host: nothing is loaded into process
+    memory besides the embedding model, and no SQLite write locks are taken. Every
+    query checks the CURRENT pointer, so a snapshot published after ingestion is
+    picked up atomically by running workers; queries already in flight finish on
+    the snapshot they started with.
+    """
+
+    def __init__(self, client_name: str, allowed_collections: Sequence[str], EmbeddingModelName: str = "BAAI/bge-m3",
+                 device: str = "cpu", embedding_function=None, root: str = "vdb"):
+        """
+        Args:
+            client_name: Client whose snapshots are read (vdb/<client_name>/snapshots)
+            allowed_collections: Collections to expose, others in the snapshot are ignored
+            EmbeddingModelName: Sentence-transformers model for query embeddings
+            device: Device of the embedding model
+            embedding_function: Overrides the sentence-transformers model
+            root: Directory holding every client's vector stores
+        """
+        self.client_name = client_name
+        self.root = root
+        self.allowed_collections = list(allowed_collections)
+        self.embedding_fn = embedding_function or embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=EmbeddingModelName, device=device
+        )
+        self.snapshot_dir = snapshot_root(client_name, root)
+        self._sync_lock = threading.Lock()
+        self._legacy_tags = {}
+        self._pinned = threading.local()
+        self._pointer = None
+        self._snapshot = None
+        self.refresh()
+
+    @property
+    def collections(self) -> Dict[str, SnapshotCollection]:
+        return (getattr(self._pinned, "snapshot", None) or self._snapshot).collections
+
+    @property
+    def lexical_indexes(self) -> Dict[str, BM25Index]:
+        return (getattr(self._pinned, "snapshot", None) or self._snapshot).lexical_indexes
+
+    @property
+    def snapshot_name(self) -> str:
+        return self._snapshot.name
+
+    def refresh(self) -> bool:
+        """
+        Load the snapshot CURRENT points to if it changed since the last check
+
+        Returns:
+            True when a new snapshot was swapped in
+        """
+        pointer_path = os.path.join(self.snapshot_dir, CURRENT)
+        try:
+            stat = os.stat(pointer_path)
+        except FileNotFoundError:
+            raise Exception(f"No published snapshot for '{self.client_name}' in {self.snapshot_dir}, "
+                            f"run 'python -m helper.vdb_snapshot' after ingestion")
+        pointer = (stat.st_mtime_ns, stat.st_size)
+        if pointer == self._pointer:
+            return False
+        with self._sync_lock:
+            if pointer == self._pointer:
+                return False
+            with open(pointer_path) as f:
+                name = f.read().strip()
+            if self._snapshot is None or name != self._snapshot.name:
+                self._snapshot = self._load(name)
+                self._legacy_tags = {}
+            self._pointer = pointer
+            return True
+
+    def _load(self, name: str) -> _Snapshot:
+        path = os.path.join(self.snapshot_dir, name)
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        collections = {}
+        for collection_name in self.allowed_collections:
+            if collection_name not in manifest["collections"]:
+                print(f"Warning: snapshot {name} of '{self.client_name}' has no collection '{collection_name}'")
+                continue
+            collections[collection_name] = SnapshotCollection(
+                os.path.join(path, collection_name), manifest["collections"][collection_name], self.embedding_fn
+            )
+        return _Snapshot(name, collections)
+
+    def add_documents(self, collection_name, documents, metadatas=None, ids=None, embeddings=None):
+        raise Exception(f"Snapshot of '{self.client_name}' is read-only, ingest into db and publish a new snapshot")
+
+    def normalize_collection_metadata(self, collection_name, page_size=1000):
+        raise Exception(f"Snapshot of '{self.client_name}' is read-only, normalize the live collection and publish a new snapshot")
+
+    def sync_lexical_index(self, collection_name, page_size=1000):
+        """
+        snapshots are published with their bm25 index, nothing to rebuild
+        """
+
+    def query_collection(self, collection_name, query_text, *args, **kwargs):
+        """
+        db.query_collection against the current snapshot, pinned for the whole query
+        """
+        self.refresh()
+        self._pinned.snapshot = self._snapshot
+        try:
+            return super().query_collection(collection_name, query_text, *args, **kwargs)
+        finally:
+            self._pinned.snapshot = None
+
+
+def _column(values: List[Any]) -> Dict[str, Any]:
+    """Pick the storage of a metadata field from the values present in it"""
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, bool) for value in present):
+        return {"kind": "bool", "values": np.array([-1 if v is None else int(v) for v in values], dtype=np.int8)}
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return {"kind": "num", "values": np.array([np.nan if v is None else v for v in values], dtype=np.float64)}
+    vocab = sorted({str(value) for value in present})
+    codes = {value: code for code, value in enumerate(vocab)}
+    return {"kind": "str", "vocab": vocab, "values": np.array([-1 if v is None else codes[str(v)] for v in values], dtype=np.int32)}
+
+
+def _export_collection(collection, path: str, page_size: int) -> Dict[str, Any]:
+    """Write one Chroma collection as embeddings, document / metadata blobs, filter columns and a BM25 index"""
+    os.makedirs(path)
+    count = collection.count()
+    documents, metadatas, original_ids = [], [], []
+    embeddings = None
+    lexical = BM25Index(os.path.join(path, "bm25.sqlite3"))
+    for offset in range(0, count, page_size):
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(os.path.join(path, "embeddings.npy"), mode="w+",
+                                                   dtype=np.float32, shape=(count, vectors.shape[1]))
+        # Unit vectors, so a dot product is the cosine similarity
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        embeddings[offset:offset + len(vectors)] = vectors / np.where(norms == 0, 1, norms)
+        page_documents = [doc or "" for doc in page["documents"]]
+        lexical.add([str(offset + i) for i in range(len(page_documents))], page_documents)
+        documents.extend(page_documents)
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+        original_ids.extend(page["ids"])
+    if embeddings is None:
+        np.save(os.path.join(path, "embeddings.npy"), np.zeros((0, 0), dtype=np.float32))
+    else:
+        embeddings.flush()
+    lexical.freeze()
+
+    _Blob.write(os.path.join(path, "documents.bin"), documents)
+    _Blob.write(os.path.join(path, "metadatas.bin"), [json.dumps(metadata) for metadata in metadatas])
+    _Blob.write(os.path.join(path, "ids.bin"), original_ids)
+    columns = {}
+    keys = sorted({key for metadata in metadatas for key in metadata})
+    for index, key in enumerate(keys):
+        column = _column([metadata.get(key) for metadata in metadatas])
+        column["file"] = f"column_{index}.npy"
+        np.save(os.path.join(path, column["file"]), column.pop("values"))
+        columns[key] = column
+    return {"name": collection.name, "count": count, "dim": 0 if embeddings is None else embeddings.shape[1], "columns": columns}
+
+
+def publish_snapshot(client_name: str, collection_names: Sequence[str], root: str = "vdb", keep: int = 2,
+                     client=None, page_size: int = 1000) -> str:
+    """
+    Export a client's collections as an immutable snapshot and atomically make it current
+
+    The snapshot is written under a temporary name, renamed into place and only
+    then announced by replacing the CURRENT pointer, so readers never see a
+    partial snapshot. Older snapshots beyond keep are removed; processes that
+    still have them mapped keep reading them until they refresh.
+
+    Args:
+        client_name: Client whose collections are exported (vdb/<client_name>)
+        collection_names: Collections to include
+        root: Directory holding every client's vector stores
+        keep: Snapshots to retain, including the new one
+        client: Open chromadb client for the store (a new PersistentClient by default)
+        page_size: Documents read from Chroma per request
+
+    Returns:
+        Name of the published snapshot
+    """
+    if client is None:
+        import chromadb
+        client = chromadb.PersistentClient(path=os.path.join(root, client_name))
+    base = snapshot_root(client_name, root)
+    os.makedirs(base, exist_ok=True)
+    # Names sort by creation time, which is what pruning relies on
+    name = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    staging = os.path.join(base, f".{name}.tmp")
+
+    manifest = {"client": client_name, "created": datetime.datetime.now().isoformat(), "collections": {}}
+    try:
+        for collection_name in collection_names:
+            collection = client.get_collection(name=f"{client_name}_{collection_name}")
+            print(f"Exporting {collection.name} ({collection.count()} documents)...")
+            manifest["collections"][collection_name] = _export_collection(collection, os.path.join(staging, collection_name), page_size)
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, os.path.join(base, name))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer_tmp = os.path.join(base, f".{CURRENT}.{name}")
+    with open(pointer_tmp, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(base, CURRENT))
+    print(f"Published snapshot {name} for '{client_name}'")
+
+    published = sorted(entry for entry in os.listdir(base) if not entry.startswith(".") and entry != CURRENT)
+    for old in published[:-keep] if keep > 0 else []:
+        if old != name:
+            # Windows refuses to delete files another process has mapped, the next publish retries
+            shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+    return name
+
+
+def parse_arguments():
+    """
+    parse command-line arguments
+    """
+    parser = argparse.ArgumentParser(description="Publish read-only vector store snapshots for worker processes")
+    parser.add_argument("--agents", type=str, help="Comma-separated agents to publish (default: every agent in settings/agents.json)")
+    parser.add_argument("--root", type=str, default="vdb", help="Directory holding the vector stores")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshots to retain per agent")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from helper.configloader import load_agent_config
+
+    args = parse_arguments()
+    agent_configs = load_agent_config()
+    for agent_name in (args.agents.split(",") if args.agents else agent_configs):
+        publish_snapshot(agent_name, agent_configs[agent_name]["allowed_collections"], root=args.root, keep=args.keep)
@@ -6,29 +6,37 @@ import json
 import datetime
 import argparse
 import subprocess
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from helper.agent_clients import AgentClient
 from helper.legalagents import LegalReviewPanel
 from dotenv import load_dotenv
 from helper.configloader import load_agent_config
-from helper.markdown_translator import convert_to_md
+from helper.results_log import ResultsLog, build_results
+from helper.results_store import ResultsStore
+from helper.inference import LEDGER
+from helper.providers import list_models, resolve_model
+from helper.retry import RETRY_METRICS, set_run_deadline
+from helper.tracing import TRACER, span
+from helper.profiling import PROFILE_MODES, child_env, profile_run
+from helper.scheduler import DAGScheduler
 # ----- INITIALIZATION CODE -----
 
 load_dotenv()
 
 # ----- HELPER FUNCTIONS -----
 
-def process_hypothetical_directory(hypo_dir: str) -> str:
+def extract_hypotheticals(hypo_dir: str) -> List[Dict]:
     """
-    wrapper function that processes a directory of hypothetical pdfs and return the selected scenarios and questions
+    runs extract_hypo.py over a directory of hypothetical pdfs and returns the extracted items
     """
     processed_dir = os.path.join("output")
     os.makedirs(processed_dir, exist_ok=True)
     print(f"\nExtracting hypotheticals from {hypo_dir}...")
-    try:
-        subprocess.run([sys.executable, "helper/extract_hypo.py", "--inpath", hypo_dir, "--outpath", processed_dir], check=True) # modified this to use current environment
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Error running extract_hypo.py: {str(e)}")
+    with span("hypothetical_extraction", hypo_dir=hypo_dir):
+        try:
+            subprocess.run([sys.executable, "helper/extract_hypo.py", "--inpath", hypo_dir, "--outpath", processed_dir], check=True, env=child_env()) # modified this to use current environment
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Error running extract_hypo.py: {str(e)}")
     json_path = os.path.join(processed_dir, "extracted_data.json")
     if not os.path.exists(json_path):
         raise Exception(f"Expected output file {json_path} not found")
@@ -36,12 +44,21 @@ def process_hypothetical_directory(hypo_dir: str) -> str:
         extracted_data = json.load(f)
     if not extracted_data:
         raise Exception("No hypotheticals were extracted from the provided directory")
+    return extracted_data
+
+def select_hypotheticals(extracted_data: List[Dict], selection: Optional[str] = None) -> List[int]:
+    """
+    returns the 1-based indices of the hypotheticals to analyze, from selection ("1,3" or "all") or by prompting the user
+    """
     print("\nAvailable hypotheticals:")
     for i, item in enumerate(extracted_data, 1):
         print(f"{i}. {item['file']} ({len(item['scenario'])} chars, {item['metadata']['num_pages']} pages)")
+    if selection and selection.strip().lower() == "all":
+        return list(range(1, len(extracted_data) + 1))
     selected_indices = []
     while not selected_indices:
-        selection = input("\nEnter the numbers of hypotheticals to analyze (comma-separated, e.g., '1,3,4'): ")
+        if selection is None:
+            selection = input("\nEnter the numbers of hypotheticals to analyze (comma-separated, e.g., '1,3,4'): ")
         try:
             selected_indices = [int(idx.strip()) for idx in selection.split(",")]
             if any(idx < 1 or idx > len(extracted_data) for idx in selected_indices): # indices validation but might not be necessary
@@ -49,6 +66,13 @@ def process_hypothetical_directory(hypo_dir: str) -> str:
                 selected_indices = []
         except ValueError:
             print("Invalid input. Please enter numbers separated by commas.")
+        selection = None
+    return selected_indices
+
+def build_analysis_text(extracted_data: List[Dict], selected_indices: List[int]) -> str:
+    """
+    combines the selected scenarios and their questions into a single analysis text
+    """
     combined_scenario = ""
     combined_questions = []
     for idx in selected_indices:
@@ -61,10 +85,76 @@ def process_hypothetical_directory(hypo_dir: str) -> str:
         analysis_text += "\n\nQUESTIONS:\n" + "\n".join([f"{i+1}. {q}" for i, q in enumerate(combined_questions)])
     return analysis_text
 
+def build_question_units(extracted_data: List[Dict], selected_indices: List[int]) -> List[Dict]:
+    """
+    splits the selected hypotheticals into one analysis unit per (scenario, question) pair, a scenario without
+    extracted questions becomes a single unit. units of a scenario share its retrieval query (scenario and all its questions)
+    """
+    units = []
+    for idx in selected_indices:
+        item = extracted_data[idx-1]
+        retrieval_query = build_analysis_text(extracted_data, [idx])
+        for q_idx, question in enumerate(item['questions'] or [None], 1):
+            text = f"--- HYPOTHETICAL {idx}: {item['file']} ---\n\n{item['scenario']}"
+            if question:
+                text += f"\n\nQUESTION:\n{question}"
+            units.append({
+                "unit_id": f"h{idx}q{q_idx}",
+                "scenario_id": f"h{idx}",
+                "file": item['file'],
+                "question": question,
+                "text": text,
+                "retrieval_query": retrieval_query,
+            })
+    return units
+
+def merge_question_outputs(question_outputs: List[Dict], agent_name: str, phases: List[str]) -> Tuple[Dict[str, str], str]:
+    """
+    merges one agent's per-question answers into phase sections for the report (questions within each phase)
+    and a review for synthesis (phases within each question)
+    """
+    titled = [
+        (f"Question {unit['unit_id']} ({unit['file']}): {unit['question'] or 'Scenario analysis'}", unit["agent_outputs"][agent_name])
+        for unit in question_outputs
+    ]
+    phase_outputs = {phase: "\n\n".join(f"{title}\n{answers[phase]}" for title, answers in titled) for phase in phases}
+    review = "\n\n".join(f"{title}\n{LegalReviewPanel.compile_review(answers)}" for title, answers in titled)
+    return phase_outputs, review
+
+def process_hypothetical_directory(hypo_dir: str, selection: Optional[str] = None) -> str:
+    """
+    wrapper function that processes a directory of hypothetical pdfs and return the selected scenarios and questions
+    """
+    extracted_data = extract_hypotheticals(hypo_dir)
+    selected_indices = select_hypotheticals(extracted_data, selection)
+    return build_analysis_text(extracted_data, selected_indices)
+
+def print_timing_summary(timing: Dict) -> None:
+    """
+    prints where the run's wall-clock time went, one row per traced stage
+    """
+    print(f"\nTiming summary (wall {timing['wall_s']:.1f}s, nested stages overlap):")
+    print(f"{'stage':<24}{'calls':>6}{'total s':>10}{'mean s':>9}{'max s':>9}{'% run':>8}")
+    for row in timing["stages"]:
+        print(f"{row['stage']:<24}{row['calls']:>6}{row['total_s']:>10.2f}{row['mean_s']:>9.2f}{row['max_s']:>9.2f}{row['pct_of_run']:>8.1f}")
+
+def print_schedule_summary(schedule: Dict) -> None:
+    """
+    prints the critical path of the agent phase schedule and how much of it overlapped
+    """
+    print(f"\nPhase schedule: {schedule['tasks']} tasks on {schedule['max_workers']} workers, "
+          f"{schedule['wall_s']:.2f}s wall, {schedule['busy_s']:.2f}s busy (parallelism {schedule['parallelism']:.2f})")
+    print(f"Critical path {schedule['critical_path_s']:.2f}s ({schedule['critical_path_pct']:.1f}% of the schedule): "
+          + " -> ".join(step["task"] for step in schedule["critical_path"]))
+
 class LegalSimulationWorkflow:
-    def __init__(self, legal_question: str, api_keys: dict, model_backbone: Optional[str] = None, hypothetical: Optional[str] = None):
+    def __init__(self, legal_question: str, api_keys: dict, model_backbone: Optional[str] = None, hypothetical: Optional[str] = None,
+                 deadline: Optional[float] = None, selection: Optional[str] = None, concurrency: int = 4, fan_out: bool = False,
+                 snapshot: bool = False):
         """
-        initialize the legal simulation workflow
+        initialize the legal simulation workflow, deadline is the total time budget for the run in seconds,
+        concurrency the number of agent phases allowed to run at once, fan_out analyzes every question
+        of a hypothetical as its own unit and snapshot retrieves from the published read-only vector store snapshots
         """
         self.legal_question = legal_question
         self.hypothetical = hypothetical
@@ -73,6 +163,14 @@ class LegalSimulationWorkflow:
 
         self.agent_configs = load_agent_config()
 
+        # Timestamp doubles as the run id used for usage accounting
+        self.timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.deadline = deadline
+        self.selection = selection
+        self.concurrency = concurrency
+        self.fan_out = fan_out
+        self.snapshot = snapshot
+
         # Initialize agents using AgentClient
         self.agents = {}
         for agent_name, config in self.agent_configs.items():
@@ -82,101 +180,183 @@ class LegalSimulationWorkflow:
                 agent_type=config["type"],
                 model_str=self.model_backbone,
                 api_keys=self.api_keys,
-                allowed_collections=config["allowed_collections"] 
+                allowed_collections=config["allowed_collections"],
+                run_id=self.timestamp,
+                snapshot=self.snapshot
             )
 
         # Create results directory with timestamp
-        self.timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         self.results_dir = os.path.join("results", f"analysis_{self.timestamp}")
         os.makedirs(self.results_dir, exist_ok=True)
 
-    def _save_analysis_results(self, results: Dict) -> None:
+    def _save_analysis_results(self, log: ResultsLog) -> None:
         """
-        save analysis results to a json file
+        close the run's results log and build analysis_results.json and its markdown report from it
         """
         output_file = os.path.join(self.results_dir, "analysis_results.json")
         try:
-            with open(output_file, 'w') as f:
-                json.dump(results, f, indent=2)
-            convert_to_md(output_file)
+            log.close()
+            results = build_results(log.path, output_file)
         except Exception as e:
             raise Exception(f"Error saving analysis results: {str(e)}")
+        try:
+            ResultsStore().ingest_result(results, output_file)
+        except Exception as e:
+            # The json file is the record of the run, the store can re-ingest it later
+            print(f"Warning: could not add the run to the results store: {e}")
 
     def perform_legal_analysis(self) -> None:
         """
         execute the complete legal analysis workflow
         """
 
+        log = None
         try:
             print("\nInitiating legal analysis workflow...")
+            set_run_deadline(self.timestamp, self.deadline)
+            TRACER.start_run(self.timestamp, os.path.join(self.results_dir, "trace.jsonl"))
+            # Every output is appended here as it is produced, analysis_results.json is built from it at the end
+            log = ResultsLog(os.path.join(self.results_dir, "analysis_results.jsonl"))
 
+            with span("run", run_id=self.timestamp, model=self.model_backbone) as run_span:
+                units = None
+                if self.hypothetical:
+                    if self.fan_out:
+                        extracted_data = extract_hypotheticals(self.hypothetical)
+                        selected_indices = select_hypotheticals(extracted_data, self.selection)
+                        analysis_text = build_analysis_text(extracted_data, selected_indices)
+                        units = build_question_units(extracted_data, selected_indices)
+                    else:
+                        analysis_text = process_hypothetical_directory(self.hypothetical, self.selection)
+                    header = {
+                        "legal_question": None,
+                        "hypothetical": analysis_text,
+                        "timestamp": self.timestamp,
+                        "model": self.model_backbone,
+                        "agent_outputs": {},
+                        "final_synthesis": None
+                    }
+                    print(analysis_text)
+                else:
+                    analysis_text = self.legal_question
 
-            if self.hypothetical:
-                analysis_text = process_hypothetical_directory(self.hypothetical)
-                analysis_results = {
-                    "legal_question": None,
-                    "hypothetical": analysis_text,
-                    "timestamp": self.timestamp,
-                    "model": self.model_backbone,
-                    "agent_outputs": {},
-                    "final_synthesis": None
-                }
-                print(analysis_text)
-            else:
-                analysis_text = self.legal_question
-
-                analysis_results = {
-                    "legal_question": analysis_text,
-                    "hypothetical": None,
-                    "timestamp": self.timestamp,
-                    "model": self.model_backbone,
-                    "agent_outputs": {},
-                    "final_synthesis": None
-                }
-
-            # right now logic is just simplified to check for hypos first but
-            # this is because im edge guarding within the runmac.sh and runwin.bat
-            # calls already so that only one analysistext source can be called at 
-            # once
-            # ~ gong
-            
-            
-            # changed this as its passing the hypo directory instead of the acutal hypo                 
-            
-            # Perform analysis for each agent
-            for agent_name, agent in self.agents.items():
-                print(f"\nPerforming analysis using {agent_name}...")
-                agent_results = agent.perform_full_structured_analysis(question=analysis_text)
-                analysis_results["agent_outputs"][agent_name] = agent_results
-
-            # Synthesize reviews using Internal and External outputs
-            print("\nSynthesizing perspectives...")
-            internal_review = analysis_results["agent_outputs"]["internal"].get("review", "")
-            external_review = analysis_results["agent_outputs"]["external"].get("review", "")
-
-            reviews = [
-                {"perspective": "internal_law", "review": internal_review},
-                {"perspective": "external_law", "review": external_review}
-            ]
-            print('check1 ')
-            review_panel = LegalReviewPanel(
-                input_model=self.model_backbone,
-                api_keys=self.api_keys,
-                agent_config=self.agent_configs,
-                max_steps=len(reviews),
-            )
-            synthesis = review_panel.synthesize_reviews(reviews, source_text=analysis_text)
-            print('check end')
-            analysis_results["final_synthesis"] = synthesis
+                    header = {
+                        "legal_question": analysis_text,
+                        "hypothetical": None,
+                        "timestamp": self.timestamp,
+                        "model": self.model_backbone,
+                        "agent_outputs": {},
+                        "final_synthesis": None
+                    }
+
+                # right now logic is just simplified to check for hypos first but
+                # this is because im edge guarding within the runmac.sh and runwin.bat
+                # calls already so that only one analysistext source can be called at 
+                # once
+                # ~ gong
+                
+                
+                # changed this as its passing the hypo directory instead of the acutal hypo                 
+                for key, value in header.items():
+                    log.set([key], value)
+                
+                # Perform analysis for all agents as one phase graph, independent phases run concurrently
+                tasks = {}
+                for agent_name, agent in self.agents.items():
+                    if units is None:
+                        tasks.update(agent.phase_tasks(question=analysis_text))
+                        continue
+                    # One retrieval per scenario, shared by the phase graphs of each of its questions
+                    for unit in units:
+                        retrieval_key = (unit["scenario_id"], agent_name, "retrieval")
+                        if retrieval_key not in tasks:
+                            tasks.update(agent.retrieval_task(unit["retrieval_query"], key_prefix=(unit["scenario_id"],)))
+                        tasks.update(agent.phase_tasks(question=unit["text"], key_prefix=(unit["unit_id"],), retrieval_key=retrieval_key))
+                print(f"\nPerforming analysis using {', '.join(self.agents)} ({len(tasks)} tasks, concurrency {self.concurrency})...")
+                def record_output(key, result):
+                    if key[-1] == "retrieval":
+                        # What each retrieval put into the prompts and what it dropped as duplicate or over budget
+                        log.set(["context_packing", "/".join(key[:-1])], result.summary())
+                    elif units is None:
+                        log.set(["agent_outputs", *key], result)
+                    else:
+                        # Per-question answers, replaced by the merged views once every question is done
+                        log.set(["unit_outputs", *key], result)
 
-            # Save all results
-            print("\nSaving analysis results...")
-            self._save_analysis_results(analysis_results)
+                scheduler = DAGScheduler(max_workers=self.concurrency)
+                outputs = scheduler.run(tasks, on_result=record_output)
+                log.set(["schedule"], scheduler.report)
+
+                # Synthesize reviews using Internal and External outputs
+                print("\nSynthesizing perspectives...")
+                agent_reviews = {}
+                if units is None:
+                    for agent_name, agent in self.agents.items():
+                        agent_reviews[agent_name] = LegalReviewPanel.compile_review({phase: outputs[(agent_name, phase)] for phase in agent.phases})
+                else:
+                    # Merge the per-question answers: by phase for the report, by question for the synthesis
+                    question_outputs = [
+                        {
+                            "unit_id": unit["unit_id"],
+                            "file": unit["file"],
+                            "question": unit["question"],
+                            "agent_outputs": {
+                                agent_name: {phase: outputs[(unit["unit_id"], agent_name, phase)] for phase in agent.phases}
+                                for agent_name, agent in self.agents.items()
+                            },
+                        }
+                        for unit in units
+                    ]
+                    log.set(["question_outputs"], question_outputs)
+                    for agent_name, agent in self.agents.items():
+                        phase_outputs, agent_reviews[agent_name] = merge_question_outputs(question_outputs, agent_name, agent.phases)
+                        log.set(["agent_outputs", agent_name], phase_outputs)
+                    log.drop(["unit_outputs"])
+
+                reviews = [
+                    {"perspective": "internal_law", "review": agent_reviews["internal"]},
+                    {"perspective": "external_law", "review": agent_reviews["external"]}
+                ]
+                review_panel = LegalReviewPanel(
+                    input_model=self.model_backbone,
+                    api_keys=self.api_keys,
+                    agent_config=self.agent_configs,
+                    max_steps=len(reviews),
+                    run_id=self.timestamp,
+                )
+                synthesis = review_panel.synthesize_reviews(
+                    reviews, source_text=analysis_text, on_step=lambda step, value: log.set(["final_synthesis", step], value)
+                )
+                log.set(["final_synthesis"], synthesis)
+                usage = LEDGER.totals(self.timestamp)
+                timing = TRACER.summary(self.timestamp, wall_s=run_span.elapsed())
+                log.set(["usage"], usage)
+                log.set(["retry_metrics"], RETRY_METRICS.snapshot(self.timestamp))
+                log.set(["timing"], timing)
+                usage_total = usage["total"]
+                print(f"\nEstimated run cost: ${usage_total['cost_usd']:.4f}")
+                if usage_total["tokens_in"]:
+                    print(f"Prompt cache hits: {usage_total['cached_in']}/{usage_total['tokens_in']} input tokens "
+                          f"({100 * usage_total['cached_in'] / usage_total['tokens_in']:.0f}%)")
+                print_timing_summary(timing)
+                print_schedule_summary(scheduler.report)
+
+                # Save all results
+                print("\nSaving analysis results...")
+                with span("save_results"):
+                    self._save_analysis_results(log)
 
             print(f"\nAnalysis complete! Results saved in: {self.results_dir}")
 
         except Exception as e:
+            if log is not None and log.records:
+                print(f"Partial results kept in {log.path} (rebuild with: python -m helper.results_log {log.path})")
             raise Exception(f"Error during legal analysis: {str(e)}")
+        finally:
+            if log is not None:
+                log.close()
+            set_run_deadline(self.timestamp, None)
+            TRACER.end_run(self.timestamp)
 
 
 def parse_arguments():
@@ -187,6 +367,13 @@ def parse_arguments():
     parser.add_argument("--model", type=str, help="Selected model for generation")
     parser.add_argument("--question", type=str, help="The legal question to analyze")
     parser.add_argument("--hypo", type=str, help="Directory path containing hypothetical PDFs to analyze")
+    parser.add_argument("--select", type=str, help="Hypotheticals to analyze without prompting, e.g. '1,3' or 'all'")
+    parser.add_argument("--deadline", type=float, default=3600, help="Total time budget for the run in seconds (model retries stop once it is spent)")
+    parser.add_argument("--fan-out", action="store_true", help="With --hypo, analyze each (scenario, question) pair as its own parallel unit and merge the answers in synthesis")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of agent phases (LLM calls) running at once")
+    parser.add_argument("--vdb-snapshot", action="store_true", help="Retrieve from the published read-only vector store snapshots (python -m helper.vdb_snapshot), for many concurrent workers")
+    parser.add_argument("--profile", type=str, choices=PROFILE_MODES, help="Profile the run with deterministic cProfile or the low-overhead sampler; output goes to the results directory")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="Sampling interval in seconds for --profile sample")
     return parser.parse_args()
 
 
@@ -215,7 +402,12 @@ def main():
         'anthropic': os.getenv('ANTHROPIC_API_KEY'),
     }
 
-    if not any(api_keys.values()):
+    try:
+        backend, _, _ = resolve_model(selected_model)
+    except Exception:
+        raise ValueError(f"Unknown model '{selected_model}'. Available models: {list_models()}")
+
+    if backend.requires_api_key and not any(api_keys.values()):
         raise ValueError("No API keys provided. At least one API key must be provided via environment variables.")
     else:  # just me being extra and adding more logging, we can remove this later ~ gong
         missing_keys = [key for key, value in api_keys.items() if not value]
@@ -232,8 +424,14 @@ def main():
             api_keys=api_keys,
             model_backbone=selected_model,
             hypothetical=hypothetical or "", # pass empty string if none since prev edge guarding should be good enough ~ gong
+            deadline=args.deadline,
+            selection=args.select,
+            concurrency=args.concurrency,
+            fan_out=args.fan_out,
+            snapshot=args.vdb_snapshot,
         )
-        workflow.perform_legal_analysis()
+        with profile_run(args.profile, workflow.results_dir, interval=args.profile_interval):
+            workflow.perform_legal_analysis()
     except Exception as e:
         print(f"\nError during analysis: {str(e)}")
 